@@ -1,5 +1,5 @@
 from django.apps import AppConfig
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from . import signals
 
 
@@ -10,3 +10,20 @@ class BaseConfig(AppConfig):
 
         # registering signals with the model's string label
         pre_save.connect(signals.agregar_auditorias, sender='base.Usuario')
+
+        usuario = self.get_model('Usuario')
+        m2m_changed.connect(signals.actualizar_mascara_roles, sender=usuario.roles.through)
+
+        # Invalida la caché de autenticación por token cuando cambia el usuario o se borra su token.
+        post_save.connect(signals.invalidar_cache_token, sender='base.Usuario')
+        post_delete.connect(signals.invalidar_cache_token, sender='base.Usuario')
+        post_delete.connect(signals.invalidar_cache_token, sender='authtoken.Token')
+
+        # Invalida los totales guardados de los listados cuando se crea, guarda o borra un registro.
+        post_save.connect(signals.invalidar_cache_totales, sender='base.Usuario')
+        post_delete.connect(signals.invalidar_cache_totales, sender='base.Usuario')
+
+        # Mantiene el texto normalizado y el índice de búsqueda del usuario.
+        pre_save.connect(signals.actualizar_texto_busqueda, sender='base.Usuario')
+        post_save.connect(signals.actualizar_indice_busqueda, sender='base.Usuario')
+        post_delete.connect(signals.borrar_indice_busqueda, sender='base.Usuario')
@@ -0,0 +1,147 @@
+from base.models import TrigramaBusqueda
+from django.db.models import Case, Count, IntegerField, Value, When
+from unidecode import unidecode
+
+# Campos con búsqueda por texto de cada modelo y la columna sobre la que se compara el texto buscado. Los campos de texto
+# se comparan sobre una columna con el texto normalizado, que se actualiza al guardar el registro.
+CAMPOS_BUSQUEDA = {
+    'producto.Producto': {'nombre': 'nombre_busqueda'},
+    'base.Usuario': {'first_name': 'nombre_busqueda', 'dni': 'dni'},
+}
+
+
+def normalizar_texto(texto):
+    """
+        Devuelve el texto en minúsculas, sin acentos y con los espacios colapsados, que es la forma en que se comparan
+        los textos en las búsquedas.
+        @param texto: str|None
+        @return: str
+    """
+    if texto is None:
+        return ""
+    return " ".join(unidecode(str(texto)).lower().split())
+
+
+def get_trigramas(texto):
+    """
+        Devuelve las secuencias de tres caracteres consecutivos del texto normalizado.
+        @param texto: str|None
+        @return: Set<str>
+    """
+    normalizado = normalizar_texto(texto)
+    return {normalizado[indice:indice + 3] for indice in range(len(normalizado) - 2)}
+
+
+def get_trigramas_consulta(texto):
+    """
+        Devuelve los trigramas del texto buscado que se consultan en el índice: los que no se superponen, más el último
+        para cubrir el final del texto. Alcanzan para descartar casi todos los registros que no contienen el texto y
+        recorren menos filas del índice que usar todos los trigramas.
+        @param texto: str
+        @return: Set<str>
+    """
+    normalizado = normalizar_texto(texto)
+    if len(normalizado) < 3:
+        return set()
+    trigramas = {normalizado[indice:indice + 3] for indice in range(0, len(normalizado) - 2, 3)}
+    trigramas.add(normalizado[-3:])
+    return trigramas
+
+
+def buscar(modelo, campo, texto):
+    """
+        Devuelve los ids de los registros del modelo cuyo campo contiene el texto, sin distinguir mayúsculas ni acentos.
+        Con tres o más caracteres los candidatos son los registros que tienen en el índice todos los trigramas de la
+        consulta y solo sobre ellos se comprueba que contengan el texto. Con menos de tres caracteres no hay trigramas
+        que consultar y se compara la columna normalizada de todos los registros, lo que recorre la tabla: se mantiene
+        porque los listados filtran mientras se escribe, y un texto tan corto coincide con gran parte de los registros,
+        por lo que el índice tampoco descartaría muchos. El resultado es un queryset para usar como subconsulta en los
+        filtros, por ejemplo {'id__in': buscar(Producto, 'nombre', texto)}.
+        @param modelo: Type<Model>
+        @param campo: str
+        @param texto: str
+        @return: QuerySet
+    """
+    etiqueta = modelo._meta.label
+    columna = CAMPOS_BUSQUEDA[etiqueta][campo]
+    normalizado = normalizar_texto(texto)
+    encontrados = modelo.objects.filter(**{columna + '__contains': normalizado})
+
+    trigramas = get_trigramas_consulta(normalizado)
+    if len(trigramas) > 0:
+        candidatos = TrigramaBusqueda.objects.filter(modelo=etiqueta, campo=campo, trigrama__in=trigramas) \
+            .values('objeto_id').annotate(coincidencias=Count('trigrama')) \
+            .filter(coincidencias=len(trigramas)).values('objeto_id')
+        encontrados = encontrados.filter(pk__in=candidatos)
+    return encontrados.values('pk')
+
+
+def get_relevancia(modelo, campo, texto, relacion=""):
+    """
+        Devuelve la expresión para ordenar los resultados de una búsqueda: primero los que coinciden con el texto, luego
+        los que empiezan con el texto y por último los que lo contienen.
+        @param modelo: Type<Model>
+        @param campo: str
+        @param texto: str
+        @param relacion: str Prefijo de la relación con el modelo cuando se ordena otro modelo, como "usuario__".
+        @return: Case
+    """
+    columna = relacion + CAMPOS_BUSQUEDA[modelo._meta.label][campo]
+    normalizado = normalizar_texto(texto)
+    return Case(
+        When(**{columna: normalizado, 'then': Value(0)}),
+        When(**{columna + '__startswith': normalizado, 'then': Value(1)}),
+        default=Value(2),
+        output_field=IntegerField()
+    )
+
+
+def actualizar_indice(objeto):
+    """
+        Actualiza el índice de trigramas de los campos de búsqueda del objeto. Solo se insertan y borran los trigramas
+        que cambiaron.
+        @param objeto: Model
+        @return: None
+    """
+    etiqueta = objeto._meta.label
+    for campo in CAMPOS_BUSQUEDA[etiqueta]:
+        trigramas = get_trigramas(getattr(objeto, campo))
+        indexados = TrigramaBusqueda.objects.filter(modelo=etiqueta, campo=campo, objeto_id=objeto.pk)
+        existentes = set(indexados.values_list('trigrama', flat=True))
+        sobrantes = existentes - trigramas
+        if len(sobrantes) > 0:
+            indexados.filter(trigrama__in=sobrantes).delete()
+        nuevos = [TrigramaBusqueda(modelo=etiqueta, campo=campo, objeto_id=objeto.pk, trigrama=trigrama)
+                  for trigrama in trigramas - existentes]
+        TrigramaBusqueda.objects.bulk_create(nuevos)
+
+
+def reindexar(modelo, lote=1000):
+    """
+        Vuelve a generar la columna normalizada y el índice de trigramas de todos los registros del modelo, de a lotes.
+        Debe usarse después de modificar los campos de búsqueda con operaciones que no envían señales, como update.
+        @param modelo: Type<Model>
+        @param lote: int Cantidad de registros por lote.
+        @return: int Cantidad de registros indexados.
+    """
+    etiqueta = modelo._meta.label
+    campos = CAMPOS_BUSQUEDA[etiqueta]
+    columnas = [columna for campo, columna in campos.items() if columna != campo]
+    TrigramaBusqueda.objects.filter(modelo=etiqueta).delete()
+
+    cantidad = 0
+    objetos = list(modelo.objects.only('pk', *campos.keys()).order_by('pk')[:lote])
+    while len(objetos) > 0:
+        nuevos = []
+        for objeto in objetos:
+            for campo, columna in campos.items():
+                if columna != campo:
+                    setattr(objeto, columna, normalizar_texto(getattr(objeto, campo)))
+                nuevos.extend(TrigramaBusqueda(modelo=etiqueta, campo=campo, objeto_id=objeto.pk, trigrama=trigrama)
+                              for trigrama in get_trigramas(getattr(objeto, campo)))
+        if len(columnas) > 0:
+            modelo.objects.bulk_update(objetos, columnas)
+        TrigramaBusqueda.objects.bulk_create(nuevos, batch_size=lote)
+        cantidad += len(objetos)
+        objetos = list(modelo.objects.only('pk', *campos.keys()).filter(pk__gt=objetos[-1].pk).order_by('pk')[:lote])
+    return cantidad
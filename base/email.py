@@ -3,20 +3,20 @@ from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 
 
-def enviar_email_registro(usuario):
+def enviar_email_registro(usuario, token):
     subject, from_email, to = 'Panadería Independencia - Activación de cuenta', 'sistemadegestion@gmail.com', usuario.email
     text_content = '¡Bienvenido al Sistema Gastronómico!.'
     msg = EmailMultiAlternatives(subject, text_content, from_email, [to, "martinghiotti2013@gmail.com"])
-    html_body = render_to_string("registro.html", {'usuario': usuario})
+    html_body = render_to_string("registro.html", {'usuario': usuario, 'token': token})
     msg.attach_alternative(html_body, "text/html")
     msg.send()
 
 
-def enviar_email_cambio_password(usuario):
+def enviar_email_cambio_password(usuario, token):
     subject, from_email, to = 'Panadería Independencia - Cambiar contraseña', 'sistemadegestion@gmail.com', usuario.email
     text_content = '¡Bienvenido al Sistema Gastronómica!.'
     msg = EmailMultiAlternatives(subject, text_content, from_email, [to, "martinghiotti2013@gmail.com"])
-    html_body = render_to_string("cambio-clave.html", {'usuario': usuario})
+    html_body = render_to_string("cambio-clave.html", {'usuario': usuario, 'token': token})
     msg.attach_alternative(html_body, "text/html")
     msg.send()
 
@@ -0,0 +1,13 @@
+from base.busqueda import CAMPOS_BUSQUEDA, reindexar
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Vuelve a generar el índice de búsqueda por texto de los usuarios y productos. Necesario solo si se " \
+           "modificaron nombres sin guardar los registros, por ejemplo con update o cargas directas en la base de datos."
+
+    def handle(self, *args, **options):
+        for etiqueta in CAMPOS_BUSQUEDA:
+            cantidad = reindexar(apps.get_model(etiqueta))
+            self.stdout.write(self.style.SUCCESS("Se indexaron " + str(cantidad) + " registros de " + etiqueta + "."))
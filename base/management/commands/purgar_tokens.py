@@ -0,0 +1,11 @@
+from base.models import Usuario
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Borra los tokens de activación de cuenta y de cambio de contraseña vencidos. Pensado para ejecutarse " \
+           "periódicamente."
+
+    def handle(self, *args, **options):
+        borrados = Usuario.purgar_tokens_vencidos()
+        self.stdout.write(self.style.SUCCESS("Se borraron " + str(borrados) + " tokens vencidos."))
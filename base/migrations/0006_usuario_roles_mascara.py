@@ -0,0 +1,30 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+BITS = {'root': 1, 'mozo': 2, 'comensal': 4, 'vendedor': 8, 'admin': 16}
+
+
+def calcular_mascaras(apps, schema_editor):
+    Usuario = apps.get_model('base', 'Usuario')
+    for usuario in Usuario.objects.prefetch_related('roles'):
+        mascara = 0
+        for rol in usuario.roles.all():
+            mascara |= BITS.get(rol.nombre, 0)
+        Usuario.objects.filter(pk=usuario.pk).update(roles_mascara=mascara)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_usuario_direccion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='roles_mascara',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(calcular_mascaras, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:36
+
+from django.db import migrations, models
+import datetime
+import hashlib
+
+
+def guardar_hash_tokens(apps, schema_editor):
+    # Reemplaza los tokens pendientes por su hash para que los links ya enviados sigan siendo válidos.
+    Usuario = apps.get_model('base', 'Usuario')
+    ahora = datetime.datetime.now()
+    for usuario in Usuario.objects.exclude(token_email=None, token_reset=None):
+        if usuario.token_email is not None:
+            usuario.token_email = hashlib.sha256(usuario.token_email.encode()).hexdigest()
+            usuario.fecha_token_email = ahora
+        if usuario.token_reset is not None:
+            usuario.token_reset = hashlib.sha256(usuario.token_reset.encode()).hexdigest()
+            if usuario.fecha_token_reset is None:
+                usuario.fecha_token_reset = ahora
+        campos = ['token_email', 'fecha_token_email', 'token_reset', 'fecha_token_reset']
+        Usuario.objects.filter(pk=usuario.pk).update(**{campo: getattr(usuario, campo) for campo in campos})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0006_usuario_roles_mascara'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='fecha_token_email',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(guardar_hash_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='usuario',
+            name='token_email',
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='usuario',
+            name='token_reset',
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+    ]
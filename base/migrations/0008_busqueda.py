@@ -0,0 +1,62 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:39
+
+from django.db import migrations, models
+from unidecode import unidecode
+
+
+# Copia de las funciones de base.busqueda al momento de crear la migración, para que la migración no cambie si
+# cambian esas funciones.
+def normalizar_texto(texto):
+    if texto is None:
+        return ""
+    return " ".join(unidecode(str(texto)).lower().split())
+
+
+def get_trigramas(texto):
+    normalizado = normalizar_texto(texto)
+    return {normalizado[indice:indice + 3] for indice in range(len(normalizado) - 2)}
+
+
+def indexar_usuarios(apps, schema_editor):
+    # Genera el texto normalizado y el índice de búsqueda de los usuarios existentes.
+    Usuario = apps.get_model('base', 'Usuario')
+    TrigramaBusqueda = apps.get_model('base', 'TrigramaBusqueda')
+    for objeto in Usuario.objects.all():
+        Usuario.objects.filter(pk=objeto.pk).update(nombre_busqueda=normalizar_texto(objeto.first_name))
+        trigramas = [TrigramaBusqueda(modelo='base.Usuario', campo=campo, objeto_id=objeto.pk, trigrama=trigrama)
+                     for campo in ['first_name', 'dni'] for trigrama in get_trigramas(getattr(objeto, campo))]
+        TrigramaBusqueda.objects.bulk_create(trigramas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_tokens_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrigramaBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=50)),
+                ('campo', models.CharField(max_length=50)),
+                ('objeto_id', models.BigIntegerField()),
+                ('trigrama', models.CharField(max_length=3)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='nombre_busqueda',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='trigramabusqueda',
+            index=models.Index(fields=['modelo', 'campo', 'trigrama', 'objeto_id'], name='trigrama_busqueda_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trigramabusqueda',
+            index=models.Index(fields=['modelo', 'objeto_id'], name='trigrama_objeto_idx'),
+        ),
+        migrations.RunPython(indexar_usuarios, migrations.RunPython.noop),
+    ]
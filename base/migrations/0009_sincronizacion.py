@@ -0,0 +1,27 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:57
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=50)),
+                ('objeto_id', models.BigIntegerField()),
+                ('fecha', models.DateTimeField(default=datetime.datetime.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['modelo', 'fecha'], name='eliminacion_fecha_idx'),
+        ),
+    ]
@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Exists, OuterRef, Q
 import datetime
+import hashlib
+import secrets
 
 
 class Auditoria(models.Model):
@@ -16,6 +20,40 @@ class Auditoria(models.Model):
         abstract = True
 
 
+class TrigramaBusqueda(models.Model):
+    """
+        Índice de búsqueda por texto: cada fila indica que el campo de un registro contiene el trigrama en su texto
+        normalizado. Se mantiene al guardar y borrar los registros de los modelos de base.busqueda.CAMPOS_BUSQUEDA.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modelo', 'campo', 'trigrama', 'objeto_id'], name='trigrama_busqueda_idx'),
+            models.Index(fields=['modelo', 'objeto_id'], name='trigrama_objeto_idx'),
+        ]
+
+    modelo = models.CharField(max_length=50)
+    campo = models.CharField(max_length=50)
+    objeto_id = models.BigIntegerField()
+    trigrama = models.CharField(max_length=3)
+
+
+class Eliminacion(models.Model):
+    """
+        Registro de los objetos borrados de la base de datos, para que los clientes que sincronizan cambios por fecha
+        de modificación puedan quitarlos de su copia local.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modelo', 'fecha'], name='eliminacion_fecha_idx'),
+        ]
+
+    modelo = models.CharField(max_length=50)
+    objeto_id = models.BigIntegerField()
+    fecha = models.DateTimeField(default=datetime.datetime.now)
+
+
 class Rol(models.Model):
     nombre = models.CharField(max_length=50)
     legible = models.CharField(max_length=50)
@@ -30,6 +68,50 @@ class Rol(models.Model):
 
     ROLES = (ROOT, MOZO, COMENSAL, VENEDEDOR, ADMINISTRADOR)
 
+    # Bit de cada rol dentro de la máscara de roles del usuario.
+    BITS = {ROOT: 1, MOZO: 2, COMENSAL: 4, VENEDEDOR: 8, ADMINISTRADOR: 16}
+
+    @classmethod
+    def get_mascara(cls, nombres):
+        """
+            Devuelve la máscara de bits correspondiente a los nombres de roles.
+            @param nombres: List
+            @return: int
+        """
+        mascara = 0
+        for nombre in nombres:
+            mascara |= cls.BITS.get(nombre, 0)
+        return mascara
+
+    @classmethod
+    def get_mascaras(cls, con=None, sin=None):
+        """
+            Devuelve todos los valores posibles de la máscara de roles que tienen alguno de los roles 'con' y ninguno
+            de los roles 'sin'. Permite filtrar usuarios con roles_mascara__in aprovechando el índice de la columna.
+            @param con: List|None Si es None no se exige ningún rol.
+            @param sin: List|None
+            @return: List
+        """
+        bits_con = cls.get_mascara(con) if con is not None else None
+        bits_sin = cls.get_mascara(sin) if sin is not None else 0
+        mascaras = []
+        for mascara in range(1 << len(cls.BITS)):
+            if bits_con is not None and mascara & bits_con == 0:
+                continue
+            if mascara & bits_sin:
+                continue
+            mascaras.append(mascara)
+        return mascaras
+
+    @classmethod
+    def get_nombres_contiene(cls, texto):
+        """
+            Devuelve los nombres de roles que contienen el texto, equivalente a filtrar por roles__nombre__contains.
+            @param texto: str
+            @return: List
+        """
+        return [nombre for nombre in cls.ROLES if texto in nombre]
+
 
 class Usuario(Auditoria, AbstractUser):
     roles = models.ManyToManyField(to='Rol', related_name="usuarios_roles", blank=True)
@@ -42,37 +124,142 @@ class Usuario(Auditoria, AbstractUser):
     username = models.CharField(unique=False, max_length=50)
     password = models.CharField(max_length=128, null=True)
     habilitado = models.BooleanField(default=True)
-    token_reset = models.TextField(null=True)
-    token_email = models.TextField(null=True)
+    # De los tokens enviados por email se guarda solo el hash, indexado para buscar al usuario al validar el link.
+    token_reset = models.CharField(max_length=64, null=True, unique=True)
+    token_email = models.CharField(max_length=64, null=True, unique=True)
     fecha_token_reset = models.DateTimeField(null=True)
-    operaciones = list()
+    fecha_token_email = models.DateTimeField(null=True)
     borrado = models.BooleanField(default=False)
     observaciones = models.CharField(max_length=255, default="", blank=True)
     direccion = models.CharField(max_length=30, default="", blank=True)
+    roles_mascara = models.PositiveSmallIntegerField(default=0, db_index=True)
+    # Nombre normalizado para las búsquedas, se actualiza al guardar el usuario.
+    nombre_busqueda = models.CharField(max_length=255, default="", blank=True)
+
+    # Los flags de roles se leen de la máscara de roles y las operaciones se calculan a demanda una vez por instancia.
+    @property
+    def esMozo(self):
+        return self.comprobar_tiene_rol(Rol.MOZO)
+
+    @property
+    def esAdmin(self):
+        return self.comprobar_tiene_rol(Rol.ADMINISTRADOR)
+
+    @property
+    def esComensal(self):
+        return self.comprobar_tiene_rol(Rol.COMENSAL)
+
+    @property
+    def esVendedor(self):
+        return self.comprobar_tiene_rol(Rol.VENEDEDOR)
+
+    @property
+    def operaciones(self):
+        operaciones = self.__dict__.get('_operaciones')
+        if operaciones is None:
+            operaciones = self.get_operaciones()
+            self._operaciones = operaciones
+        return operaciones
+
+    def actualizar_mascara_roles(self):
+        """
+            Recalcula la máscara de roles a partir de la colección de roles y la guarda sin pasar por save() para no
+            modificar la auditoría del usuario.
+            @return: None
+        """
+        nombres = self.roles.values_list('nombre', flat=True)
+        mascara = Rol.get_mascara(nombres)
+        Usuario.objects.filter(pk=self.pk).update(roles_mascara=mascara)
+        self.roles_mascara = mascara
+        self.limpiar_cache_roles()
+
+    def limpiar_cache_roles(self):
+        """
+            Descarta los roles precargados y las operaciones guardadas en la instancia para que se vuelvan a calcular.
+            @return: None
+        """
+        self.__dict__.pop('_operaciones', None)
+        precargados = getattr(self, '_prefetched_objects_cache', {})
+        precargados.pop('roles', None)
 
-    esMozo = False
-    esAdmin = False
-    esComensal = False
-    esVendedor = False
+    def generar_token_email(self):
+        """
+            Genera el token para activar la cuenta del usuario y guarda su hash con la fecha de generación. El token solo
+            se devuelve para enviarlo por email.
+            @return: str
+        """
+        token = secrets.token_hex(16)
+        self.token_email = Usuario.get_hash_token(token)
+        self.fecha_token_email = datetime.datetime.now()
+        return token
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        if self.id is not None:
-            self.esMozo = self.comprobar_tiene_rol(Rol.MOZO)
-            self.esAdmin = self.comprobar_tiene_rol(Rol.ADMINISTRADOR)
-            self.esComensal = self.comprobar_tiene_rol(Rol.COMENSAL)
-            self.esVendedor = self.comprobar_tiene_rol(Rol.VENEDEDOR)
-            self.operaciones = self.get_operaciones()
+    def generar_token_reset(self):
+        """
+            Genera el token para cambiar la contraseña del usuario y guarda su hash con la fecha de generación. El token
+            solo se devuelve para enviarlo por email.
+            @return: str
+        """
+        token = secrets.token_hex(16)
+        self.token_reset = Usuario.get_hash_token(token)
+        self.fecha_token_reset = datetime.datetime.now()
+        return token
 
-    def get_url_activacion(self):
+    @staticmethod
+    def get_hash_token(token):
         """
-            Devuelve la url para activar la cuenta del usuario.
+            Devuelve el hash con el que se guarda el token.
+            @param token: str
             @return: str
         """
-        token = self.token_email
-        if token is None:
-            return ""
-        return "http://localhost:3000/validar-email/" + str(token)
+        return hashlib.sha256(str(token).encode()).hexdigest()
+
+    @staticmethod
+    def get_limite_token_email():
+        """
+            Devuelve la fecha de generación a partir de la cual el token de activación de cuenta sigue vigente.
+            @return: datetime
+        """
+        return datetime.datetime.now() - datetime.timedelta(hours=getattr(settings, 'TOKEN_EMAIL_HORAS', 168))
+
+    @staticmethod
+    def get_limite_token_reset():
+        """
+            Devuelve la fecha de generación a partir de la cual el token para cambiar la contraseña sigue vigente.
+            @return: datetime
+        """
+        return datetime.datetime.now() - datetime.timedelta(hours=getattr(settings, 'TOKEN_RESET_HORAS', 48))
+
+    @classmethod
+    def buscar_por_token_email(cls, token):
+        """
+            Busca el usuario con el token de activación de cuenta vigente.
+            @param token: str
+            @return: Usuario|None
+        """
+        filtros = {'token_email': cls.get_hash_token(token), 'fecha_token_email__gte': cls.get_limite_token_email()}
+        return cls.objects.filter(**filtros).first()
+
+    @classmethod
+    def buscar_por_token_reset(cls, token):
+        """
+            Busca el usuario con el token para cambiar la contraseña vigente.
+            @param token: str
+            @return: Usuario|None
+        """
+        filtros = {'token_reset': cls.get_hash_token(token), 'fecha_token_reset__gte': cls.get_limite_token_reset()}
+        return cls.objects.filter(**filtros).first()
+
+    @classmethod
+    def purgar_tokens_vencidos(cls):
+        """
+            Borra los tokens enviados por email que ya vencieron, sin modificar la auditoría de los usuarios.
+            @return: int Cantidad de tokens borrados.
+        """
+        email = cls.objects.filter(fecha_token_email__lt=cls.get_limite_token_email())
+        borrados = email.update(token_email=None, fecha_token_email=None)
+        reset = cls.objects.filter(fecha_token_reset__lt=cls.get_limite_token_reset())
+        borrados += reset.update(token_reset=None, fecha_token_reset=None)
+        return borrados
 
     # Agrega el rol comensa al usuario.
     def agregar_rol_comensal(self):
@@ -127,15 +314,34 @@ class Usuario(Auditoria, AbstractUser):
 
     # Comprueba si el usuario tiene el rol a partir del nombre del mismo.
     def comprobar_tiene_rol(self, nombre):
-        existe = self.roles.filter(nombre=nombre).first()
-        return isinstance(existe, Rol)
+        bit = Rol.BITS.get(nombre, 0)
+        return self.roles_mascara & bit != 0
 
     # Devuelve true si el usuario no ha creado entidades en el sistema.
     def comprobar_puede_borrarse(self):
-        return self.ingresos.all().count() == 0 and self.pedidos.all().count() == 0 and self.pedidos.all().count() == 0 \
-               and self.turnos.all().count() == 0 and self.reemplazos.all().count() == 0 \
-               and self.productos_creados.all().count() == 0 and self.productos_modificados.all().count() == 0 \
-               and self.categorias_creadas.all().count() == 0 and self.categorias_modificadas.all().count() == 0
+        pueden_borrarse = Usuario.get_pueden_borrarse([self.id])
+        return pueden_borrarse[self.id]
+
+    @classmethod
+    def get_pueden_borrarse(cls, ids):
+        """
+            Devuelve para cada id de usuario si puede borrarse, es decir si no tiene registros relacionados. Resuelve
+            todas las relaciones con EXISTS en una única consulta.
+            @param ids: List<int>
+            @return: dict
+        """
+        relaciones = ['ingresos', 'pedidos', 'turnos', 'reemplazos', 'productos_creados', 'productos_modificados',
+                      'categorias_creadas', 'categorias_modificadas']
+        anotaciones = {}
+        filtro = Q()
+        for relacion in relaciones:
+            campo = cls._meta.get_field(relacion)
+            relacionados = campo.related_model.objects.filter(**{campo.field.name: OuterRef('pk')})
+            anotaciones['tiene_' + relacion] = Exists(relacionados)
+            filtro |= Q(**{'tiene_' + relacion: True})
+        relacionados = cls.objects.filter(pk__in=ids).annotate(**anotaciones).filter(filtro)
+        no_borrables = set(relacionados.values_list('id', flat=True))
+        return {id: id not in no_borrables for id in ids}
 
     # Devuelve las operaciones del usuario según los roles del mismo.
     def get_operaciones(self):
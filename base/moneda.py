@@ -0,0 +1,33 @@
+from django.conf import settings
+
+
+def crear_formateador_moneda(simbolo, separador_decimal, separador_miles, decimales):
+    """
+        Devuelve una función que da formato de moneda a un importe, por ejemplo "$ 1234,50" o "-$ 1234,50", con el
+        mismo resultado que locale.currency con la configuración regional es_AR. El formato se arma una sola vez, por
+        lo que la función no depende de la configuración regional del proceso y puede usarse desde varios hilos.
+        @param simbolo: str
+        @param separador_decimal: str
+        @param separador_miles: str Vacío para no separar los miles.
+        @param decimales: int
+        @return: Callable
+    """
+    formato = (',' if len(separador_miles) > 0 else '') + '.' + str(decimales) + 'f'
+    separadores = str.maketrans({',': separador_miles, '.': separador_decimal})
+    positivo = simbolo + ' '
+    negativo = '-' + simbolo + ' '
+
+    def formatear(importe):
+        texto = format(abs(importe), formato).translate(separadores)
+        return (negativo if importe < 0 else positivo) + texto
+
+    return formatear
+
+
+# Formato de los importes que se muestran en los listados, comprobantes y emails.
+formatear_moneda = crear_formateador_moneda(
+    getattr(settings, 'MONEDA_SIMBOLO', '$'),
+    getattr(settings, 'MONEDA_SEPARADOR_DECIMAL', ','),
+    getattr(settings, 'MONEDA_SEPARADOR_MILES', ''),
+    getattr(settings, 'MONEDA_DECIMALES', 2),
+)
@@ -0,0 +1,234 @@
+# Datos de presentación de las operaciones que se muestran en los listados, por entidad y acción. El título se completa
+# con el id legible del objeto.
+OPERACIONES = {
+    'usuario': {
+        'editar': {
+            'clase': 'btn btn-sm btn-success text-success',
+            'texto': 'Editar',
+            'icono': 'fas fa-pencil-alt',
+            'title': 'Editar Usuario {}',
+        },
+        'borrar': {
+            'clase': 'btn btn-sm btn-danger text-danger',
+            'texto': 'Borrar',
+            'icono': 'fas fa-trash-alt',
+            'title': 'Borrar Usuario {}',
+        },
+        'deshabilitar': {
+            'clase': 'btn btn-sm btn-secondary text-secondary',
+            'texto': 'Deshabilitar',
+            'icono': 'fas fa-ban',
+            'title': 'Deshabilitar Usuario {}',
+        },
+        'habilitar': {
+            'clase': 'btn btn-sm btn-primary text-primary',
+            'texto': 'Habilitar',
+            'icono': 'fas fa-trash-alt',
+            'title': 'Habilitar Usuario {}',
+        },
+    },
+    'producto': {
+        'stock': {
+            'clase': 'btn btn-sm btn-primary text-primary btn',
+            'texto': 'Stock',
+            'icono': 'fas fa-boxes',
+            'title': 'Ver Movimientos de stock del Producto {}',
+        },
+        'editar': {
+            'clase': 'btn btn-sm btn-success text-success',
+            'texto': 'Editar',
+            'icono': 'fas fa-pencil-alt',
+            'title': 'Editar Producto {}',
+        },
+        'borrar': {
+            'clase': 'btn btn-sm btn-danger text-danger',
+            'texto': 'Borrar',
+            'icono': 'fas fa-trash-alt',
+            'title': 'Borrar Producto {}',
+        },
+    },
+    'categoria': {
+        'editar': {
+            'clase': 'btn btn-sm btn-success text-success',
+            'texto': 'Editar',
+            'icono': 'fas fa-pencil-alt',
+            'title': 'Editar Categoría {}',
+        },
+        'borrar': {
+            'clase': 'btn btn-sm btn-danger text-danger',
+            'texto': 'Borrar',
+            'icono': 'fas fa-trash-alt',
+            'title': 'Borrar Categoría {}',
+        },
+    },
+    'ingreso': {
+        'stock': {
+            'clase': 'btn btn-sm btn-primary text-primary btn',
+            'texto': 'Stock',
+            'icono': 'fas fa-boxes',
+            'title': 'Ver Movimientos de stock del Ingreso {}',
+        },
+        'visualizar': {
+            'clase': 'btn btn-sm btn-info text-info',
+            'texto': 'Ver',
+            'icono': 'fa fa-eye',
+            'title': 'Ver Ingreso {}',
+        },
+        'anular': {
+            'clase': 'btn btn-sm btn-danger text-danger',
+            'texto': 'Anular',
+            'icono': 'fa fa-window-close',
+            'title': 'Anular Ingreso {}',
+        },
+    },
+    'reemplazo': {
+        'visualizar': {
+            'clase': 'btn btn-sm btn-info text-info',
+            'texto': 'Ver',
+            'icono': 'fa fa-eye',
+            'title': 'Ver Reemplazo {}',
+        },
+        'anular': {
+            'clase': 'btn btn-sm btn-danger text-danger',
+            'texto': 'Anular',
+            'icono': 'fa fa-window-close',
+            'title': 'Anular Reemplazo {}',
+        },
+    },
+    'venta': {
+        'visualizar': {
+            'clase': 'btn btn-sm btn-info text-info',
+            'texto': 'Ver',
+            'icono': 'fa fa-eye',
+            'title': 'Ver Venta {}',
+        },
+        'pdf': {
+            'clase': 'btn btn-sm btn-primary text-primary',
+            'texto': 'Ticket',
+            'icono': 'fas fa-file-pdf',
+            'title': 'Descargar Ticket Venta {}',
+        },
+        'comanda': {
+            'clase': 'btn btn-sm btn-success text-success',
+            'texto': 'Comanda',
+            'icono': 'fas fa-file-alt',
+            'title': 'Descargar Comanda Venta {}',
+        },
+        'anular': {
+            'clase': 'btn btn-sm btn-danger text-danger',
+            'texto': 'Anular',
+            'icono': 'fa fa-window-close',
+            'title': 'Anular Venta {}',
+        },
+    },
+    'pedido': {
+        'visualizar': {
+            'clase': 'btn btn-sm btn-info text-info',
+            'clase_responsive': 'bg-info',
+            'texto': 'Ver',
+            'icono': 'fa fa-eye',
+            'title': 'Ver Pedido {}',
+        },
+        'entregar': {
+            'clase': 'btn btn-sm btn-success text-success',
+            'clase_responsive': 'bg-success',
+            'texto': 'Entregar',
+            'icono': 'fa fa-check-circle',
+            'title': 'Entregar Pedido {}',
+        },
+        'disponible': {
+            'clase': 'btn btn-sm btn-success text-success',
+            'clase_responsive': 'bg-success',
+            'texto': 'Disponible',
+            'icono': 'fa fa-check-circle',
+            'title': 'Marcar Pedido {} como disponible',
+        },
+        'venta': {
+            'clase': 'btn btn-sm btn-primary text-primary',
+            'clase_responsive': 'bg-primary',
+            'texto': 'Ticket',
+            'icono': 'fas fa-file-pdf',
+            'title': 'Marcar Pedido {} como disponible',
+        },
+        'comanda': {
+            'clase': 'btn btn-sm btn-primary text-primary',
+            'clase_responsive': 'bg-primary',
+            'texto': 'Comanda',
+            'icono': 'fas fa-file-alt',
+            'title': 'Descargar Comanda Pedido {}',
+        },
+        'anular': {
+            'clase': 'btn btn-sm btn-danger text-danger',
+            'clase_responsive': 'bg-danger',
+            'texto': 'Anular',
+            'icono': 'fa fa-window-close',
+            'title': 'Anular Pedido {}',
+        },
+    },
+}
+
+
+def get_operacion(entidad, accion, objeto):
+    """
+        Devuelve la operación completa para el objeto, con el título y la clave del mismo.
+        @param entidad: str
+        @param accion: str
+        @param objeto: Model
+        @return: dict
+    """
+    operacion = {'accion': accion}
+    for clave, valor in OPERACIONES[entidad][accion].items():
+        operacion[clave] = valor
+    operacion['title'] = operacion['title'].format(objeto.get_id_texto())
+    operacion['key'] = str(objeto.id) + "-" + accion
+    return operacion
+
+
+def get_bit_operacion(entidad, accion):
+    """
+        Devuelve el bit que representa a la acción en la máscara de operaciones de la entidad, según su posición en el
+        registro.
+        @param entidad: str
+        @param accion: str
+        @return: int
+    """
+    return 1 << list(OPERACIONES[entidad]).index(accion)
+
+
+def get_mascara_operaciones(entidad, acciones):
+    """
+        Devuelve la máscara de bits correspondiente a las acciones permitidas.
+        @param entidad: str
+        @param acciones: List
+        @return: int
+    """
+    mascara = 0
+    for accion in acciones:
+        mascara |= get_bit_operacion(entidad, accion)
+    return mascara
+
+
+def get_metadatos_operaciones():
+    """
+        Devuelve los datos de presentación de todas las operaciones con el bit de cada una, para que el cliente arme las
+        operaciones de los listados compactos. En el título el id del objeto se indica con '{}' y la clave de cada
+        operación es el id del objeto seguido de '-' y la acción.
+        @return: dict
+    """
+    metadatos = {}
+    for entidad, acciones in OPERACIONES.items():
+        metadatos[entidad] = []
+        for accion, datos in acciones.items():
+            operacion = {'accion': accion, 'bit': get_bit_operacion(entidad, accion)}
+            operacion.update(datos)
+            metadatos[entidad].append(operacion)
+    return metadatos
+
+
+def comprobar_operaciones_compactas(request):
+    """
+        Devuelve true si el listado pidió las operaciones compactas, es decir solo las acciones de cada fila.
+        @param request: Request
+        @return: bool
+    """
+    return request.query_params.get('operaciones', "") == "compact"
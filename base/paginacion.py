@@ -0,0 +1,225 @@
+from django.conf import settings
+from base.busqueda import get_relevancia
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Func, IntegerField, Q, Subquery
+import base64
+import binascii
+import datetime
+import json
+
+
+def get_pagina(queryset, offset, limit):
+    """
+        Devuelve las filas de la página junto con la cantidad de registros del listado sin paginar. La cantidad se
+        obtiene en la misma consulta de la página como una subconsulta COUNT, que la base de datos resuelve una sola
+        vez. Solo si la página queda vacía se cuenta aparte.
+        @param queryset: QuerySet
+        @param offset: int|None
+        @param limit: int|None
+        @return: Tuple<List, int>
+    """
+    if offset is None and limit is None:
+        filas = list(queryset)
+        return filas, len(filas)
+
+    conteo = queryset.order_by().annotate(cantidad_conteo=Func(F('pk'), function='COUNT')).values('cantidad_conteo')
+    paginado = queryset.annotate(cantidad_listado=Subquery(conteo, output_field=IntegerField()))
+    filas = list(paginado[offset:limit])
+    if len(filas) > 0:
+        return filas, filas[0].cantidad_listado
+    cantidad = queryset.count() if offset else 0
+    return filas, cantidad
+
+
+def contar_acotado(queryset):
+    """
+        Devuelve la cantidad de registros del queryset contando como máximo CONTEO_EXACTO_MAXIMO + 1, junto con si la
+        cantidad es exacta.
+        @param queryset: QuerySet
+        @return: Tuple<int, bool>
+    """
+    maximo = getattr(settings, 'CONTEO_EXACTO_MAXIMO', 10000)
+    cantidad = queryset.order_by()[:maximo + 1].count()
+    return cantidad, cantidad <= maximo
+
+
+# Paginación de los listados. Sin el parámetro 'cursor' mantiene la paginación por desplazamiento de paginaActual y
+# registrosPorPagina. Con el parámetro 'cursor' (vacío para la primera página) pagina por clave: filtra las filas
+# posteriores a la última fila devuelta según el orden del listado, de forma que el costo de cada página no crece con la
+# profundidad. La cantidad de registros se cuenta solo en la primera página, acotada a CONTEO_EXACTO_MAXIMO, y viaja en
+# el cursor a las siguientes. Los filtros de la query se interpretan una sola vez por request. Si se busca por texto, los
+# resultados se ordenan primero por relevancia.
+class PaginacionCursorMixin:
+    # Campos por los que se ordena el listado. El último debe ser único para que el cursor identifique una única fila.
+    orden_listado = ('-auditoria_creado_fecha', '-id')
+    # Búsquedas por texto del listado, como tuplas (parámetro de la query, modelo, campo, relación con el modelo). Con
+    # el primer parámetro que tenga texto se ordena por relevancia antes que por orden_listado.
+    busquedas_listado = ()
+    cursor_siguiente = None
+    cantidad_registros = None
+    cantidad_exacta = True
+    filtros_listado = None
+
+    def get_filtros_listado(self, request):
+        """
+            Devuelve una copia de los filtros de la query, que se calculan con get_filtros una sola vez por request.
+            @param request: Request
+            @return: dict
+        """
+        if self.filtros_listado is None:
+            self.filtros_listado = self.get_filtros(request)
+        return dict(self.filtros_listado)
+
+    def get_cantidad_listado(self, request):
+        """
+            Devuelve la cantidad de registros del listado sin tener en cuenta la página. Si la página se obtuvo con
+            paginar se usa la cantidad calculada en la misma consulta.
+            @param request: Request
+            @return: int
+        """
+        if self.cantidad_registros is not None:
+            return self.cantidad_registros
+        return self.get_cantidad_registros(request)
+
+    def paginar(self, request, queryset, offset, limit):
+        """
+            Ordena el queryset según el orden del listado y devuelve la página pedida.
+            @param request: Request
+            @param queryset: QuerySet
+            @param offset: int
+            @param limit: int
+            @return: List
+        """
+        relevancia = self.get_relevancia_listado(request)
+        if relevancia is not None:
+            queryset = queryset.annotate(relevancia=relevancia)
+            self.orden_listado = ('relevancia',) + tuple(type(self).orden_listado)
+        queryset = queryset.order_by(*self.orden_listado)
+        self.cursor_siguiente = None
+        cursor = request.query_params.get('cursor', None)
+        if cursor is None:
+            filas, self.cantidad_registros = get_pagina(queryset, offset, limit)
+            return filas
+
+        registros = limit - offset
+        valores, cantidad = self.decodificar_cursor(queryset.model, cursor)
+        completo = queryset
+        if valores is not None:
+            queryset = queryset.filter(self.get_filtro_cursor(valores))
+        filas = list(queryset[:registros + 1])
+        # Si el listado entra en la primera página no hace falta contarlo.
+        if cantidad is None:
+            cantidad = (len(filas), True) if len(filas) <= registros else contar_acotado(completo)
+        self.cantidad_registros, self.cantidad_exacta = cantidad
+        if len(filas) > registros:
+            filas = filas[:registros]
+            self.cursor_siguiente = self.codificar_cursor(filas[-1], cantidad)
+        return filas
+
+    def get_relevancia_listado(self, request):
+        """
+            Devuelve la expresión de relevancia de la primera búsqueda por texto del listado que tenga texto en la
+            query, o None si no se busca por texto.
+            @param request: Request
+            @return: Case|None
+        """
+        for parametro, modelo, campo, relacion in self.busquedas_listado:
+            texto = request.query_params.get(parametro, "")
+            if len(texto) > 0:
+                return get_relevancia(modelo, campo, texto, relacion)
+        return None
+
+    def get_datos_cursor(self, request):
+        """
+            Devuelve los datos de paginación a agregar a la respuesta del listado. Solo se agregan si se pidió la
+            paginación por clave, siendo el cursor None cuando no hay más páginas. Si el listado supera
+            CONTEO_EXACTO_MAXIMO registros la cantidad informada es ese máximo más uno y no es exacta.
+            @param request: Request
+            @return: dict
+        """
+        if request.query_params.get('cursor', None) is None:
+            return {}
+        return {"cursor": self.cursor_siguiente, "registros_exacto": self.cantidad_exacta}
+
+    def get_filtro_cursor(self, valores):
+        """
+            Devuelve la condición de las filas posteriores a los valores del cursor según el orden del listado.
+            @param valores: List
+            @return: Q
+        """
+        filtro = None
+        for indice, campo in enumerate(self.orden_listado):
+            nombre, descendente = self.get_campo_orden(campo)
+            operador = "__lt" if descendente else "__gt"
+            condicion = Q(**{nombre + operador: valores[indice]})
+            for anterior, valor in zip(self.orden_listado[:indice], valores[:indice]):
+                condicion &= Q(**{self.get_campo_orden(anterior)[0]: valor})
+            filtro = condicion if filtro is None else filtro | condicion
+
+        # Acota por el primer campo para que la base de datos recorra solo un rango del índice.
+        nombre, descendente = self.get_campo_orden(self.orden_listado[0])
+        operador = "__lte" if descendente else "__gte"
+        return Q(**{nombre + operador: valores[0]}) & filtro
+
+    @staticmethod
+    def get_campo_orden(campo):
+        """
+            Devuelve el nombre del campo de orden y si el orden es descendente.
+            @param campo: str
+            @return: Tuple<str, bool>
+        """
+        if campo.startswith('-'):
+            return campo[1:], True
+        return campo, False
+
+    def codificar_cursor(self, fila, cantidad):
+        """
+            Devuelve el cursor opaco con los valores de orden de la fila y la cantidad de registros del listado.
+            @param fila: Model
+            @param cantidad: Tuple<int, bool> Cantidad de registros y si es exacta.
+            @return: str
+        """
+        valores = []
+        for campo in self.orden_listado:
+            valor = getattr(fila, self.get_campo_orden(campo)[0])
+            if isinstance(valor, (datetime.date, datetime.datetime)):
+                valor = valor.isoformat()
+            valores.append(valor)
+        texto = json.dumps([valores, list(cantidad)], separators=(',', ':'))
+        return base64.urlsafe_b64encode(texto.encode()).decode()
+
+    def decodificar_cursor(self, modelo, cursor):
+        """
+            Devuelve los valores de orden del cursor y la cantidad de registros del listado. Si el cursor está vacío o
+            no es válido devuelve None en ambos, por lo que se lista desde la primera página.
+            @param modelo: Type<Model>
+            @param cursor: str
+            @return: Tuple<List|None, Tuple<int, bool>|None>
+        """
+        if cursor == "":
+            return None, None
+        try:
+            valores, cantidad = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            if not isinstance(valores, list) or len(valores) != len(self.orden_listado):
+                return None, None
+            if not isinstance(cantidad, list) or len(cantidad) != 2 or not isinstance(cantidad[0], int):
+                return None, None
+            valores = [self.convertir_valor_cursor(modelo, campo, valor)
+                       for campo, valor in zip(self.orden_listado, valores)]
+            return valores, (cantidad[0], cantidad[1] is True)
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, ValidationError):
+            return None, None
+
+    def convertir_valor_cursor(self, modelo, campo, valor):
+        """
+            Convierte el valor leído del cursor al tipo del campo de orden. Los campos calculados, como la relevancia,
+            se usan como vienen.
+            @param modelo: Type<Model>
+            @param campo: str
+            @param valor: any
+            @return: any
+        """
+        try:
+            return modelo._meta.get_field(self.get_campo_orden(campo)[0]).to_python(valor)
+        except FieldDoesNotExist:
+            return valor
@@ -13,7 +13,8 @@ def get_usuario(pk, rol=None):
         if isinstance(pk, int):
             filtros["id"] = pk
         if isinstance(rol, str):
-            filtros["roles__nombre__contains"] = rol
+            nombres = Rol.get_nombres_contiene(rol)
+            filtros["roles_mascara__in"] = Rol.get_mascaras(con=nombres)
         return Usuario.objects.get(**filtros)
     except Usuario.DoesNotExist:
         return None
@@ -1,8 +1,10 @@
+from base.operaciones import get_operacion, get_mascara_operaciones
 from base.signals import get_usuario_logueado
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 from rest_framework import serializers
 from rest_framework.authtoken.views import Token
 from .models import Usuario, Rol
-import secrets
 
 
 # ModelSerializer que permite devolver los mensajes en forma de lista de cadenas de texto.
@@ -22,6 +24,91 @@ class CustomModelSerializer(serializers.ModelSerializer):
                 mensajes = mensajes + recursivos
         return mensajes
 
+    def get_dato_contexto(self, clave, objeto):
+        """
+            Devuelve el dato precalculado para el objeto por el listado, que lo pasa en el contexto como un diccionario
+            por id. Si no fue calculado devuelve None.
+            @param clave: str
+            @param objeto: Model
+            @return: any|None
+        """
+        datos = self.context.get(clave, {})
+        return datos.get(objeto.id)
+
+    def armar_operaciones(self, entidad, acciones, objeto):
+        """
+            Devuelve las operaciones permitidas del objeto con sus datos de presentación. Si el listado pidió las
+            operaciones compactas devuelve solo la máscara de bits de las acciones.
+            @param entidad: str
+            @param acciones: List
+            @param objeto: Model
+            @return: List|int
+        """
+        if self.context.get('operaciones_compactas', False):
+            return get_mascara_operaciones(entidad, acciones)
+        return [get_operacion(entidad, accion, objeto) for accion in acciones]
+
+
+def get_plan_precarga(serializador):
+    """
+        Devuelve las relaciones que hay que precargar para serializar un listado, recorriendo los serializadores
+        anidados. Las claves foráneas se unen en la misma consulta y las relaciones múltiples se precargan con un
+        Prefetch que aplica a su vez el plan del serializador anidado. Además de los serializadores anidados, cada
+        serializador puede declarar en 'relaciones_listado' las claves foráneas que lee en to_representation.
+        @param serializador: Type<ModelSerializer>
+        @return: Tuple<List<str>, List<Prefetch>>
+    """
+    modelo = serializador.Meta.model
+    select = list(getattr(serializador, 'relaciones_listado', []))
+    prefetch = []
+    for campo in serializador().fields.values():
+        muchos = isinstance(campo, serializers.ListSerializer)
+        hijo = campo.child if muchos else campo
+        if not isinstance(hijo, serializers.ModelSerializer):
+            continue
+        try:
+            relacion = modelo._meta.get_field(campo.source)
+        except FieldDoesNotExist:
+            continue
+        select_hijo, prefetch_hijo = get_plan_precarga(type(hijo))
+        if relacion.many_to_one or relacion.one_to_one:
+            select.append(campo.source)
+            select += [campo.source + "__" + nombre for nombre in select_hijo]
+            for precarga in prefetch_hijo:
+                prefetch.append(Prefetch(campo.source + "__" + precarga.prefetch_through, queryset=precarga.queryset))
+        else:
+            queryset = aplicar_precargas(hijo.Meta.model.objects.all(), select_hijo, prefetch_hijo)
+            prefetch.append(Prefetch(campo.source, queryset=queryset))
+    return list(dict.fromkeys(select)), prefetch
+
+
+def aplicar_precargas(queryset, select, prefetch):
+    """
+        Aplica las relaciones a precargar al queryset. Sin relaciones no llama a select_related, que en ese caso uniría
+        todas las claves foráneas.
+        @param queryset: QuerySet
+        @param select: List<str>
+        @param prefetch: List<Prefetch>
+        @return: QuerySet
+    """
+    if len(select) > 0:
+        queryset = queryset.select_related(*select)
+    if len(prefetch) > 0:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def precargar_listado(queryset, serializador):
+    """
+        Aplica al queryset el plan de precarga del serializador, de forma que la cantidad de consultas del listado no
+        dependa de la cantidad de filas ni de líneas.
+        @param queryset: QuerySet
+        @param serializador: Type<ModelSerializer>
+        @return: QuerySet
+    """
+    select, prefetch = get_plan_precarga(serializador)
+    return aplicar_precargas(queryset, select, prefetch)
+
 
 # Serializador de los roles del usuario.
 class RolSerializer(serializers.ModelSerializer):
@@ -38,7 +125,7 @@ class UsuarioSerializer(CustomModelSerializer):
     class Meta:
         model = Usuario
         fields = ['id', 'username', 'email', 'first_name', 'roles', 'habilitado', 'password', 'dni', 'operaciones',
-                  'esAdmin', 'esMozo', 'esComensal', 'esVendedor', 'observaciones', 'operaciones_listado', 'direccion', 'token_email', 'token_reset']
+                  'esAdmin', 'esMozo', 'esComensal', 'esVendedor', 'observaciones', 'operaciones_listado', 'direccion']
 
     # Método que devuelve los datos del usuario. Quito la contraseña para que no sea mostrada al usuario.
     def to_representation(self, instance):
@@ -48,70 +135,42 @@ class UsuarioSerializer(CustomModelSerializer):
         ret['puede_deshabilitarse'] = instance.habilitado
         ret['puede_habilitarse'] = not instance.habilitado
         ret['habilitado_texto'] = "Activo" if instance.habilitado else "Deshabilitado"
-        ret['url_activacion'] = instance.get_url_activacion()
 
         estado = "text-success" if instance.habilitado else "text-danger"
         ret['habilitado_clase'] = estado + " font-weight-bold"
         return ret
 
+    # Devuelve el contexto con los datos de las operaciones calculados para todos los usuarios del listado.
+    @staticmethod
+    def get_contexto_listado(ids):
+        return {'usuarios_borrables': Usuario.get_pueden_borrarse(ids)}
+
     # Devuelve las operaciones disponibles para el usuario actual.
     def get_operaciones_listado(self, objeto):
-        operaciones = []
+        acciones = []
 
         logueado = get_usuario_logueado()
         esAdmin = logueado.esAdmin
 
-        accion = 'editar'
         if esAdmin:
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-success text-success',
-                'texto': 'Editar',
-                'icono': 'fas fa-pencil-alt',
-                'title': 'Editar Usuario ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-
-        puede_borrar = objeto.comprobar_puede_borrarse()
+            acciones.append('editar')
+
+        puede_borrar = self.get_dato_contexto('usuarios_borrables', objeto)
+        if puede_borrar is None:
+            puede_borrar = objeto.comprobar_puede_borrarse()
         if puede_borrar and esAdmin:
-            accion = 'borrar'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-danger text-danger',
-                'texto': 'Borrar',
-                'icono': 'fas fa-trash-alt',
-                'title': 'Borrar Usuario ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
+            acciones.append('borrar')
 
         habilitado = objeto.habilitado
         if habilitado:
-            accion = 'deshabilitar'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-secondary text-secondary',
-                'texto': 'Deshabilitar',
-                'icono': 'fas fa-ban',
-                'title': 'Deshabilitar Usuario ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
+            acciones.append('deshabilitar')
         else:
-            accion = 'habilitar'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-primary text-primary',
-                'texto': 'Habilitar',
-                'icono': 'fas fa-trash-alt',
-                'title': 'Habilitar Usuario ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-
-        return operaciones
+            acciones.append('habilitar')
+
+        return self.armar_operaciones('usuario', acciones, objeto)
 
     # Método de creación de un usuario.
     def create(self, validated_data):
         user = Usuario.objects.create_user(**validated_data)
-        user.token_email = secrets.token_hex(16)
-        user.save()
         Token.objects.create(user=user)
         return user
@@ -26,3 +26,108 @@ def agregar_auditoria_creado(entidad, logueado):
 def agregar_auditoria_actualizado(entidad, logueado):
     entidad.auditoria_modificado = logueado
     entidad.auditoria_modificado_fecha = datetime.datetime.now()
+
+
+def actualizar_mascara_roles(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+        Mantiene sincronizada la máscara de roles del usuario con la colección de roles.
+    """
+    # Si se limpian los usuarios de un rol guardo los usuarios afectados antes de que se pierda la relación.
+    if action == 'pre_clear' and reverse:
+        instance._usuarios_mascara = list(instance.usuarios_roles.values_list('pk', flat=True))
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        instance.actualizar_mascara_roles()
+        invalidar_cache_token(sender, instance)
+        invalidar_cache_totales(type(instance), instance)
+        return
+
+    ids = pk_set if action != 'post_clear' else getattr(instance, '_usuarios_mascara', [])
+    for usuario in model.objects.filter(pk__in=ids):
+        usuario.actualizar_mascara_roles()
+        invalidar_cache_token(sender, usuario)
+    invalidar_cache_totales(model, instance)
+
+
+def invalidar_cache_token(sender, instance, **kwargs):
+    """
+        Invalida en la caché de autenticación los tokens del usuario guardado o borrado, o el token borrado.
+    """
+    from base.token import invalidar_tokens, invalidar_tokens_usuario
+    if sender._meta.label == 'authtoken.Token':
+        invalidar_tokens([instance.key])
+    else:
+        invalidar_tokens_usuario(instance.pk)
+
+
+def invalidar_cache_totales(sender, instance, **kwargs):
+    """
+        Quita de la caché los totales de los listados del modelo del registro creado, guardado o borrado.
+    """
+    from base.totales import invalidar_totales
+    invalidar_totales(sender)
+
+
+def invalidar_cache_catalogo(sender, instance, **kwargs):
+    """
+        Invalida las respuestas guardadas del catálogo público cuando se crea, guarda o borra un registro que se
+        muestra en él.
+    """
+    from producto.catalogo import invalidar_catalogo
+    invalidar_catalogo()
+
+
+def registrar_eliminacion(sender, instance, **kwargs):
+    """
+        Registra el borrado del objeto para informarlo a los clientes que sincronizan los cambios.
+    """
+    from base.models import Eliminacion
+    Eliminacion.objects.create(modelo=sender._meta.label, objeto_id=instance.pk)
+
+
+def actualizar_texto_busqueda(sender, instance, **kwargs):
+    """
+        Actualiza las columnas con el texto normalizado de los campos de búsqueda del registro a guardar.
+    """
+    from base.busqueda import CAMPOS_BUSQUEDA, normalizar_texto
+    for campo, columna in CAMPOS_BUSQUEDA[sender._meta.label].items():
+        if columna != campo:
+            setattr(instance, columna, normalizar_texto(getattr(instance, campo)))
+
+
+def actualizar_indice_busqueda(sender, instance, update_fields=None, **kwargs):
+    """
+        Actualiza el índice de búsqueda del registro guardado, salvo que se hayan guardado solo otros campos.
+    """
+    from base.busqueda import CAMPOS_BUSQUEDA, actualizar_indice
+    if update_fields is not None and not set(update_fields) & set(CAMPOS_BUSQUEDA[sender._meta.label]):
+        return
+    actualizar_indice(instance)
+
+
+def borrar_indice_busqueda(sender, instance, **kwargs):
+    """
+        Quita del índice de búsqueda al registro borrado.
+    """
+    from base.models import TrigramaBusqueda
+    TrigramaBusqueda.objects.filter(modelo=sender._meta.label, objeto_id=instance.pk).delete()
+
+
+def comprobar_superior_categoria(sender, instance, **kwargs):
+    """
+        Impide guardar una categoría debajo de sí misma o de una de sus inferiores, que dejaría un ciclo en el árbol.
+    """
+    from django.core.exceptions import ValidationError
+    if not instance.comprobar_puede_moverse(instance.superior):
+        raise ValidationError("La categoría no puede ubicarse debajo de sí misma o de una de sus inferiores.")
+
+
+def actualizar_ruta_categoria(sender, instance, **kwargs):
+    """
+        Actualiza la ruta de la categoría guardada y la de sus inferiores si se movió de categoría superior.
+    """
+    instance.actualizar_ruta()
@@ -0,0 +1,807 @@
+from base.busqueda import buscar, get_trigramas, reindexar
+from base.models import Eliminacion, Rol, TrigramaBusqueda, Usuario
+from base.moneda import crear_formateador_moneda, formatear_moneda
+from base.token import CacheTokenAuthentication
+from base.totales import CLAVE_VERSION, get_cache_totales, get_total
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from gastronomia.models import Estado, Pedido, PedidoLinea, Venta, VentaLinea
+from gastronomia.repositorio import crear_pedido, crear_venta
+from mesas.models import Mesa, OrdenProducto, Turno
+from producto.models import Categoria, Ingreso, IngresoLinea, MovimientoStock, Producto, ReemplazoMercaderia, \
+    ReemplazoMercaderiaLinea
+from producto.stock import aplicar_movimientos
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from unittest import mock
+import datetime
+import locale
+import re
+
+# Los listados se piden para el último mes, mientras que los datos de prueba abarcan años, así el filtro por fecha es
+# selectivo y el optimizador tiene motivos para usar los índices.
+HOY = datetime.date.today()
+FECHAS = 'fechaDesde=' + (HOY - datetime.timedelta(days=30)).isoformat() + '&fechaHasta=' + HOY.isoformat()
+# Cantidad de registros de prueba por tabla grande, uno por día hacia atrás desde hoy.
+REGISTROS_PRUEBA = 1000
+
+# Tablas que crecen con el uso del sistema. Las consultas de los listados sobre ellas no deben recorrer la tabla completa.
+TABLAS_GRANDES = [
+    'gastronomia_pedido', 'gastronomia_pedidolinea', 'gastronomia_estado', 'gastronomia_venta',
+    'gastronomia_ventalinea', 'mesas_turnos', 'producto_movimientostock', 'producto_ingreso', 'producto_ingresolinea',
+    'producto_reemplazomercaderia', 'producto_reemplazomercaderialinea', 'producto_producto', 'base_eliminacion',
+]
+
+# Conteos de los totales de los listados, que por diseño leen como máximo CONTEO_EXACTO_MAXIMO + 1 filas.
+CONTEO_ACOTADO = re.compile(r'^SELECT COUNT\(\*\) FROM \(SELECT .* LIMIT \d+\) subquery$', re.DOTALL)
+
+
+class PlanesListadosTest(TestCase):
+    """
+        Comprueba con el plan de ejecución de la base de datos que las consultas de los listados sobre las tablas grandes
+        se resuelvan con índices.
+    """
+    LISTADOS = [
+        '/api/gastronomia/pedido/?' + FECHAS,
+        '/api/gastronomia/pedido/?' + FECHAS + '&estado=abierto',
+        '/api/gastronomia/pedido/listado_vendedor/?' + FECHAS,
+        '/api/gastronomia/venta//?' + FECHAS,
+        '/api/gastronomia/venta//?' + FECHAS + '&tipo=almacen&estado=activo',
+        '/api/producto/ingreso//?' + FECHAS,
+        '/api/producto/movimientos//?' + FECHAS,
+        '/api/producto/reemplazos//?' + FECHAS,
+        '/api/mesas/turno/turnos/?idMesa={mesa}&' + FECHAS,
+        '/api/mesas/turno/turnos/?idMesa={mesa}&estado=abierto&' + FECHAS,
+        '/api/producto/cambios/?desde=' + (HOY - datetime.timedelta(days=30)).isoformat() + 'T00:00:00',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        if connection.vendor not in ('sqlite', 'mysql'):
+            return
+        cls.usuario = Usuario.objects.get(email='root@gmail.com')
+        cls.mesas = [Mesa.objects.create(numero=900 + indice) for indice in range(10)]
+        cls.mesa = cls.mesas[0]
+        cls.crear_registros_prueba()
+
+        # Actualiza las estadísticas de las tablas para que el optimizador conozca la cantidad de registros.
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute("ANALYZE")
+            else:
+                cursor.execute("ANALYZE TABLE " + ", ".join(TABLAS_GRANDES))
+
+    @classmethod
+    def crear_registros_prueba(cls):
+        """
+            Crea REGISTROS_PRUEBA registros en cada tabla grande, con fechas repartidas hacia atrás desde hoy.
+            @return: None
+        """
+        usuario = cls.usuario
+        ahora = datetime.datetime.now()
+        fechas = [ahora - datetime.timedelta(days=dia) for dia in range(REGISTROS_PRUEBA)]
+        categoria = Categoria.objects.first()
+        auditoria = lambda fecha: {'auditoria_creado_fecha': fecha, 'auditoria_modificado_fecha': fecha,
+                                   'auditoria_creador': usuario, 'auditoria_modificado': usuario}
+
+        productos = cls.crear_lote(Producto, [
+            Producto(categoria=categoria, nombre="Producto de prueba " + str(indice), costo_vigente=10,
+                     precio_vigente=20, stock=100, **auditoria(fecha))
+            for indice, fecha in enumerate(fechas)])
+        ventas = cls.crear_lote(Venta, [
+            Venta(usuario=usuario, tipo=Venta.ALMACEN if indice % 2 else Venta.ONLINE, **auditoria(fecha))
+            for indice, fecha in enumerate(fechas)])
+        lineas_venta = cls.crear_lote(VentaLinea, [
+            VentaLinea(venta=venta, producto=producto, cantidad=1, precio=20, total=20)
+            for venta, producto in zip(ventas, productos)])
+
+        pedidos = cls.crear_lote(Pedido, [
+            Pedido(usuario=usuario, fecha=fecha, total=20, ultimo_estado=Estado.ABIERTO if indice % 2 else Estado.RECIBIDO,
+                   **auditoria(fecha))
+            for indice, fecha in enumerate(fechas)])
+        cls.crear_lote(PedidoLinea, [
+            PedidoLinea(pedido=pedido, producto=producto, cantidad=1, subtotal=20, total=20)
+            for pedido, producto in zip(pedidos, productos)])
+        cls.crear_lote(Estado, [Estado(pedido=pedido, estado=pedido.ultimo_estado, fecha=pedido.fecha)
+                                for pedido in pedidos])
+
+        ingresos = cls.crear_lote(Ingreso, [Ingreso(usuario=usuario, fecha=fecha, **auditoria(fecha)) for fecha in fechas])
+        lineas_ingreso = cls.crear_lote(IngresoLinea, [
+            IngresoLinea(ingreso=ingreso, producto=producto, cantidad=1, costo=10, total=10)
+            for ingreso, producto in zip(ingresos, productos)])
+
+        reemplazos = cls.crear_lote(ReemplazoMercaderia, [
+            ReemplazoMercaderia(usuario=usuario, fecha=fecha, **auditoria(fecha)) for fecha in fechas])
+        cls.crear_lote(ReemplazoMercaderiaLinea, [
+            ReemplazoMercaderiaLinea(reemplazo=reemplazo, producto=producto, stock_anterior=1, stock_nuevo=1,
+                                     cantidad_ingreso=0, cantidad_egreso=0)
+            for reemplazo, producto in zip(reemplazos, productos)])
+
+        cls.crear_lote(MovimientoStock, [
+            MovimientoStock(producto=venta_linea.producto, cantidad=1, saldo=indice, descripcion="Movimiento de prueba",
+                            venta_linea=venta_linea, ingreso_linea=ingreso_linea, **auditoria(venta_linea.venta.auditoria_creado_fecha))
+            for indice, (venta_linea, ingreso_linea) in enumerate(zip(lineas_venta, lineas_ingreso))])
+
+        cls.crear_lote(Turno, [
+            Turno(mesa=cls.mesas[indice % len(cls.mesas)], mozo=usuario, hora_inicio=fecha, estado=Turno.ABIERTO if indice % 2 else Turno.CERRADO,
+                  **auditoria(fecha))
+            for indice, fecha in enumerate(fechas)])
+
+        cls.crear_lote(Eliminacion, [Eliminacion(modelo='producto.Producto', objeto_id=indice, fecha=fecha)
+                                     for indice, fecha in enumerate(fechas)])
+
+    @staticmethod
+    def crear_lote(modelo, objetos):
+        """
+            Guarda los objetos en un solo INSERT con ids asignados, ya que MySQL no los devuelve en bulk_create.
+            @param modelo: Type<Model>
+            @param objetos: List<Model>
+            @return: List<Model>
+        """
+        siguiente = (modelo.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        for indice, objeto in enumerate(objetos):
+            objeto.id = siguiente + indice
+        return modelo.objects.bulk_create(objetos)
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'mysql'):
+            self.skipTest("No se puede interpretar el plan de ejecución de " + connection.vendor)
+
+        token, creado = Token.objects.get_or_create(user=self.usuario)
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        # Ventas de hoy creadas por la API, para que los listados precarguen sus líneas y movimientos reales.
+        productos = list(Producto.objects.filter(venta_directa=True, stock__gt=10)[:3])
+        self.assertEqual(len(productos), 3, "No hay productos con stock para crear las ventas.")
+        for producto in productos:
+            lineas = [{'producto': {'id': producto.id}, 'cantidad': 1}]
+            respuesta = self.cliente.post('/api/gastronomia/venta//', {'lineas': lineas}, format='json')
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertTrue(respuesta.json()['exito'], respuesta.content)
+
+    def test_listados_usan_indices(self):
+        for url in self.LISTADOS:
+            url = url.format(mesa=self.mesa.id)
+            with self.subTest(url=url):
+                consultas = self.capturar_consultas(url)
+                self.assertGreater(len(consultas), 0)
+                for sql, parametros in consultas:
+                    recorridas = self.get_tablas_recorridas(sql, parametros)
+                    self.assertEqual(recorridas, [], "Recorrido completo en: " + sql)
+
+    def capturar_consultas(self, url):
+        """
+            Devuelve las consultas SELECT que ejecuta el listado, con sus parámetros.
+            @param url: str
+            @return: List<Tuple<str, tuple>>
+        """
+        consultas = []
+
+        def capturar(ejecutar, sql, parametros, varias, contexto):
+            if sql.lstrip().upper().startswith('SELECT') and CONTEO_ACOTADO.match(sql) is None:
+                consultas.append((sql, parametros))
+            return ejecutar(sql, parametros, varias, contexto)
+
+        with connection.execute_wrapper(capturar):
+            respuesta = self.cliente.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return consultas
+
+    def get_tablas_recorridas(self, sql, parametros):
+        """
+            Devuelve las tablas grandes que el plan de ejecución de la consulta recorre completas. En MySQL es recorrido
+            completo el acceso ALL aunque haya índices aplicables, ya que es justamente lo que pasa si el optimizador
+            deja de usarlos.
+            @param sql: str
+            @param parametros: tuple
+            @return: List<str>
+        """
+        alias = self.get_alias_tablas(sql)
+        recorridas = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, parametros)
+                for fila in cursor.fetchall():
+                    buscado = re.match(r'SCAN (?:TABLE )?(\w+)', fila[-1])
+                    if buscado is not None:
+                        recorridas.append(alias.get(buscado.group(1), buscado.group(1)))
+            else:
+                cursor.execute("EXPLAIN " + sql, parametros)
+                columnas = [columna[0] for columna in cursor.description]
+                for fila in cursor.fetchall():
+                    plan = dict(zip(columnas, fila))
+                    if plan['type'] == 'ALL' and plan['table'] is not None:
+                        recorridas.append(alias.get(plan['table'], plan['table']))
+        return [tabla for tabla in recorridas if tabla in TABLAS_GRANDES]
+
+    @staticmethod
+    def get_alias_tablas(sql):
+        """
+            Devuelve las tablas de la consulta según el alias que les asigna Django en las subconsultas.
+            @param sql: str
+            @return: dict
+        """
+        alias = {}
+        for tabla, nombre in re.findall(r'(?:FROM|JOIN)\s+[`"](\w+)[`"]\s+(?:AS\s+)?[`"]?([UT]\d+)\b', sql):
+            alias[nombre] = tabla
+        return alias
+
+
+class CacheTokenAuthenticationTest(TestCase):
+    """
+        Comprueba que la caché de autenticación por token no consulte la base de datos mientras el usuario no cambia y
+        que deje de aceptar sus datos anteriores cuando cambia.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.get(email='root@gmail.com')
+        self.token, creado = Token.objects.get_or_create(user=self.usuario)
+        self.autenticacion = CacheTokenAuthentication()
+
+    def test_sin_consultas_en_cache(self):
+        primero, token = self.autenticacion.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            segundo, token = self.autenticacion.authenticate_credentials(self.token.key)
+        self.assertEqual(segundo.pk, self.usuario.pk)
+        self.assertIsNot(primero, segundo)
+
+    def test_invalida_al_deshabilitar(self):
+        self.autenticacion.authenticate_credentials(self.token.key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.is_active = False
+            self.usuario.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticacion.authenticate_credentials(self.token.key)
+
+    def test_invalida_al_cambiar_roles(self):
+        self.autenticacion.authenticate_credentials(self.token.key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.roles.clear()
+        usuario, token = self.autenticacion.authenticate_credentials(self.token.key)
+        self.assertEqual(usuario.roles_mascara, 0)
+
+    def test_no_guarda_datos_leidos_antes_de_invalidar(self):
+        # Un request lee el usuario mientras otro lo modifica: la entrada que guarda no debe usarse.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.is_active = False
+            self.usuario.save()
+            Usuario.objects.filter(pk=self.usuario.pk).update(is_active=True)
+            self.autenticacion.authenticate_credentials(self.token.key)
+            Usuario.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticacion.authenticate_credentials(self.token.key)
+
+
+class PaginacionCursorTest(TestCase):
+    """
+        Comprueba que la paginación por cursor recorra todo el listado sin repetir filas y que solo cuente los
+        registros en la primera página.
+    """
+
+    def setUp(self):
+        usuario = Usuario.objects.get(email='root@gmail.com')
+        token, creado = Token.objects.get_or_create(user=usuario)
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        producto = Producto.objects.first()
+        aplicar_movimientos([MovimientoStock(producto=producto, cantidad=1, descripcion="Ingreso") for i in range(25)])
+        # Fuera de un request los movimientos no tienen usuario creador, que el listado muestra.
+        MovimientoStock.objects.update(auditoria_creador=usuario)
+        self.ids = list(MovimientoStock.objects.order_by('-auditoria_creado_fecha', '-id').values_list('id', flat=True))
+
+    def test_recorre_listado_contando_una_vez(self):
+        url = '/api/producto/movimientos//?' + FECHAS + '&registrosPorPagina=10&cursor='
+        cursor, ids, pagina = '', [], 0
+        while cursor is not None:
+            with CaptureQueriesContext(connection) as capturadas:
+                datos = self.cliente.get(url + cursor).json()['datos']
+            conteos = [consulta['sql'] for consulta in capturadas.captured_queries if 'COUNT' in consulta['sql']]
+            self.assertEqual(len(conteos), 1 if pagina == 0 else 0)
+            self.assertEqual(datos['registros'], len(self.ids))
+            self.assertTrue(datos['registros_exacto'])
+            ids += [movimiento['id'] for movimiento in datos['movimientos']]
+            cursor, pagina = datos['cursor'], pagina + 1
+        self.assertEqual(ids, self.ids)
+
+
+class TokensEmailTest(TestCase):
+    """
+        Comprueba que de los tokens enviados por email se guarde solo el hash y que dejen de aceptarse al vencer.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.get(email='root@gmail.com')
+
+    def vencer(self, campo, horas):
+        fecha = datetime.datetime.now() - datetime.timedelta(hours=horas)
+        Usuario.objects.filter(pk=self.usuario.pk).update(**{campo: fecha})
+
+    def test_guarda_solo_el_hash(self):
+        token = self.usuario.generar_token_email()
+        self.usuario.save()
+        guardado = Usuario.objects.values_list('token_email', flat=True).get(pk=self.usuario.pk)
+        self.assertNotEqual(guardado, token)
+        self.assertEqual(Usuario.buscar_por_token_email(token).pk, self.usuario.pk)
+        self.assertIsNone(Usuario.buscar_por_token_email(guardado))
+
+    @override_settings(TOKEN_EMAIL_HORAS=24, TOKEN_RESET_HORAS=2)
+    def test_token_vencido_no_se_acepta(self):
+        email = self.usuario.generar_token_email()
+        reset = self.usuario.generar_token_reset()
+        self.usuario.save()
+        self.vencer('fecha_token_email', 23)
+        self.vencer('fecha_token_reset', 3)
+        self.assertIsNotNone(Usuario.buscar_por_token_email(email))
+        self.assertIsNone(Usuario.buscar_por_token_reset(reset))
+
+        self.vencer('fecha_token_email', 25)
+        self.assertIsNone(Usuario.buscar_por_token_email(email))
+
+    @override_settings(TOKEN_EMAIL_HORAS=24, TOKEN_RESET_HORAS=2)
+    def test_purga_solo_tokens_vencidos(self):
+        self.usuario.generar_token_email()
+        self.usuario.generar_token_reset()
+        self.usuario.save()
+        self.vencer('fecha_token_reset', 3)
+        self.assertEqual(Usuario.purgar_tokens_vencidos(), 1)
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        self.assertIsNotNone(usuario.token_email)
+        self.assertIsNone(usuario.token_reset)
+        self.assertIsNone(usuario.fecha_token_reset)
+
+
+class TotalesTest(TestCase):
+    """
+        Comprueba que los totales de los listados se guarden en la caché compartida y que cualquier proceso los invalide
+        al crear o borrar registros.
+    """
+
+    def setUp(self):
+        # Descarta los totales guardados por otras pruebas, cuyos datos se deshicieron al terminar.
+        get_cache_totales().clear()
+
+    def test_total_guardado_sin_consultas(self):
+        Mesa.objects.create(numero=901)
+        total, exacto = get_total(Mesa)
+        self.assertTrue(exacto)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_total(Mesa), (total, True))
+
+    def test_invalida_al_crear_y_borrar(self):
+        total, exacto = get_total(Mesa)
+        with self.captureOnCommitCallbacks(execute=True):
+            mesa = Mesa.objects.create(numero=901)
+        self.assertEqual(get_total(Mesa), (total + 1, True))
+        with self.captureOnCommitCallbacks(execute=True):
+            mesa.delete()
+        self.assertEqual(get_total(Mesa), (total, True))
+
+    def test_invalida_lo_guardado_por_otro_proceso(self):
+        total, exacto = get_total(Mesa, numero__gte=900)
+        Mesa.objects.create(numero=901)
+        # Otro proceso crea la mesa e invalida los totales: solo cambia la versión en la caché compartida.
+        get_cache_totales().set(CLAVE_VERSION + 'mesas.Mesa', "otro_proceso", None)
+        self.assertEqual(get_total(Mesa, numero__gte=900), (total + 1, True))
+
+    def test_filtros_largos_con_clave_acotada(self):
+        texto = "x" * 1000
+        self.assertEqual(get_total(Mesa, descripcion=texto), (0, True))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_total(Mesa, descripcion=texto), (0, True))
+
+
+@override_settings(CONTEO_EXACTO_MAXIMO=3)
+class TotalesAproximadosTest(TestCase):
+    """
+        Comprueba que por encima de CONTEO_EXACTO_MAXIMO registros el total se informe como aproximado, con la
+        estimación de las estadísticas de la tabla cuando no hay filtros, y que por debajo siga siendo exacto.
+    """
+
+    def setUp(self):
+        # Descarta los totales exactos y aproximados guardados por otras pruebas.
+        get_cache_totales().clear()
+        for indice in range(5):
+            Mesa.objects.create(numero=900 + indice, descripcion="grande" if indice < 4 else "chica")
+
+    def test_sin_filtros_usa_la_estimacion(self):
+        with mock.patch('base.totales.get_estimacion_filas', return_value=50000) as estimacion:
+            self.assertEqual(get_total(Mesa), (50000, False))
+            # La estimación se guarda y no vuelve a consultarse.
+            with self.assertNumQueries(0):
+                self.assertEqual(get_total(Mesa), (50000, False))
+        self.assertEqual(estimacion.call_count, 1)
+
+    def test_listado_informa_la_estimacion(self):
+        usuario = Usuario.objects.get(email='root@gmail.com')
+        token, creado = Token.objects.get_or_create(user=usuario)
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        with mock.patch('base.totales.get_estimacion_filas', return_value=50000):
+            datos = cliente.get('/api/producto/ingreso//?' + FECHAS).json()['datos']
+        self.assertEqual((datos['total'], datos['total_exacto']), (50000, False))
+
+    def test_con_filtros_cuenta_completo(self):
+        self.assertEqual(get_total(Mesa, descripcion="grande"), (4, False))
+
+    def test_listado_chico_es_exacto(self):
+        with mock.patch('base.totales.get_estimacion_filas', return_value=50000) as estimacion:
+            self.assertEqual(get_total(Mesa, descripcion="chica"), (1, True))
+        estimacion.assert_not_called()
+
+    def test_estimacion_chica_cuenta_exacto(self):
+        Mesa.objects.exclude(descripcion="chica").delete()
+        with mock.patch('base.totales.get_estimacion_filas', return_value=2):
+            self.assertEqual(get_total(Mesa), (1, True))
+
+
+class BusquedaTest(TestCase):
+    """
+        Comprueba que el índice de trigramas acompañe los cambios de los registros, que reindexar repare los cambios
+        hechos sin señales y que los listados ordenen los resultados de la búsqueda por relevancia.
+    """
+
+    def crear_usuario(self, nombre, dni):
+        usuario = Usuario.objects.create(email=str(dni) + "@prueba.com", username=str(dni), first_name=nombre, dni=dni)
+        usuario.agregar_rol_comensal()
+        return usuario
+
+    def get_encontrados(self, texto):
+        return set(Usuario.objects.filter(pk__in=buscar(Usuario, 'first_name', texto)).values_list('pk', flat=True))
+
+    def get_indexados(self, usuario):
+        indexados = TrigramaBusqueda.objects.filter(modelo='base.Usuario', campo='first_name', objeto_id=usuario.pk)
+        return set(indexados.values_list('trigrama', flat=True))
+
+    def test_indice_sigue_los_cambios(self):
+        usuario = self.crear_usuario("José Pérez", 30000001)
+        self.assertEqual(self.get_indexados(usuario), get_trigramas("José Pérez"))
+        self.assertIn(usuario.pk, self.get_encontrados("PEREZ"))
+
+        usuario.first_name = "Ana Gómez"
+        usuario.save()
+        self.assertEqual(self.get_indexados(usuario), get_trigramas("Ana Gómez"))
+        self.assertNotIn(usuario.pk, self.get_encontrados("perez"))
+        self.assertIn(usuario.pk, self.get_encontrados("gomez"))
+
+        id_usuario = usuario.pk
+        usuario.delete()
+        self.assertFalse(TrigramaBusqueda.objects.filter(modelo='base.Usuario', objeto_id=id_usuario).exists())
+
+    def test_reindexar_repara_cambios_sin_senales(self):
+        usuario = self.crear_usuario("José Pérez", 30000001)
+        Usuario.objects.filter(pk=usuario.pk).update(first_name="Ana Gómez")
+        self.assertNotIn(usuario.pk, self.get_encontrados("gomez"))
+
+        reindexar(Usuario)
+        self.assertIn(usuario.pk, self.get_encontrados("gomez"))
+        self.assertEqual(self.get_indexados(usuario), get_trigramas("Ana Gómez"))
+        self.assertEqual(Usuario.objects.get(pk=usuario.pk).nombre_busqueda, "ana gomez")
+
+    def test_texto_corto_compara_sin_indice(self):
+        usuario = self.crear_usuario("José Pérez", 30000001)
+        self.assertIn(usuario.pk, self.get_encontrados("pé"))
+        self.assertNotIn('trigramabusqueda', str(buscar(Usuario, 'first_name', "pe").query).lower())
+        self.assertIn('trigramabusqueda', str(buscar(Usuario, 'first_name', "per").query).lower())
+
+    def test_listado_ordena_por_relevancia(self):
+        contiene = self.crear_usuario("Ana Pereyra", 30000001)
+        exacto = self.crear_usuario("Pereyra", 30000002)
+        empieza = self.crear_usuario("Pereyra Juan", 30000003)
+        usuario = Usuario.objects.get(email='root@gmail.com')
+        token, creado = Token.objects.get_or_create(user=usuario)
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        datos = cliente.get('/api/usuarios/?nombre=pereyra').json()['datos']
+        self.assertEqual([fila['id'] for fila in datos['usuarios']], [exacto.pk, empieza.pk, contiene.pk])
+
+        # La paginación por cursor respeta el mismo orden.
+        ids, cursor = [], ""
+        while cursor is not None:
+            datos = cliente.get('/api/usuarios/?nombre=pereyra&registrosPorPagina=1&cursor=' + cursor).json()['datos']
+            ids += [fila['id'] for fila in datos['usuarios']]
+            cursor = datos['cursor']
+        self.assertEqual(ids, [exacto.pk, empieza.pk, contiene.pk])
+
+
+# Convenciones monetarias de es_AR en glibc, con las que locale.currency daba formato a los importes antes de usar
+# base.moneda. Se inyectan en locale para comparar sin depender de los locales instalados.
+CONVENCIONES_ES_AR = {
+    'int_curr_symbol': 'ARS ', 'currency_symbol': '$', 'mon_decimal_point': ',', 'mon_thousands_sep': '.',
+    'mon_grouping': [3, 3, 0], 'positive_sign': '', 'negative_sign': '-', 'int_frac_digits': 2, 'frac_digits': 2,
+    'p_cs_precedes': 1, 'p_sep_by_space': 1, 'n_cs_precedes': 1, 'n_sep_by_space': 1, 'p_sign_posn': 1,
+    'n_sign_posn': 1, 'decimal_point': ',', 'thousands_sep': '.', 'grouping': [3, 3, 0],
+}
+
+
+class MonedaTest(TestCase):
+    """
+        Comprueba que el formato de los importes sea el mismo que daba locale.currency con la configuración es_AR.
+    """
+
+    IMPORTES = [0, 0.0, -0.0, 0.001, 0.005, 0.015, 7, -7, 10.5, -10.5, 999.999, 1234.5, -1234.5, 1000000, -1234567.891,
+                21.0, 0.1 + 0.2, 123456789.125]
+
+    def get_formato_locale(self, importe, miles=False):
+        with mock.patch('locale.localeconv', return_value=CONVENCIONES_ES_AR):
+            return locale.currency(importe, grouping=miles)
+
+    def test_mismo_formato_que_locale(self):
+        for importe in self.IMPORTES:
+            with self.subTest(importe=importe):
+                self.assertEqual(formatear_moneda(importe), self.get_formato_locale(importe))
+
+    def test_mismo_formato_con_separador_de_miles(self):
+        formatear = crear_formateador_moneda('$', ',', '.', 2)
+        for importe in self.IMPORTES:
+            with self.subTest(importe=importe):
+                self.assertEqual(formatear(importe), self.get_formato_locale(importe, miles=True))
+
+    def test_ejemplos(self):
+        self.assertEqual(formatear_moneda(1234.5), "$ 1234,50")
+        self.assertEqual(formatear_moneda(-7), "-$ 7,00")
+        self.assertEqual(formatear_moneda(0), "$ 0,00")
+
+
+class RolesUsuarioTest(TestCase):
+    """
+        Comprueba que los flags de roles y las operaciones del usuario sigan los cambios de la colección de roles, aun
+        con los roles precargados.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create(email="roles@prueba.com", username="roles")
+        self.mozo = Rol.objects.get(nombre=Rol.MOZO)
+        self.admin = Rol.objects.get(nombre=Rol.ADMINISTRADOR)
+
+    def get_titulos(self, usuario):
+        return [operacion['titulo'] for operacion in usuario.operaciones]
+
+    def test_flags_siguen_los_roles(self):
+        usuario = Usuario.objects.prefetch_related('roles').get(pk=self.usuario.pk)
+        self.assertFalse(usuario.esMozo)
+        self.assertNotIn("Productos", self.get_titulos(usuario))
+
+        usuario.roles.add(self.mozo, self.admin)
+        self.assertTrue(usuario.esMozo)
+        self.assertTrue(usuario.esAdmin)
+        self.assertIn("Productos", self.get_titulos(usuario))
+
+        usuario.roles.remove(self.admin)
+        self.assertTrue(usuario.esMozo)
+        self.assertFalse(usuario.esAdmin)
+        self.assertNotIn("Productos", self.get_titulos(usuario))
+
+        usuario.roles.clear()
+        self.assertFalse(usuario.esMozo)
+        self.assertEqual(usuario.roles_mascara, 0)
+
+    def test_flags_sin_consultas(self):
+        self.usuario.roles.add(self.mozo)
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(usuario.esMozo)
+            self.assertFalse(usuario.esAdmin)
+            self.assertFalse(usuario.esVendedor)
+
+
+class MascaraRolesTest(TestCase):
+    """
+        Comprueba que la máscara de roles guardada siga los cambios de la relación desde ambos lados y que filtrar por
+        las máscaras devuelva los mismos usuarios que la unión con la tabla de roles.
+    """
+
+    def setUp(self):
+        self.roles = {rol.nombre: rol for rol in Rol.objects.all()}
+        combinaciones = [[], [Rol.MOZO], [Rol.COMENSAL], [Rol.MOZO, Rol.ADMINISTRADOR], [Rol.VENEDEDOR, Rol.COMENSAL],
+                         [Rol.ADMINISTRADOR], [Rol.MOZO, Rol.VENEDEDOR]]
+        self.usuarios = []
+        for indice, nombres in enumerate(combinaciones):
+            usuario = Usuario.objects.create(email="mascara" + str(indice) + "@prueba.com", username="m" + str(indice))
+            usuario.roles.add(*[self.roles[nombre] for nombre in nombres])
+            self.usuarios.append(usuario)
+
+    def get_mascara(self, usuario):
+        return Usuario.objects.filter(pk=usuario.pk).values_list('roles_mascara', flat=True).get()
+
+    def get_ids(self, usuarios):
+        ids = [usuario.pk for usuario in self.usuarios]
+        return set(usuarios.filter(pk__in=ids).values_list('pk', flat=True))
+
+    def test_mascara_desde_el_usuario(self):
+        usuario = self.usuarios[0]
+        usuario.roles.add(self.roles[Rol.MOZO], self.roles[Rol.VENEDEDOR])
+        self.assertEqual(self.get_mascara(usuario), Rol.get_mascara([Rol.MOZO, Rol.VENEDEDOR]))
+        usuario.roles.remove(self.roles[Rol.MOZO])
+        self.assertEqual(self.get_mascara(usuario), Rol.get_mascara([Rol.VENEDEDOR]))
+        usuario.roles.clear()
+        self.assertEqual(self.get_mascara(usuario), 0)
+
+    def test_mascara_desde_el_rol(self):
+        mozo = self.roles[Rol.MOZO]
+        primero, segundo = self.usuarios[2], self.usuarios[5]
+        mozo.usuarios_roles.add(primero, segundo)
+        self.assertEqual(self.get_mascara(primero), Rol.get_mascara([Rol.COMENSAL, Rol.MOZO]))
+        self.assertEqual(self.get_mascara(segundo), Rol.get_mascara([Rol.ADMINISTRADOR, Rol.MOZO]))
+        mozo.usuarios_roles.remove(primero)
+        self.assertEqual(self.get_mascara(primero), Rol.get_mascara([Rol.COMENSAL]))
+
+        # Al limpiar el rol se actualizan todos los usuarios que lo tenían.
+        mozo.usuarios_roles.clear()
+        for usuario in self.usuarios:
+            self.assertFalse(self.get_mascara(usuario) & Rol.BITS[Rol.MOZO])
+        self.assertEqual(self.get_mascara(segundo), Rol.get_mascara([Rol.ADMINISTRADOR]))
+
+    def test_mascaras_equivalen_a_la_union(self):
+        casos = [([Rol.MOZO], None), ([Rol.MOZO], [Rol.ADMINISTRADOR]), (None, [Rol.ADMINISTRADOR]),
+                 ([Rol.VENEDEDOR, Rol.COMENSAL], [Rol.MOZO]), (Rol.get_nombres_contiene("o"), None)]
+        for con, sin in casos:
+            union = Usuario.objects.all()
+            if con is not None:
+                union = union.filter(roles__nombre__in=con)
+            if sin is not None:
+                union = union.exclude(roles__nombre__in=sin)
+            mascaras = Usuario.objects.filter(roles_mascara__in=Rol.get_mascaras(con=con, sin=sin))
+            self.assertEqual(self.get_ids(mascaras), self.get_ids(union.distinct()), (con, sin))
+
+    def test_nombres_contiene_equivale_a_la_union(self):
+        for texto in ["o", "mo", "admin", "x"]:
+            union = Usuario.objects.filter(roles__nombre__contains=texto).distinct()
+            mascaras = Usuario.objects.filter(roles_mascara__in=Rol.get_mascaras(con=Rol.get_nombres_contiene(texto)))
+            self.assertEqual(self.get_ids(mascaras), self.get_ids(union), texto)
+
+
+class ListadosTest(TestCase):
+    """
+        Datos de prueba comunes a las pruebas de los listados: ventas, pedidos, ingresos, turnos y usuarios con la
+        cantidad de líneas indicada.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.get(email='root@gmail.com')
+        token, creado = Token.objects.get_or_create(user=self.usuario)
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        categoria = Categoria.objects.first()
+        self.productos = []
+        for indice in range(4):
+            producto = Producto.objects.create(categoria=categoria, nombre="Prueba de consultas " + str(indice),
+                                               costo_vigente=10, precio_vigente=20.5, venta_directa=True)
+            aplicar_movimientos([MovimientoStock(producto=producto, cantidad=100, descripcion="Stock inicial")])
+            self.productos.append(producto)
+        self.mesa = Mesa.objects.create(numero=960)
+        self.cantidad_usuarios = 0
+
+    def crear_usuario(self):
+        self.cantidad_usuarios += 1
+        indice = str(self.cantidad_usuarios)
+        usuario = Usuario.objects.create(email="consultas" + indice + "@prueba.com", username="consultas" + indice,
+                                         first_name="Consultas " + indice, dni=31000000 + self.cantidad_usuarios)
+        usuario.agregar_rol_comensal()
+        return usuario
+
+    def get_lineas(self, cantidad):
+        return [{'producto': {'id': producto.id}, 'cantidad': 1} for producto in self.productos[:cantidad]]
+
+    def crear_registros(self, cantidad_lineas):
+        usuario = self.crear_usuario()
+        crear_venta(self.usuario, self.get_lineas(cantidad_lineas))
+        crear_pedido(usuario, self.get_lineas(cantidad_lineas))
+        ingreso = Ingreso.objects.create(usuario=self.usuario)
+        for producto in self.productos[:cantidad_lineas]:
+            IngresoLinea.objects.create(ingreso=ingreso, producto=producto, cantidad=1, costo=10, total=10)
+        turno = Turno.objects.create(mesa=self.mesa, mozo=self.usuario)
+        for producto in self.productos[:cantidad_lineas]:
+            OrdenProducto.objects.create(turno=turno, producto=producto, cantidad=1)
+        # Fuera de un request la auditoría no tiene usuario logueado, que sí tienen los registros reales.
+        for modelo in (MovimientoStock, Venta, Pedido, Ingreso, Turno):
+            modelo.objects.filter(auditoria_creador=None).update(auditoria_creador=self.usuario)
+
+
+class ConsultasListadosTest(ListadosTest):
+    """
+        Comprueba que la cantidad de consultas de los listados no crezca con la cantidad de filas ni de líneas, es decir
+        que las relaciones, las operaciones y los productos de las líneas se resuelvan por página y no por fila.
+    """
+
+    def contar_consultas(self, url, clave):
+        """
+            Devuelve la cantidad de consultas del listado y de filas devueltas. Antes se vacía la caché compartida para
+            que todas las mediciones partan del mismo estado.
+            @param url: str
+            @param clave: str Clave de las filas en los datos de la respuesta.
+            @return: Tuple<int, int>
+        """
+        get_cache_totales().clear()
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.cliente.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), len(respuesta.json()['datos'][clave])
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        listados = [
+            ('/api/gastronomia/venta//?' + FECHAS, 'ventas'),
+            ('/api/gastronomia/pedido/?' + FECHAS, 'pedidos'),
+            ('/api/producto/ingreso//?' + FECHAS, 'ingresos'),
+            ('/api/mesas/turno/turnos/?idMesa=' + str(self.mesa.id) + '&' + FECHAS, 'turnos'),
+            ('/api/usuarios/?nombre=Consultas', 'usuarios'),
+        ]
+        self.crear_registros(1)
+        iniciales = {url: self.contar_consultas(url, clave) for url, clave in listados}
+        for indice in range(4):
+            self.crear_registros(len(self.productos))
+        for url, clave in listados:
+            with self.subTest(url=url):
+                consultas, filas = self.contar_consultas(url, clave)
+                self.assertGreater(filas, iniciales[url][1])
+                self.assertEqual(consultas, iniciales[url][0])
+
+
+class OperacionesCompactasTest(ListadosTest):
+    """
+        Comprueba que las operaciones compactas de los listados, armadas con los metadatos de /api/operaciones/,
+        equivalgan a las operaciones completas.
+    """
+    MODELOS = {'usuario': Usuario, 'producto': Producto, 'categoria': Categoria, 'ingreso': Ingreso,
+               'reemplazo': ReemplazoMercaderia, 'venta': Venta, 'pedido': Pedido}
+
+    def normalizar(self, datos, entidad, metadatos):
+        """
+            Devuelve los datos del listado con las máscaras de operaciones reemplazadas por las operaciones que indican
+            los metadatos y las operaciones ordenadas por clave, para comparar ambos formatos.
+            @param datos: any
+            @param entidad: str|None Entidad de las operaciones de la fila actual.
+            @param metadatos: dict
+            @return: any
+        """
+        if isinstance(datos, list):
+            return [self.normalizar(dato, entidad, metadatos) for dato in datos]
+        if not isinstance(datos, dict):
+            return datos
+        normalizados = {}
+        for clave, valor in datos.items():
+            if clave in ('operaciones', 'operaciones_listado') and isinstance(valor, int):
+                valor = [self.armar_operacion(operacion, entidad, datos['id']) for operacion in metadatos[entidad]
+                         if valor & operacion['bit']]
+            if clave in ('operaciones', 'operaciones_listado') and all('key' in operacion for operacion in valor):
+                normalizados[clave] = sorted(valor, key=lambda operacion: operacion['key'])
+            else:
+                normalizados[clave] = self.normalizar(valor, clave if clave in metadatos else entidad, metadatos)
+        return normalizados
+
+    def armar_operacion(self, metadato, entidad, id):
+        operacion = {clave: valor for clave, valor in metadato.items() if clave != 'bit'}
+        operacion['title'] = operacion['title'].format(self.MODELOS[entidad](id=id).get_id_texto())
+        operacion['key'] = str(id) + "-" + metadato['accion']
+        return operacion
+
+    def test_metadatos(self):
+        respuesta = self.cliente.get('/api/operaciones/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('public', respuesta['Cache-Control'])
+        self.assertIn('max-age=', respuesta['Cache-Control'])
+        for entidad, operaciones in respuesta.json()['datos'].items():
+            bits = [operacion['bit'] for operacion in operaciones]
+            self.assertEqual(bits, [1 << indice for indice in range(len(operaciones))], entidad)
+
+    def test_compactas_equivalen_a_completas(self):
+        self.crear_registros(len(self.productos))
+        metadatos = self.cliente.get('/api/operaciones/').json()['datos']
+        listados = [
+            ('/api/gastronomia/venta//?' + FECHAS, 'ventas', 'venta', 'operaciones'),
+            ('/api/gastronomia/pedido/?' + FECHAS, 'pedidos', 'pedido', 'operaciones'),
+            ('/api/producto/ingreso//?' + FECHAS, 'ingresos', 'ingreso', 'operaciones'),
+            ('/api/usuarios/?nombre=Consultas', 'usuarios', 'usuario', 'operaciones_listado'),
+        ]
+        for url, clave, entidad, operaciones in listados:
+            with self.subTest(url=url):
+                completas = self.cliente.get(url).json()['datos'][clave]
+                compactas = self.cliente.get(url + '&operaciones=compact').json()['datos'][clave]
+                self.assertGreater(len(compactas), 0)
+                self.assertTrue(all(isinstance(fila[operaciones], int) for fila in compactas))
+                self.assertEqual(self.normalizar(compactas, entidad, metadatos),
+                                 self.normalizar(completas, entidad, metadatos))
@@ -1,10 +1,19 @@
 from base.respuestas import Respuesta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
+import secrets
 
 respuesta = Respuesta()
 
+# Prefijos de las claves de la caché: el usuario resuelto por cada token y la versión vigente de esa entrada.
+CLAVE_TOKEN = 'token:'
+CLAVE_VERSION = 'token_version:'
+
 
 class CustomAuthToken(ObtainAuthToken):
 
@@ -21,3 +30,67 @@ class CustomAuthToken(ObtainAuthToken):
             'idUsuario': user.pk,
             'nombre': user.first_name
         })
+
+
+class CacheTokenAuthentication(TokenAuthentication):
+    """
+        Autenticación por token que guarda el usuario resuelto para cada token en la caché TOKEN_CACHE durante
+        TOKEN_CACHE_SEGUNDOS, evitando consultar el token y el usuario en cada request. Cada entrada guarda la versión
+        del token vigente al leer el usuario. La versión cambia cuando se guarda o borra el usuario, cambian sus roles o
+        se borra el token, así que después de esos cambios ningún proceso vuelve a usar los datos anteriores.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_cache_tokens()
+        clave, clave_version = CLAVE_TOKEN + key, CLAVE_VERSION + key
+        guardados = cache.get_many([clave, clave_version])
+        version = guardados.get(clave_version)
+        entrada = guardados.get(clave)
+        # Cada lectura de la caché devuelve instancias nuevas, por lo que ningún request comparte el usuario con otro.
+        if entrada is not None and version is not None and entrada[0] == version:
+            return entrada[1], entrada[2]
+
+        # La versión se fija antes de consultar el usuario: si se invalida mientras tanto, la entrada nace vencida.
+        segundos = getattr(settings, 'TOKEN_CACHE_SEGUNDOS', 300)
+        if version is None:
+            cache.add(clave_version, secrets.token_hex(8), segundos)
+            version = cache.get(clave_version)
+        usuario, token = super().authenticate_credentials(key)
+        if version is not None:
+            cache.set(clave, (version, usuario, token), segundos)
+        return usuario, token
+
+
+def get_cache_tokens():
+    """
+        Devuelve la caché donde se guardan los usuarios resueltos por token.
+        @return: BaseCache
+    """
+    return caches[getattr(settings, 'TOKEN_CACHE', 'default')]
+
+
+def invalidar_tokens(claves):
+    """
+        Cambia la versión de las entradas de los tokens cuando termina la transacción actual, para que el próximo request
+        de cada uno vuelva a leer el usuario de la base de datos. Se hace al terminar la transacción para que ningún
+        request guarde los datos anteriores al cambio mientras la transacción sigue abierta.
+        @param claves: List<str>
+        @return: None
+    """
+    if len(claves) == 0:
+        return
+
+    def cambiar_versiones():
+        segundos = getattr(settings, 'TOKEN_CACHE_SEGUNDOS', 300)
+        get_cache_tokens().set_many({CLAVE_VERSION + clave: secrets.token_hex(8) for clave in claves}, segundos)
+
+    transaction.on_commit(cambiar_versiones)
+
+
+def invalidar_tokens_usuario(id_usuario):
+    """
+        Invalida las entradas de la caché de los tokens del usuario.
+        @param id_usuario: int
+        @return: None
+    """
+    invalidar_tokens(list(Token.objects.filter(user_id=id_usuario).values_list('key', flat=True)))
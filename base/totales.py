@@ -0,0 +1,122 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import QuerySet
+import hashlib
+import secrets
+
+# Prefijos de las claves de la caché: los totales exactos, que incluyen la versión de los totales del modelo, los
+# aproximados y la versión vigente de los totales de cada modelo.
+CLAVE_TOTAL = 'total:'
+CLAVE_APROXIMADO = 'total_aproximado:'
+CLAVE_VERSION = 'total_version:'
+
+
+def get_total(modelo, **filtros):
+    """
+        Devuelve la cantidad de registros del modelo con los filtros indicados y si la cantidad es exacta. Mientras el
+        listado no supere CONTEO_EXACTO_MAXIMO registros se cuenta de forma exacta, con una consulta acotada a ese
+        máximo, y el valor se guarda en la caché TOTALES_CACHE durante TOTALES_CACHE_SEGUNDOS o hasta que se crea,
+        guarda o borra un registro del modelo en cualquier proceso. Si lo supera no se vuelve a contar en cada request:
+        sin filtros se usa la estimación de filas de las estadísticas de la tabla y con filtros el conteo completo, que
+        se guardan durante CONTEO_APROXIMADO_SEGUNDOS sin invalidarse al modificar registros, ya que se informan como
+        aproximados.
+        @param modelo: Type<Model>
+        @param filtros: dict
+        @return: Tuple<int, bool>
+    """
+    cache = get_cache_totales()
+    etiqueta = modelo._meta.label
+    # La clave se resume porque los filtros pueden incluir textos de búsqueda o subconsultas de cualquier largo.
+    texto = repr((etiqueta, tuple(sorted((campo, get_texto_filtro(valor)) for campo, valor in filtros.items()))))
+    resumen = hashlib.sha1(texto.encode()).hexdigest()
+    version = get_version_totales(cache, etiqueta)
+    clave_total = CLAVE_TOTAL + resumen + ':' + version
+    clave_aproximado = CLAVE_APROXIMADO + resumen
+    guardados = cache.get_many([clave_total, clave_aproximado])
+    if clave_total in guardados:
+        return guardados[clave_total], True
+    if clave_aproximado in guardados:
+        return guardados[clave_aproximado], False
+
+    maximo = getattr(settings, 'CONTEO_EXACTO_MAXIMO', 10000)
+    segundos_aproximado = getattr(settings, 'CONTEO_APROXIMADO_SEGUNDOS', 600)
+    if len(filtros) == 0:
+        estimacion = get_estimacion_filas(modelo)
+        if estimacion is not None and estimacion > maximo:
+            cache.set(clave_aproximado, estimacion, segundos_aproximado)
+            return estimacion, False
+
+    total = modelo.objects.filter(**filtros)[:maximo + 1].count()
+    if total <= maximo:
+        cache.set(clave_total, total, getattr(settings, 'TOTALES_CACHE_SEGUNDOS', 60))
+        return total, True
+
+    total = modelo.objects.filter(**filtros).count()
+    cache.set(clave_aproximado, total, segundos_aproximado)
+    return total, False
+
+
+def get_texto_filtro(valor):
+    """
+        Devuelve el texto del valor de un filtro para la clave de los totales guardados. De las subconsultas se usa el
+        SQL, para no ejecutarlas al armar la clave.
+        @param valor: any
+        @return: str
+    """
+    if isinstance(valor, QuerySet):
+        return str(valor.query)
+    return str(valor)
+
+
+def get_estimacion_filas(modelo):
+    """
+        Devuelve la cantidad de filas de la tabla del modelo que estima la base de datos en sus estadísticas, sin
+        recorrer la tabla. Devuelve None si el motor de base de datos no ofrece la estimación.
+        @param modelo: Type<Model>
+        @return: int|None
+    """
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() "
+                       "AND TABLE_NAME = %s", [modelo._meta.db_table])
+        fila = cursor.fetchone()
+    if fila is None or fila[0] is None:
+        return None
+    return int(fila[0])
+
+
+def get_cache_totales():
+    """
+        Devuelve la caché donde se guardan los totales de los listados.
+        @return: BaseCache
+    """
+    return caches[getattr(settings, 'TOTALES_CACHE', 'default')]
+
+
+def get_version_totales(cache, etiqueta):
+    """
+        Devuelve la versión vigente de los totales exactos del modelo. Si la caché no la tiene se genera una nueva.
+        @param cache: BaseCache
+        @param etiqueta: str Etiqueta del modelo, como "producto.Producto".
+        @return: str
+    """
+    clave = CLAVE_VERSION + etiqueta
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, secrets.token_hex(8), None)
+        version = cache.get(clave)
+    return version
+
+
+def invalidar_totales(modelo):
+    """
+        Cambia la versión de los totales exactos del modelo cuando termina la transacción actual, dejando vencidos los
+        guardados por todos los procesos. Debe llamarse después de operaciones que no envían señales, como bulk_create
+        o update.
+        @param modelo: Type<Model>
+        @return: None
+    """
+    clave = CLAVE_VERSION + modelo._meta.label
+    transaction.on_commit(lambda: get_cache_totales().set(clave, secrets.token_hex(8), None))
@@ -15,4 +15,5 @@ urlpatterns = [
     path('olvido-password/', views.olvido_password, name="olvido-password"),
     path('validar-token/<str:token>', views.validar_token_password, name="validar-token-password"),
     path('cambiar-password/', views.cambiar_password, name="cambiar-password"),
+    path('operaciones/', views.operaciones, name="operaciones"),
 ]
@@ -1,4 +1,9 @@
+from base.busqueda import buscar
+from base.operaciones import comprobar_operaciones_compactas, get_metadatos_operaciones
+from base.paginacion import PaginacionCursorMixin
 from base.signals import get_usuario_logueado
+from base.totales import get_total
+from base.token import CacheTokenAuthentication
 from django.contrib.auth.hashers import make_password
 from django.conf import settings
 from django.db import transaction
@@ -7,16 +12,13 @@ from django.views.static import serve
 from rest_framework import mixins
 from rest_framework import viewsets
 from rest_framework.authtoken.views import Token
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view
 from .models import Usuario, Rol
-from .serializers import UsuarioSerializer
+from .serializers import UsuarioSerializer, precargar_listado
 from . import email
 from base.respuestas import Respuesta
-import datetime
-import secrets
 import os
 
 respuesta = Respuesta()
@@ -33,10 +35,11 @@ class RegistroViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin):
 
 
 # Abm de usuarios con autorización
-class ABMUsuarioViewSet(viewsets.ModelViewSet):
+class ABMUsuarioViewSet(PaginacionCursorMixin, viewsets.ModelViewSet):
     queryset = Usuario.objects.filter(borrado=False)
     serializer_class = UsuarioSerializer
-    authentication_classes = [TokenAuthentication]
+    busquedas_listado = [('nombre', Usuario, 'first_name', ''), ('dni', Usuario, 'dni', '')]
+    authentication_classes = [CacheTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def create(self, request, *args, **kwargs):
@@ -82,27 +85,26 @@ class ABMUsuarioViewSet(viewsets.ModelViewSet):
         }
 
         # Agrega filtros por nombre de usuario
-        nombre = request.query_params.get('nombre', None)
+        nombre = request.query_params.get('nombre', "")
         if nombre != "":
-            filtros["first_name__icontains"] = nombre
+            filtros["id__in"] = buscar(Usuario, "first_name", nombre)
 
         # Agrega filtros por dni
         dni = request.query_params.get('dni', None)
         if dni is not None and dni.isnumeric() and int(dni) > 0:
-            filtros["dni__icontains"] = dni
+            filtros["pk__in"] = buscar(Usuario, "dni", dni)
 
-        # Agrega filtros por rol
+        # Agrega filtros por rol, los administradores no se listan.
         rol = request.query_params.get('rol', None)
-        if rol != '':
-            filtros["roles__nombre__contains"] = rol
+        con = None
+        if rol is not None and rol != '':
+            con = Rol.get_nombres_contiene(rol)
 
         logueado = get_usuario_logueado()
         esAdmin = logueado.esAdmin
         if not esAdmin:
-            rol = filtros["roles__nombre__contains"] if "roles__nombre__contains" in filtros else ""
-            if 'roles__nombre__contains' in filtros:
-                filtros.pop('roles__nombre__contains')
-            filtros["roles__nombre__in"] = [rol, Rol.COMENSAL] if rol != "" else [Rol.COMENSAL]
+            con = [rol, Rol.COMENSAL] if rol is not None and rol != "" else [Rol.COMENSAL]
+        filtros["roles_mascara__in"] = Rol.get_mascaras(con=con, sin=[Rol.ADMINISTRADOR])
 
         # Agrega filtro por estado
         estado = request.query_params.get('estado', "")
@@ -121,39 +123,43 @@ class ABMUsuarioViewSet(viewsets.ModelViewSet):
         # Devuelve los cantidad de registros sin tener en cuenta la página actual.
 
     def get_cantidad_registros(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         if id is None:
             filtros.pop("offset")
             filtros.pop("limit")
-        cantidad = Usuario.objects.filter(**filtros).exclude(roles__nombre__contains=Rol.ADMINISTRADOR).count()
+        cantidad = Usuario.objects.filter(**filtros).count()
         return cantidad
 
     # Devuelve los usuarios según los filtros de la query
     def filtrar_usuarios(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         offset = filtros.get("offset")
         limit = filtros.get("limit")
         filtros.pop("offset")
         filtros.pop("limit")
-        usuarios = Usuario.objects.filter(**filtros).exclude(roles__nombre__contains=Rol.ADMINISTRADOR).order_by(
-            '-auditoria_creado_fecha')[offset:limit]
+        usuarios = precargar_listado(Usuario.objects.filter(**filtros), UsuarioSerializer)
+        usuarios = self.paginar(request, usuarios, offset, limit)
         return usuarios
 
     # Lista los usuarios aplicando los filtros.
     def list(self, request, *args, **kwargs):
         usuarios = self.filtrar_usuarios(request)
         if len(usuarios) > 0:
-            serializer = UsuarioSerializer(instance=usuarios, many=True)
+            contexto = UsuarioSerializer.get_contexto_listado([usuario.id for usuario in usuarios])
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = UsuarioSerializer(instance=usuarios, many=True, context=contexto)
             usuarios = serializer.data
 
-        cantidad = self.get_cantidad_registros(request)
-        total = Usuario.objects.exclude(roles__nombre__contains=Rol.ADMINISTRADOR).count()
+        cantidad = self.get_cantidad_listado(request)
+        total, total_exacto = get_total(Usuario, roles_mascara__in=Rol.get_mascaras(sin=[Rol.ADMINISTRADOR]))
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "usuarios": usuarios,
             "registros": cantidad
         }
+        datos.update(self.get_datos_cursor(request))
         return respuesta.get_respuesta(datos=datos, formatear=False)
 
     def destroy(self, request, *args, **kwargs):
@@ -196,9 +202,11 @@ class ABMUsuarioViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def mozos(self, request, pk=None):
         try:
-            objetos = Usuario.objects.filter(roles__nombre__contains=Rol.MOZO).exclude(
-                roles__nombre__contains=Rol.ADMINISTRADOR)
-            serializer = UsuarioSerializer(instance=objetos, many=True)
+            mascaras = Rol.get_mascaras(con=[Rol.MOZO], sin=[Rol.ADMINISTRADOR])
+            objetos = list(Usuario.objects.filter(roles_mascara__in=mascaras).prefetch_related('roles'))
+            contexto = UsuarioSerializer.get_contexto_listado([objeto.id for objeto in objetos])
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = UsuarioSerializer(instance=objetos, many=True, context=contexto)
             mozos = serializer.data
         except:
             return respuesta.get_respuesta(exito=False, mensaje="Hubo un error al buscar los mozos.")
@@ -234,8 +242,9 @@ def crear_usuario(enviar, request):
     else:
         usuario.agregar_rol_comensal()
     usuario.habilitado = False
+    token = usuario.generar_token_email()
     usuario.save()
-    email.enviar_email_registro(usuario)
+    email.enviar_email_registro(usuario, token)
     return respuesta.exito()
 
 
@@ -244,11 +253,12 @@ def crear_usuario(enviar, request):
 def validar_token_email(request, token):
     if request.method == "POST":
         try:
-            usuario = buscar_usuario("token_email", token)
+            usuario = Usuario.buscar_por_token_email(token)
             if usuario is None:
                 return respuesta.validar_token_email_error_token_invalido()
             usuario.habilitado = True
             usuario.token_email = None
+            usuario.fecha_token_email = None
             usuario.save()
             token = Token.objects.get(user=usuario)
             data = {
@@ -271,10 +281,9 @@ def olvido_password(request):
             usuario = buscar_usuario("email", stringEmail)
             if usuario is None:
                 return respuesta.olvido_password_error_email_inexistente()
-            usuario.token_reset = secrets.token_hex(16)
-            usuario.fecha_token_reset = datetime.datetime.today()
+            token = usuario.generar_token_reset()
             usuario.save()
-            email.enviar_email_cambio_password(usuario)
+            email.enviar_email_cambio_password(usuario, token)
             return respuesta.olvido_password_exito()
         except:
             return respuesta.olvido_password_error_general()
@@ -286,7 +295,7 @@ def olvido_password(request):
 def validar_token_password(request, token):
     if request.method == "POST":
         try:
-            usuario = buscar_usuario_token_reset(token)
+            usuario = Usuario.buscar_por_token_reset(token)
             if usuario is None:
                 return respuesta.validar_token_password_error_link_invalido()
             return respuesta.exito()
@@ -301,7 +310,7 @@ def cambiar_password(request):
     if request.method == "POST":
         try:
             token = request.data["token"]
-            usuario = buscar_usuario_token_reset(token)
+            usuario = Usuario.buscar_por_token_reset(token)
             if usuario is None:
                 return respuesta.cambiar_password_error_general()
             password = request.data["password"]
@@ -315,6 +324,16 @@ def cambiar_password(request):
     return respuesta.cambiar_password_error_general()
 
 
+# Devuelve los datos de presentación de las operaciones de los listados pedidos con ?operaciones=compact. No dependen
+# del usuario, por lo que el cliente puede guardarlos en caché.
+@api_view(['GET'])
+def operaciones(request):
+    datos = get_metadatos_operaciones()
+    response = respuesta.get_respuesta(datos=datos, formatear=False)
+    response['Cache-Control'] = 'public, max-age=' + str(settings.OPERACIONES_CACHE_SEGUNDOS)
+    return response
+
+
 # Búsqueda genérica de usuario por un campo
 def buscar_usuario(campo, valor):
     filtro = {campo: valor}
@@ -322,20 +341,3 @@ def buscar_usuario(campo, valor):
         return Usuario.objects.get(**filtro)
     except Usuario.DoesNotExist:
         return None
-
-
-# Busca un usuario que tenga el token reset enviado como parámetro y si el usuario posee fecha_token_reset la
-# diferencia con la fecha actual debe ser menor o igual a un día
-def buscar_usuario_token_reset(token):
-    try:
-        usuario = Usuario.objects.get(token_reset=token)
-        if usuario is not None and usuario.fecha_token_reset is None:
-            return usuario
-        if usuario is not None:
-            naive = usuario.fecha_token_reset.replace(tzinfo=None)
-            delta = datetime.datetime.today() - naive
-            if delta.days > 1:
-                return None
-            return usuario
-    except:
-        return None
@@ -1,6 +1,6 @@
 from django.apps import AppConfig
-from django.db.models.signals import pre_save
-from base.signals import agregar_auditorias
+from django.db.models.signals import pre_save, post_save, post_delete
+from base.signals import agregar_auditorias, invalidar_cache_totales
 
 
 class GastronomiaConfig(AppConfig):
@@ -9,3 +9,9 @@ class GastronomiaConfig(AppConfig):
 
     pre_save.connect(agregar_auditorias, sender='gastronomia.Pedido'),
     pre_save.connect(agregar_auditorias, sender='gastronomia.Venta'),
+
+    # Invalida los totales guardados de los listados cuando se crea, guarda o borra un registro.
+    post_save.connect(invalidar_cache_totales, sender='gastronomia.Pedido')
+    post_save.connect(invalidar_cache_totales, sender='gastronomia.Venta')
+    post_delete.connect(invalidar_cache_totales, sender='gastronomia.Pedido')
+    post_delete.connect(invalidar_cache_totales, sender='gastronomia.Venta')
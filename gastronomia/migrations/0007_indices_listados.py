@@ -0,0 +1,33 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gastronomia', '0006_auto_20211201_1955'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='estado',
+            index=models.Index(fields=['pedido', 'estado', 'fecha'], name='estado_pedido_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['fecha'], name='pedido_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['usuario', 'fecha'], name='pedido_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['ultimo_estado', 'usuario'], name='pedido_estado_usuario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['auditoria_creado_fecha', 'tipo', 'anulado'], name='venta_fecha_tipo_idx'),
+        ),
+    ]
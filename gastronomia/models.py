@@ -1,8 +1,9 @@
 from base.models import Auditoria, Usuario
+from base.moneda import formatear_moneda
 import datetime
 from django.db import models
-import locale
 from django.apps import apps
+from producto.stock import aplicar_movimientos
 
 
 class Estado(models.Model):
@@ -10,6 +11,12 @@ class Estado(models.Model):
     estado = models.CharField(max_length=40)
     fecha = models.DateTimeField(default=datetime.datetime.now)
 
+    class Meta:
+        indexes = [
+            # Último estado de un tipo del pedido.
+            models.Index(fields=['pedido', 'estado', 'fecha'], name='estado_pedido_estado_idx'),
+        ]
+
     ABIERTO = 'abierto'
     EN_CURSO = 'en curso'
     DISPONIBLE = 'disponible'
@@ -28,6 +35,14 @@ class Pedido(Auditoria, models.Model):
     TIPO_RETIRO = 'retiro'
     TIPO_DELIVERY = 'delivery'
 
+    class Meta:
+        indexes = [
+            # Listados por rango de fecha, con o sin filtro por usuario, y pedido abierto del usuario.
+            models.Index(fields=['fecha'], name='pedido_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha'], name='pedido_usuario_fecha_idx'),
+            models.Index(fields=['ultimo_estado', 'usuario'], name='pedido_estado_usuario_idx'),
+        ]
+
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="pedidos")
     venta = models.ForeignKey("gastronomia.Venta", on_delete=models.CASCADE, related_name="+", null=True)
     fecha = models.DateTimeField(default=datetime.datetime.now)
@@ -232,46 +247,21 @@ class Pedido(Auditoria, models.Model):
             self.ultimo_estado = ultimo_coleccion
             self.save()
 
-    def actualizar_stock(self, anteriores):
+    def limpiar_stock(self, lineas=None):
         """
-            Actualiza el stock
-            @param anteriores:
-            @return:
+            Devuelve al stock las cantidades de las líneas del pedido en un único lote.
+            @param lineas: List<PedidoLinea>|None Si es None se usan las líneas actuales del pedido.
+            @return: None
         """
-        lineas = self.lineas.all()
+        if lineas is None:
+            lineas = self.lineas.all()
+        MovimientoStock = apps.get_model('producto', 'MovimientoStock')
+        descripcion = "Borrado de línea de Pedido " + self.get_id_texto()
+        movimientos = []
         for linea in lineas:
-            cantidad = linea.cantidad
-            cantidad_anterior = 0
-            for anterior in anteriores:
-                id_linea = anterior["id"]
-                id_producto_anterior = anterior["producto"]["id"]
-                mismo = linea.comprobar_mismo_producto(id_producto_anterior)
-                if mismo and id_linea != 0:
-                    cantidad_anterior = anterior["cantidad"]
-
-            nueva_cantidad = cantidad - cantidad_anterior
-            if nueva_cantidad != 0:
-                linea.actualizar_stock(anterior=cantidad_anterior)
-
-        for anterior in anteriores:
-            existe = False
-            id_linea = anterior["id"]
-            for linea in lineas:
-                id = linea.id
-                if id == id_linea:
-                    existe = True
-            if not existe and id_linea != 0:
-                id_producto = anterior["producto"]["id"]
-                cantidad_anterior = anterior["cantidad"]
-                Producto = apps.get_model('producto', 'Producto')
-                try:
-                    producto = Producto.objects.get(pk=id_producto)
-                except:
-                    producto = None
-                if producto is not None:
-                    stock = producto.stock
-                    nuevo_stock = stock + cantidad_anterior
-                    producto.actualizar_stock(nueva=nuevo_stock, descripcion="Borrado de línea de Pedido " + self.get_id_texto())
+            movimiento = MovimientoStock(producto_id=linea.producto_id, cantidad=linea.cantidad, descripcion=descripcion)
+            movimientos.append(movimiento)
+        aplicar_movimientos(movimientos)
 
     # Borra todos los estados y líneas del pedido.
     def borrar_datos_pedido(self):
@@ -291,19 +281,8 @@ class Pedido(Auditoria, models.Model):
         """
         usuario = self.usuario
         venta = Venta(usuario=usuario, tipo=Venta.ONLINE, pedido=self)
-        venta.save()
-
-        lineas = self.lineas.all()
-        for linea in lineas:
-            producto = linea.producto
-            cantidad = linea.cantidad
-            precio = producto.precio_vigente
-            total = precio * cantidad
-            linea = VentaLinea(venta=venta, producto=producto, cantidad=cantidad, precio=precio, total=total)
-            linea.save()
-
-        venta.actualizar()
-        venta.save()
+        lineas = self.lineas.select_related('producto')
+        venta.crear_lineas([(linea.producto, linea.cantidad) for linea in lineas])
         self.venta = venta
         self.save()
 
@@ -328,11 +307,11 @@ class Pedido(Auditoria, models.Model):
         if vuelto < 0:
             return 'No solicitó'
         redondeado = round(vuelto, 2)
-        return locale.currency(redondeado)
+        return formatear_moneda(redondeado)
 
     def get_total_texto(self):
         total = self.total
-        return locale.currency(total)
+        return formatear_moneda(total)
 
     def get_tipo_texto(self):
         """
@@ -406,46 +385,24 @@ class PedidoLinea(models.Model):
     subtotal = models.FloatField()
     total = models.FloatField()
 
-    # Actualiza el total de la línea según el precio vigente del producto.
-    def actualizar_total(self):
+    # Calcula el total de la línea según el precio vigente del producto, sin guardarla.
+    def calcular_total(self):
         precio = self.producto.precio_vigente
         total = precio * self.cantidad
         self.subtotal = precio
         self.total = total
-        self.save()
 
-    def actualizar_stock(self, anterior=None):
-        """
-            Actualiza el stock del producto de la línea.
-            @param anterior: int|None
-            @return: None
-        """
-        pedido = self.pedido
-        id_texto = pedido.get_id_texto()
-        producto = self.producto
-        stock = producto.stock
-        cantidad = self.cantidad
-        if anterior is None or anterior == 0:
-            nuevo_stock = stock - cantidad
-            producto.actualizar_stock(nueva=nuevo_stock, descripcion="Creación de línea de Pedido " + id_texto)
-        else:
-            diferencia = cantidad - anterior
-            nuevo_stock = stock - diferencia
-            producto.actualizar_stock(nueva=nuevo_stock, descripcion="Actualización de línea de Pedido " + id_texto)
+    # Actualiza el total de la línea según el precio vigente del producto.
+    def actualizar_total(self):
+        self.calcular_total()
+        self.save()
 
     def limpiar_stock(self):
         """
         Limpia el stock
         @return:
         """
-        cantidad = self.cantidad
-        producto = self.producto
-        stock = producto.stock
-        stock_nuevo = stock + cantidad
-        pedido = self.pedido
-        id_texto = pedido.get_id_texto()
-        producto.actualizar_stock(nueva=stock_nuevo, descripcion="Borrado de línea de Pedido " + id_texto)
-        producto.save()
+        self.pedido.limpiar_stock([self])
 
     def get_cantidad_comanda(self):
         """
@@ -480,6 +437,12 @@ class Venta(Auditoria, models.Model):
     ONLINE = 'online'
     MESA = 'mesa'
 
+    class Meta:
+        indexes = [
+            # Listado por rango de fecha de creación filtrado por tipo y estado.
+            models.Index(fields=['auditoria_creado_fecha', 'tipo', 'anulado'], name='venta_fecha_tipo_idx'),
+        ]
+
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="ventas")
     pedido = models.ForeignKey('gastronomia.Pedido', null=True, on_delete=models.CASCADE, related_name="+")
     turno = models.ForeignKey('mesas.Turno', null=True, on_delete=models.CASCADE, related_name="+")
@@ -508,6 +471,26 @@ class Venta(Auditoria, models.Model):
         for linea in lineas:
             linea.actualizar()
 
+    def crear_lineas(self, items):
+        """
+            Guarda la venta con el total calculado y crea sus líneas en lote, sin volver a leerlas.
+            @param items: List Tuplas (Producto, cantidad).
+            @return: List<VentaLinea>
+        """
+        # El total de la línea se calcula con el precio vigente completo; solo el precio guardado en la línea es entero.
+        lineas = []
+        total = 0
+        for producto, cantidad in items:
+            precio = producto.precio_vigente
+            linea = VentaLinea(venta=self, producto=producto, cantidad=cantidad, precio=int(precio), total=precio * cantidad)
+            lineas.append(linea)
+            total += linea.total
+        self.total = total
+        self.save()
+
+        VentaLinea.objects.bulk_create(lineas)
+        return lineas
+
     # Actualiza el total de la venta a partir del total de cada línea.
     def actualizar_total(self):
         lineas = self.lineas.all()
@@ -517,11 +500,11 @@ class Venta(Auditoria, models.Model):
         self.total = total
         self.save()
 
-    # Crea un movimiento de stock por cada producto vendido.
+    # Crea un movimiento de stock por cada producto vendido, descontando el stock de todos en un único lote.
     def crear_movimientos(self):
         lineas = self.lineas.all()
-        for linea in lineas:
-            linea.crear_movimiento()
+        movimientos = [linea.get_movimiento_stock() for linea in lineas]
+        aplicar_movimientos(movimientos)
 
     # Devuelve true si el usuario puede visualizar el ingreso.
     def comprobar_puede_visualizar(self, usuario):
@@ -567,12 +550,12 @@ class Venta(Auditoria, models.Model):
         venta_impresa = turno.venta_impresa
         return venta_impresa
 
-    # Anula la venta generando un movimiento de stock a los productos ingresados.
+    # Anula la venta generando un movimiento de stock a los productos ingresados, todos en un único lote.
     def anular(self):
         self.anulado = datetime.datetime.now()
         lineas = self.lineas.all()
-        for linea in lineas:
-            linea.anular()
+        movimientos = [linea.get_movimiento_anulacion() for linea in lineas]
+        aplicar_movimientos(movimientos, validar_stock=False)
 
     # Devuelve la clase del estado de la venta.
     def get_estado_clase(self):
@@ -676,7 +659,7 @@ class Venta(Auditoria, models.Model):
         if vuelto < 0:
             return 'No solicitó'
         redondeado = round(vuelto, 2)
-        return locale.currency(redondeado)
+        return formatear_moneda(redondeado)
 
     def get_direccion_texto(self):
         """
@@ -745,16 +728,15 @@ class VentaLinea(models.Model):
     precio = models.IntegerField()
     total = models.FloatField(default=0)
 
-    # Crea un movimiento de stock a partir del producto vendido.
-    def crear_movimiento(self):
-        producto = self.producto
-        cantidad = self.cantidad
+    # Devuelve el movimiento de stock sin guardar que descuenta el producto vendido.
+    def get_movimiento_stock(self):
+        MovimientoStock = apps.get_model('producto', 'MovimientoStock')
         descripcion = self.venta.__str__()
+        return MovimientoStock(producto=self.producto, cantidad=-self.cantidad, descripcion=descripcion, venta_linea=self)
 
-        stock = producto.stock
-        nuevo_stock = stock - cantidad
-        producto.actualizar_stock(nueva=nuevo_stock, descripcion=descripcion)
-        producto.save()
+    # Crea un movimiento de stock a partir del producto vendido.
+    def crear_movimiento(self):
+        aplicar_movimientos([self.get_movimiento_stock()])
 
     def actualizar(self):
         self.actualizar_total()
@@ -766,16 +748,15 @@ class VentaLinea(models.Model):
         self.total = total
         self.save()
 
+    # Devuelve el movimiento de stock sin guardar de la anulación de la línea, que descuenta la cantidad de la línea.
+    def get_movimiento_anulacion(self):
+        MovimientoStock = apps.get_model('producto', 'MovimientoStock')
+        descripcion = self.venta.__str__() + " anulada"
+        return MovimientoStock(producto=self.producto, cantidad=-self.cantidad, descripcion=descripcion, venta_linea=self)
+
     # Crea un nuevo movimiento de stock negativo y actualiza el stock del producto.
     def anular(self):
-        cantidad = self.cantidad
-        producto = self.producto
-        anterior = producto.stock
-        nueva = anterior - cantidad
-
-        descripcion = self.venta.__str__() + " anulada"
-        producto.actualizar_stock(nueva=nueva, descripcion=descripcion, venta_linea=self)
-        producto.save()
+        aplicar_movimientos([self.get_movimiento_anulacion()], validar_stock=False)
 
     def get_cantidad_comanda(self):
         """
@@ -1,11 +1,11 @@
 import datetime
-from .models import Pedido, PedidoLinea, Estado, Venta, VentaLinea
+from .models import Pedido, PedidoLinea, Estado, Venta
 from django.core.exceptions import ValidationError
 from django.http import FileResponse
 import io
 from reportlab.pdfgen import canvas
-from producto.repositorio import get_producto
-from gastronomia.serializers import LineaSerializer
+from producto.models import Producto, MovimientoStock
+from producto.stock import aplicar_movimientos
 
 
 # Devuelve un pedido por estado.
@@ -54,121 +54,143 @@ def validar_crear_pedido(datos):
 
 def crear_pedido(usuario, lineas):
     pedido = get_pedido(usuario=usuario, estado=Estado.ABIERTO)
-    if pedido is not None:
-        id = pedido.id
-        lineas_anteriores = pedido.lineas.all()
-        lineas_serializer = LineaSerializer(instance=lineas_anteriores, many=True)
-        lineas_anteriores = lineas_serializer.data
-        return actualizar_pedido(id, lineas, lineas_anteriores)
-    pedido = Pedido(usuario=usuario, ultimo_estado=Estado.ABIERTO, total=0)
-    pedido.save()
+    if pedido is None:
+        pedido = Pedido(usuario=usuario, ultimo_estado=Estado.ABIERTO, total=0)
+    return guardar_lineas_pedido(pedido, lineas)
 
-    errores = []
-    for item in lineas:
-        linea = crear_linea_pedido(pedido, item)
-        if not isinstance(linea, PedidoLinea):
-            errores += linea
 
-    if len(errores) > 0:
-        return errores
+def actualizar_pedido(id, lineas):
+    pedido = get_pedido(pk=id)
+    if pedido is None:
+        return ["No se ha encontrado el pedido."]
+    return guardar_lineas_pedido(pedido, lineas)
 
-    vacio = pedido.comprobar_vacio()
-    if vacio:
-        pedido.borrar_datos_pedido()
-        pedido.delete()
-        return None
-    pedido.actualizar_total()
-    return pedido
 
+def calcular_diferencias_pedido(actuales, lineas, productos):
+    """
+        Compara en una sola pasada las líneas guardadas del pedido con las recibidas. Las líneas recibidas con cantidad
+        cero se borran y las que no se reciben quedan sin cambios.
+        @param actuales: dict Líneas guardadas por id de producto.
+        @param lineas: List Líneas recibidas.
+        @param productos: dict Productos por id.
+        @return: dict Con las claves errores, nuevas, modificadas, borradas y diferencias (cantidad por id de producto).
+    """
+    recibidas = {}
+    for item in lineas:
+        recibidas[item["producto"]["id"]] = item
 
-def crear_linea_pedido(pedido, item):
     errores = []
-    id_producto = item["producto"]["id"]
-    existente = get_linea_pedido(id_pedido=pedido.id, id_producto=id_producto)
-    if existente is not None:
-        return existente
-    producto = get_producto(item["producto"]["id"])
-    if producto is None:
-        errores.append("No se ha encontrado el producto.")
-    cantidad = item["cantidad"]
-    if int(cantidad) == 0:
-        return []
-    tiene_stock = producto.comprobar_tiene_stock(cantidad)
-    nombre = producto.nombre
-    if not tiene_stock:
-        errores.append("No hay suficiente stock a la venta para el producto '" + nombre)
-
+    nuevas = []
+    modificadas = []
+    borradas = []
+    diferencias = {}
+    for id_producto, item in recibidas.items():
+        producto = productos.get(id_producto)
+        if producto is None:
+            errores.append("No se ha encontrado el producto.")
+            continue
+
+        actual = actuales.get(id_producto)
+        cantidad = int(item["cantidad"])
+        if actual is None and cantidad == 0:
+            continue
+        id_linea = item["id"] if "id" in item else 0
+        if actual is None and id_linea > 0:
+            errores.append("No se ha encontrado la línea del pedido de id " + str(id_linea) + ". ")
+            continue
+
+        anterior = actual.cantidad if actual is not None else 0
+        diferencia = cantidad - anterior
+        if diferencia == 0:
+            continue
+        if diferencia > 0 and not producto.comprobar_tiene_stock(diferencia):
+            errores.append("No hay suficiente stock del producto '" + producto.nombre + "'. ")
+            continue
+
+        diferencias[id_producto] = diferencia
+        if actual is None:
+            nuevas.append(PedidoLinea(producto=producto, cantidad=cantidad))
+        elif cantidad == 0:
+            borradas.append(actual)
+        else:
+            actual.producto = producto
+            actual.cantidad = cantidad
+            modificadas.append(actual)
+
+    return {
+        "errores": errores,
+        "nuevas": nuevas,
+        "modificadas": modificadas,
+        "borradas": borradas,
+        "diferencias": diferencias,
+    }
+
+
+def guardar_lineas_pedido(pedido, lineas):
+    """
+        Guarda las líneas recibidas en el pedido aplicando en lote las altas, modificaciones, bajas y los movimientos
+        de stock que generan.
+        @param pedido: Pedido Puede no estar guardado todavía.
+        @param lineas: List Líneas recibidas.
+        @return: List|Pedido|None Errores, el pedido o None si el pedido quedó vacío y se borró.
+    """
+    actuales = {}
+    if pedido.id is not None:
+        for linea in pedido.lineas.all():
+            actuales[linea.producto_id] = linea
+
+    ids = [item["producto"]["id"] for item in lineas]
+    productos = Producto.objects.in_bulk(ids)
+    cambios = calcular_diferencias_pedido(actuales, lineas, productos)
+    errores = cambios["errores"]
     if len(errores) > 0:
         return errores
 
-    linea = PedidoLinea(pedido=pedido, producto=producto, cantidad=cantidad)
-    linea.actualizar_total()
-    linea.save()
-    return linea
-
-
-def actualizar_pedido(id, lineas, anteriores):
-    pedido = get_pedido(pk=id)
-    errores = []
-    if pedido is None:
-        errores.append("No se ha encontrado el pedido.")
-    errores = actualizar_lineas_pedido(pedido, lineas, anteriores)
-    if not isinstance(errores, PedidoLinea) and len(errores) > 0:
-        return errores
-
-    vacio = pedido.comprobar_vacio()
-    if vacio:
+    nuevas = cambios["nuevas"]
+    if pedido.id is None and len(nuevas) == 0:
+        return None
+    if pedido.id is None:
+        pedido.save()
+
+    for linea in nuevas:
+        linea.pedido = pedido
+        linea.calcular_total()
+    PedidoLinea.objects.bulk_create(nuevas)
+
+    modificadas = cambios["modificadas"]
+    for linea in modificadas:
+        linea.calcular_total()
+    PedidoLinea.objects.bulk_update(modificadas, ['cantidad', 'subtotal', 'total'])
+
+    borradas = set(linea.id for linea in cambios["borradas"])
+    if len(borradas) > 0:
+        PedidoLinea.objects.filter(pk__in=borradas).delete()
+
+    movimientos = []
+    id_texto = pedido.get_id_texto()
+    for id_producto, diferencia in cambios["diferencias"].items():
+        actual = actuales.get(id_producto)
+        descripcion = "Actualización de línea de Pedido "
+        if actual is None:
+            descripcion = "Creación de línea de Pedido "
+        elif actual.id in borradas:
+            descripcion = "Borrado de línea de Pedido "
+        movimiento = MovimientoStock(producto=productos[id_producto], cantidad=-diferencia, descripcion=descripcion + id_texto)
+        movimientos.append(movimiento)
+    aplicar_movimientos(movimientos)
+
+    restantes = [linea for linea in actuales.values() if linea.id not in borradas] + nuevas
+    if len(restantes) == 0:
         pedido.borrar_datos_pedido()
         pedido.delete()
         return None
-    pedido.actualizar_total()
-    return pedido
-
-
-def actualizar_lineas_pedido(pedido, lineas, anteriores):
-    errores = []
-    for linea in lineas:
-        id_linea = linea["id"]
-        id_pedido = pedido.id
-        id_producto = linea["producto"]["id"]
-        objeto = get_linea_pedido(id_pedido, id_producto)
-        cantidad = linea["cantidad"]
-        if objeto is None and id_linea > 0:
-            errores.append("No se ha encontrado al línea del pedido de id " + id_linea)
-        elif id_linea == 0:
-            objeto = crear_linea_pedido(pedido, linea)
-        if cantidad == 0 and objeto is not None:
-            objeto.delete()
-        elif objeto is not None:
-            objeto.cantidad = linea["cantidad"]
-
-        cantidad_anterior = 0
-        for anterior in anteriores:
-            id_producto_anterior = anterior["producto"]["id"]
-            if id_producto == id_producto_anterior:
-                cantidad_anterior = anterior["cantidad"]
-
-        diferencia = cantidad - cantidad_anterior
-        producto = objeto.producto
-        tiene_stock = producto.comprobar_tiene_stock(diferencia)
-        nombre = producto.nombre
-        if not tiene_stock:
-            objeto.cantidad = cantidad_anterior
-            errores.append("No hay suficiente stock del producto '" + nombre)
-
-        if objeto is not None and objeto.id is not None and len(errores) == 0:
-            objeto.actualizar_total()
-            objeto.save()
 
-    return errores
-
-
-def get_linea_pedido(id_pedido, id_producto):
-    try:
-        if id_pedido > 0 and id_producto > 0:
-            return PedidoLinea.objects.get(producto=id_producto, pedido=id_pedido)
-    except PedidoLinea.DoesNotExist:
-        return None
+    total = 0
+    for linea in restantes:
+        total += linea.total
+    pedido.total = total
+    pedido.save()
+    return pedido
 
 
 def cerrar_pedido(pedido, cambio, tipo, direccion):
@@ -206,62 +228,53 @@ def validar_crear_venta(datos):
 
 def crear_venta(usuario, lineas):
     """
-        Crea una nueva venta.
+        Crea una nueva venta. Los productos se buscan en una sola consulta, el stock se valida en memoria y las líneas
+        y movimientos se guardan en lote.
         @param usuario: Usuario
         @param lineas: List
         @return: errores|Venta
     """
-    errores = []
-    venta = Venta(usuario=usuario)
-    venta.save()
-    for item in lineas:
-        errores += crear_linea_venta(venta, item)
+    ids = [item["producto"]["id"] for item in lineas]
+    productos = Producto.objects.in_bulk(ids)
 
-    if len(errores) > 0:
-        return errores
-
-    venta.actualizar()
-    venta.crear_movimientos()
-    venta.save()
-    return venta
-
-
-def crear_linea_venta(venta, item):
-    """
-        Crea una línea de venta.
-        @param venta: Venta
-        @param item: List
-        @return: List Array con errores
-    """
     errores = []
+    items = []
+    cantidades = {}
+    for item in lineas:
+        id_producto = item["producto"]["id"]
+        producto = productos.get(id_producto)
+        if producto is None:
+            raise ValidationError("No se ha encontrado el producto.")
 
-    id_producto = item["producto"]["id"]
-    producto = get_producto(id_producto)
-    if producto is None:
-        raise ValidationError("No se ha encontrado el producto.")
-
-    nombre = producto.nombre
-    venta_directa = producto.venta_directa
-    if not venta_directa:
-        errores.append("El producto '" + nombre + "' no es de venta directa.")
-
-    cantidad = item["cantidad"]
-    if int(cantidad) == 0:
-        return None
+        cantidad = int(item["cantidad"])
+        if cantidad == 0:
+            continue
 
-    tiene_stock = producto.comprobar_tiene_stock(cantidad)
-    if not tiene_stock:
-        stock = producto.stock
-        errores.append("No hay suficiente stock a la venta para el producto '" + nombre + ", quedan " + str(stock) + ". ")
+        nombre = producto.nombre
+        if not producto.venta_directa:
+            errores.append("El producto '" + nombre + "' no es de venta directa.")
+        cantidades[id_producto] = cantidades.get(id_producto, 0) + cantidad
+        items.append((producto, cantidad))
+
+    for id_producto, cantidad in cantidades.items():
+        producto = productos[id_producto]
+        tiene_stock = producto.comprobar_tiene_stock(cantidad)
+        if not tiene_stock:
+            stock = producto.stock
+            errores.append("No hay suficiente stock a la venta para el producto '" + producto.nombre + ", quedan " + str(stock) + ". ")
 
     if len(errores) > 0:
         return errores
 
-    precio = producto.precio_vigente
-    linea = VentaLinea(venta=venta, producto=producto, cantidad=cantidad, precio=precio)
-    linea.save()
+    venta = Venta(usuario=usuario)
+    venta.crear_lineas(items)
 
-    return errores
+    # Vuelvo a leer las líneas para obtener sus ids, ya que no todas las bases los devuelven en el INSERT masivo.
+    guardadas = list(venta.lineas.order_by('id'))
+    for linea in guardadas:
+        linea.producto = productos[linea.producto_id]
+    aplicar_movimientos([linea.get_movimiento_stock() for linea in guardadas])
+    return venta
 
 
 def get_pdf_comanda(venta=None, turno=None, pedido=None):
@@ -2,11 +2,9 @@ from rest_framework import serializers
 from .models import Pedido, PedidoLinea, VentaLinea, Venta
 from base.signals import get_usuario_logueado
 from producto.serializers import ProductoSerializer, MovimientoSerializer
-from base.serializers import UsuarioSerializer
+from base.moneda import formatear_moneda
+from base.serializers import CustomModelSerializer, UsuarioSerializer
 import unidecode
-import locale
-
-locale.setlocale(locale.LC_ALL, '')
 
 
 class VentaLineaSerializer(serializers.ModelSerializer):
@@ -21,19 +19,27 @@ class VentaLineaSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Quito password"""
         ret = super().to_representation(instance)
-        ret['precio_texto'] = locale.currency(instance.precio)
-        ret['total_texto'] = locale.currency(instance.total)
+        ret['precio_texto'] = formatear_moneda(instance.precio)
+        ret['total_texto'] = formatear_moneda(instance.total)
         return ret
 
 
-class VentaSerializer(serializers.ModelSerializer):
+class VentaSerializer(CustomModelSerializer):
     lineas = VentaLineaSerializer(many=True, read_only=True)
     operaciones = serializers.SerializerMethodField()
+    # Claves foráneas que lee to_representation, para precargarlas en los listados.
+    relaciones_listado = ['usuario', 'pedido', 'turno__mesa']
 
     class Meta:
         model = Venta
         fields = '__all__'
 
+    # Devuelve el contexto con los datos de las operaciones calculados para los productos de las ventas del listado.
+    @staticmethod
+    def get_contexto_listado(ids):
+        productos = list(VentaLinea.objects.filter(venta_id__in=ids).values_list('producto_id', flat=True).distinct())
+        return ProductoSerializer.get_contexto_listado(productos)
+
     # Método que devuelve los datos de la venta.
     def to_representation(self, instance):
         ret = super().to_representation(instance)
@@ -44,7 +50,7 @@ class VentaSerializer(serializers.ModelSerializer):
         ret['usuario_email'] = instance.usuario.email
         ret['usuario_nombre'] = unidecode.unidecode(instance.usuario.first_name)
         ret['fecha_texto'] = instance.auditoria_creado_fecha.strftime('%d/%m/%Y %H:%M')
-        ret['total_texto'] = locale.currency(instance.total)
+        ret['total_texto'] = formatear_moneda(instance.total)
         ret['estado_texto'] = instance.get_estado_legible()
         ret['estado_clase'] = instance.get_estado_clase()
         ret['fecha_anulado'] = instance.get_fecha_anulada_texto()
@@ -58,54 +64,22 @@ class VentaSerializer(serializers.ModelSerializer):
     # Devuelve las operaciones disponibles para la venta actual.
     def get_operaciones(self, objeto):
         logueado = get_usuario_logueado()
-        operaciones = []
+        acciones = []
 
         puede_visualizar = objeto.comprobar_puede_visualizar(logueado)
         if puede_visualizar:
-            accion = 'visualizar'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-info text-info',
-                'texto': 'Ver',
-                'icono': 'fa fa-eye',
-                'title': 'Ver Venta ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-
-        accion = 'pdf'
-        operaciones.append({
-            'accion': accion,
-            'clase': 'btn btn-sm btn-primary text-primary',
-            'texto': 'Ticket',
-            'icono': 'fas fa-file-pdf',
-            'title': 'Descargar Ticket Venta ' + objeto.get_id_texto(),
-            'key': str(objeto.id) + "-" + accion,
-        })
+            acciones.append('visualizar')
+
+        acciones.append('pdf')
 
         puede_comanda = objeto.comprobar_puede_emitir_comanda()
         if puede_comanda:
-            accion = 'comanda'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-success text-success',
-                'texto': 'Comanda',
-                'icono': 'fas fa-file-alt',
-                'title': 'Descargar Comanda Venta ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
+            acciones.append('comanda')
 
         puede_anular = objeto.comprobar_puede_anular(logueado)
         if puede_anular:
-            accion = 'anular'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-danger text-danger',
-                'texto': 'Anular',
-                'icono': 'fa fa-window-close',
-                'title': 'Anular Venta ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-        return operaciones
+            acciones.append('anular')
+        return self.armar_operaciones('venta', acciones, objeto)
 
 
 class LineaSerializer(serializers.ModelSerializer):
@@ -119,12 +93,12 @@ class LineaSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Quito password"""
         ret = super().to_representation(instance)
-        ret['subtotal_texto'] = locale.currency(instance.subtotal)
-        ret['total_texto'] = locale.currency(instance.total)
+        ret['subtotal_texto'] = formatear_moneda(instance.subtotal)
+        ret['total_texto'] = formatear_moneda(instance.total)
         return ret
 
 
-class PedidoSerializer(serializers.ModelSerializer):
+class PedidoSerializer(CustomModelSerializer):
     venta = VentaSerializer(read_only=True)
     usuario = UsuarioSerializer(read_only=True)
     lineas = LineaSerializer(many=True, read_only=True)
@@ -134,6 +108,17 @@ class PedidoSerializer(serializers.ModelSerializer):
         model = Pedido
         fields = '__all__'
 
+    # Devuelve el contexto con los datos de las operaciones calculados para los usuarios y productos de los pedidos del
+    # listado.
+    @staticmethod
+    def get_contexto_listado(ids):
+        productos = set(PedidoLinea.objects.filter(pedido_id__in=ids).values_list('producto_id', flat=True))
+        productos |= set(VentaLinea.objects.filter(venta__pedido_id__in=ids).values_list('producto_id', flat=True))
+        usuarios = list(Pedido.objects.filter(pk__in=ids).values_list('usuario_id', flat=True).distinct())
+        contexto = ProductoSerializer.get_contexto_listado(list(productos))
+        contexto.update(UsuarioSerializer.get_contexto_listado(usuarios))
+        return contexto
+
     # Método que devuelve los datos del pedido.
     def to_representation(self, instance):
         logueado = get_usuario_logueado()
@@ -161,83 +146,29 @@ class PedidoSerializer(serializers.ModelSerializer):
     # Devuelve las operaciones de un pedido.
     def get_operaciones(self, objeto):
         logueado = get_usuario_logueado()
-        operaciones = []
+        acciones = []
 
         puede_visualizar = objeto.comprobar_puede_visualizar(logueado)
         if puede_visualizar:
-            accion = 'visualizar'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-info text-info',
-                'clase_responsive': 'bg-info',
-                'texto': 'Ver',
-                'icono': 'fa fa-eye',
-                'title': 'Ver Pedido ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
+            acciones.append('visualizar')
 
         puede_entregar = objeto.comprobar_puede_entregar(logueado)
         if puede_entregar:
-            accion = 'entregar'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-success text-success',
-                'clase_responsive': 'bg-success',
-                'texto': 'Entregar',
-                'icono': 'fa fa-check-circle',
-                'title': 'Entregar Pedido ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
+            acciones.append('entregar')
 
         puede_marcar_disponible = objeto.comprobar_puede_marcar_disponible(logueado)
         if puede_marcar_disponible:
-            accion = 'disponible'
-            operaciones.append({
-                'accion': 'disponible',
-                'clase': 'btn btn-sm btn-success text-success',
-                'clase_responsive': 'bg-success',
-                'texto': 'Disponible',
-                'icono': 'fa fa-check-circle',
-                'title': 'Marcar Pedido ' + objeto.get_id_texto() + " como disponible",
-                'key': str(objeto.id) + "-" + accion,
-            })
+            acciones.append('disponible')
 
         puede_imprimir_venta = objeto.comprobar_puede_imprimir_venta(logueado)
         if puede_imprimir_venta:
-            accion = 'venta'
-            operaciones.append({
-                'accion': 'venta',
-                'clase': 'btn btn-sm btn-primary text-primary',
-                'clase_responsive': 'bg-primary',
-                'texto': 'Ticket',
-                'icono': 'fas fa-file-pdf',
-                'title': 'Marcar Pedido ' + objeto.get_id_texto() + " como disponible",
-                'key': str(objeto.id) + "-" + accion,
-            })
+            acciones.append('venta')
 
         puede_emitir_comanda = objeto.comprobar_puede_emitir_comanda(logueado)
         if puede_emitir_comanda:
-            accion = 'comanda'
-            operaciones.append({
-                'accion': 'comanda',
-                'clase': 'btn btn-sm btn-primary text-primary',
-                'clase_responsive': 'bg-primary',
-                'texto': 'Comanda',
-                'icono': 'fas fa-file-alt',
-                'title': 'Descargar Comanda Pedido ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
+            acciones.append('comanda')
 
         puede_anular = objeto.comprobar_puede_anular(logueado)
         if puede_anular:
-            accion = 'anular'
-            operaciones.append({
-                'accion': 'anular',
-                'clase': 'btn btn-sm btn-danger text-danger',
-                'clase_responsive': 'bg-danger',
-                'texto': 'Anular',
-                'icono': 'fa fa-window-close',
-                'title': 'Anular Pedido ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-        return operaciones
+            acciones.append('anular')
+        return self.armar_operaciones('pedido', acciones, objeto)
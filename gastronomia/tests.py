@@ -0,0 +1,96 @@
+from base.models import Usuario
+from django.test import TestCase
+from gastronomia.models import Pedido, Venta, VentaLinea
+from gastronomia.repositorio import actualizar_pedido, crear_pedido, crear_venta
+from producto.models import Categoria, MovimientoStock, Producto
+from producto.stock import aplicar_movimiento
+
+
+class LineasPedidoTest(TestCase):
+    """
+        Comprueba que las líneas del pedido se guarden aplicando solo las diferencias con las líneas ya guardadas, y
+        que el stock se mueva por la diferencia de cada producto.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.get(email='root@gmail.com')
+        categoria = Categoria.objects.first()
+        self.productos = []
+        for indice in range(3):
+            producto = Producto.objects.create(categoria=categoria, nombre="Prueba de pedido " + str(indice),
+                                               costo_vigente=10, precio_vigente=20)
+            aplicar_movimiento(producto, 10, "Stock inicial")
+            self.productos.append(producto)
+
+    def get_linea(self, producto, cantidad):
+        return {'producto': {'id': producto.id}, 'cantidad': cantidad}
+
+    def get_stocks(self):
+        stocks = dict(Producto.objects.filter(pk__in=[producto.id for producto in self.productos]).values_list('id', 'stock'))
+        return [stocks[producto.id] for producto in self.productos]
+
+    def get_cantidades(self, pedido):
+        return dict(pedido.lineas.values_list('producto_id', 'cantidad'))
+
+    def test_actualizacion_aplica_solo_diferencias(self):
+        primero, segundo, tercero = self.productos
+        pedido = crear_pedido(self.usuario, [self.get_linea(primero, 2), self.get_linea(segundo, 3)])
+        self.assertEqual(self.get_stocks(), [8, 7, 10])
+        self.assertEqual(pedido.total, 100)
+
+        lineas = list(pedido.lineas.order_by('id').values_list('id', flat=True))
+        movimientos = MovimientoStock.objects.count()
+        # Se aumenta el primero, se borra el segundo, se agrega el tercero y se reenvía el primero sin cambios.
+        pedido = actualizar_pedido(pedido.id, [self.get_linea(primero, 5), self.get_linea(segundo, 0),
+                                               self.get_linea(tercero, 1)])
+        self.assertEqual(self.get_cantidades(pedido), {primero.id: 5, tercero.id: 1})
+        self.assertEqual(self.get_stocks(), [5, 10, 9])
+        self.assertEqual(pedido.total, 120)
+        # La línea modificada conserva su id.
+        self.assertEqual(pedido.lineas.get(producto=primero).id, lineas[0])
+        self.assertEqual(MovimientoStock.objects.count(), movimientos + 3)
+
+        # Las líneas sin cambios no generan movimientos.
+        actualizar_pedido(pedido.id, [self.get_linea(primero, 5)])
+        self.assertEqual(MovimientoStock.objects.count(), movimientos + 3)
+
+    def test_pedido_sin_lineas_se_borra(self):
+        primero = self.productos[0]
+        pedido = crear_pedido(self.usuario, [self.get_linea(primero, 2)])
+        self.assertIsNone(actualizar_pedido(pedido.id, [self.get_linea(primero, 0)]))
+        self.assertFalse(Pedido.objects.filter(pk=pedido.id).exists())
+        self.assertEqual(self.get_stocks()[0], 10)
+
+    def test_stock_insuficiente_no_guarda_ninguna_linea(self):
+        primero, segundo = self.productos[:2]
+        errores = crear_pedido(self.usuario, [self.get_linea(primero, 2), self.get_linea(segundo, 11)])
+        self.assertEqual(len(errores), 1)
+        self.assertFalse(Pedido.objects.filter(usuario=self.usuario, lineas__producto=primero).exists())
+        self.assertEqual(self.get_stocks(), [10, 10, 10])
+
+
+class VentaTest(TestCase):
+    """
+        Comprueba que la venta en lote calcule los importes con el precio vigente completo.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.get(email='root@gmail.com')
+        categoria = Categoria.objects.first()
+        self.producto = Producto.objects.create(categoria=categoria, nombre="Prueba de venta", costo_vigente=5,
+                                                precio_vigente=10.5, venta_directa=True)
+        aplicar_movimiento(self.producto, 10, "Stock inicial")
+
+    def test_precio_con_decimales(self):
+        venta = crear_venta(self.usuario, [{'producto': {'id': self.producto.id}, 'cantidad': 2}])
+        linea = VentaLinea.objects.get(venta=venta)
+        self.assertEqual(linea.total, 21.0)
+        self.assertEqual(Venta.objects.get(pk=venta.pk).total, 21.0)
+        self.assertEqual(Producto.objects.get(pk=self.producto.pk).stock, 8)
+
+    def test_venta_de_pedido_con_decimales(self):
+        pedido = crear_pedido(self.usuario, [{'producto': {'id': self.producto.id}, 'cantidad': 3}])
+        pedido.crear_venta()
+        venta = Venta.objects.get(pedido=pedido)
+        self.assertEqual(venta.total, 31.5)
+        self.assertEqual(venta.tipo, Venta.ONLINE)
@@ -3,17 +3,22 @@ from .serializers import PedidoSerializer, VentaSerializer
 from base import utils
 from base import email
 from base.respuestas import Respuesta
+from base.busqueda import buscar
+from base.models import Usuario
+from base.operaciones import comprobar_operaciones_compactas
+from base.paginacion import PaginacionCursorMixin
+from base.serializers import precargar_listado
+from base.totales import get_total
 from base.permisos import TieneRolAdmin, TieneRolAdminOVendedor
+from base.token import CacheTokenAuthentication
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.http import FileResponse
 from gastronomia.repositorio import get_pedido, validar_crear_pedido, crear_pedido, actualizar_pedido, cerrar_pedido, \
     get_venta, validar_crear_venta, crear_venta, get_pdf_comanda
-from gastronomia.serializers import LineaSerializer
 import io
 from reportlab.pdfgen import canvas
 from rest_framework import viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
@@ -21,10 +26,12 @@ respuesta = Respuesta()
 
 
 # Abm de pedidos con autorización
-class PedidoViewSet(viewsets.ModelViewSet):
+class PedidoViewSet(PaginacionCursorMixin, viewsets.ModelViewSet):
     queryset = Pedido.objects.all()
     serializer_class = PedidoSerializer
-    authentication_classes = [TokenAuthentication]
+    orden_listado = ('-fecha', '-id')
+    busquedas_listado = [('nombreUsuario', Usuario, 'first_name', 'usuario__')]
+    authentication_classes = [CacheTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     # Devuelve los filtros de la query.
@@ -63,7 +70,7 @@ class PedidoViewSet(viewsets.ModelViewSet):
         # Agrega filtro por usuario
         usuario = request.query_params.get('nombreUsuario', "")
         if usuario != "":
-            filtros["usuario__first_name__icontains"] = usuario
+            filtros["usuario__in"] = buscar(Usuario, "first_name", usuario)
 
         # Agrega filtros por número de página actual
         pagina = int(request.query_params.get('paginaActual', 1))
@@ -76,7 +83,7 @@ class PedidoViewSet(viewsets.ModelViewSet):
 
     # Devuelve los cantidad de registros sin tener en cuenta la página actual.
     def get_cantidad_registros(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         if id is None:
             filtros.pop("offset")
@@ -86,34 +93,39 @@ class PedidoViewSet(viewsets.ModelViewSet):
 
     # Devuelve los pedidos según los filtros de la query
     def filtrar_pedidos(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         id_valido = id is not None and int(id) > 0
         if id_valido:
-            return Pedido.objects.filter(id=id)
+            return precargar_listado(Pedido.objects.filter(id=id), PedidoSerializer)
 
         offset = filtros.get("offset")
         limit = filtros.get("limit")
         filtros.pop("offset")
         filtros.pop("limit")
-        pedidos = Pedido.objects.filter(**filtros).order_by('-fecha')[offset:limit]
+        pedidos = precargar_listado(Pedido.objects.filter(**filtros), PedidoSerializer)
+        pedidos = self.paginar(request, pedidos, offset, limit)
         return pedidos
 
     # Listado de pedidos para un comensal
     def list(self, request, *args, **kwargs):
         pedidos = self.filtrar_pedidos(request)
         if len(pedidos) > 0:
-            serializer = PedidoSerializer(instance=pedidos, many=True)
+            contexto = PedidoSerializer.get_contexto_listado([pedido.id for pedido in pedidos])
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = PedidoSerializer(instance=pedidos, many=True, context=contexto)
             pedidos = serializer.data
 
         idUsuario = request.query_params.get("usuario")
-        cantidad = self.get_cantidad_registros(request)
-        total = Pedido.objects.filter(usuario=idUsuario).count()
+        cantidad = self.get_cantidad_listado(request)
+        total, total_exacto = get_total(Pedido, usuario=idUsuario)
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "pedidos": pedidos,
             "registros": cantidad
         }
+        datos.update(self.get_datos_cursor(request))
         return respuesta.get_respuesta(datos=datos, formatear=False)
 
     # Listado de pedidos para un vendedor
@@ -126,15 +138,19 @@ class PedidoViewSet(viewsets.ModelViewSet):
         else:
             return respuesta.get_respuesta(False, "No está autorizado para listar los pedidos vendidos.", 401)
         if len(pedidos) > 0:
-            serializer = PedidoSerializer(instance=pedidos, many=True)
+            contexto = PedidoSerializer.get_contexto_listado([pedido.id for pedido in pedidos])
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = PedidoSerializer(instance=pedidos, many=True, context=contexto)
             pedidos = serializer.data
-        cantidad = self.get_cantidad_registros(request)
-        total = Pedido.objects.count()
+        cantidad = self.get_cantidad_listado(request)
+        total, total_exacto = get_total(Pedido)
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "pedidos": pedidos,
             "registros": cantidad
         }
+        datos.update(self.get_datos_cursor(request))
         return respuesta.get_respuesta(datos=datos, formatear=False)
 
     # Devuelve un pedido por id.
@@ -198,40 +214,28 @@ class PedidoViewSet(viewsets.ModelViewSet):
 
             id = datos["id"] if "id" in datos else 0
             lineas = datos["lineas"]
-            lineas_anteriores = lineas
-            anteriores = []
             if id <= 0:
                 pedido = crear_pedido(usuario, lineas)
             else:
-                anterior = get_pedido(pk=id)
-                anteriores = anterior.lineas.all()
-                lineas_serializer = LineaSerializer(instance=anteriores, many=True)
-                lineas_anteriores = lineas_serializer.data
-                pedido = actualizar_pedido(id, lineas, lineas_anteriores)
+                pedido = actualizar_pedido(id, lineas)
 
             if pedido is not None and not isinstance(pedido, Pedido) and len(pedido) > 0:
                 mensaje = "Se produjeron los siguientes errores: "
                 mensaje += ''.join(pedido)
                 return respuesta.get_respuesta(exito=True, datos={'errores': mensaje})
 
-            if pedido is None:
-                for anterior in anteriores:
-                    anterior.limpiar_stock()
-            else:
-                pedido.actualizar_stock(lineas_anteriores)
-                pedido.save()
+            if pedido is not None:
                 serializer = PedidoSerializer(instance=pedido)
                 datos = serializer.data
             return respuesta.get_respuesta(True, "", None, datos)
         except ValidationError as e:
+            transaction.set_rollback(True)
             return respuesta.get_respuesta(exito=False, mensaje="Ha ocurrido un error al actualizar el pedido")
 
     # Borra un pedido por id.
     def destroy(self, request, *args, **kwargs):
         pedido = self.get_object()
-        lineas = pedido.lineas.all()
-        for linea in lineas:
-            linea.limpiar_stock()
+        pedido.limpiar_stock()
         super().destroy(request, *args, **kwargs)
         return respuesta.get_respuesta(True, "Pedido borrado con éxito.")
 
@@ -315,9 +319,7 @@ class PedidoViewSet(viewsets.ModelViewSet):
 
             pedido.agregar_estado(Estado.ANULADO)
 
-            lineas = pedido.lineas.all()
-            for linea in lineas:
-                linea.limpiar_stock()
+            pedido.limpiar_stock()
             pedido.save()
             email.enviar_email_pedido_anulado(pedido)
             return respuesta.get_respuesta(exito=True, mensaje="El pedido se ha anulado con éxito.")
@@ -354,10 +356,11 @@ class PedidoViewSet(viewsets.ModelViewSet):
 
 
 # Abm de ventas.
-class ABMVentaViewSet(viewsets.ModelViewSet):
+class ABMVentaViewSet(PaginacionCursorMixin, viewsets.ModelViewSet):
     queryset = Venta.objects.all()
     serializer_class = VentaSerializer
-    authentication_classes = [TokenAuthentication]
+    busquedas_listado = [('nombreUsuario', Usuario, 'first_name', 'usuario__')]
+    authentication_classes = [CacheTokenAuthentication]
     permission_classes = [IsAuthenticated, TieneRolAdminOVendedor]
 
     @transaction.atomic
@@ -384,6 +387,7 @@ class ABMVentaViewSet(viewsets.ModelViewSet):
                 mensaje += ''.join(resultado)
                 return respuesta.get_respuesta(exito=False, mensaje=mensaje)
         except ValidationError as e:
+            transaction.set_rollback(True)
             return respuesta.get_respuesta(False, e.messages)
 
     # Devuelve los filtros de la query.
@@ -423,7 +427,7 @@ class ABMVentaViewSet(viewsets.ModelViewSet):
         # Agrega filtro por usuario
         usuario = request.query_params.get('nombreUsuario', "")
         if usuario != "":
-            filtros["usuario__first_name__icontains"] = usuario
+            filtros["usuario__in"] = buscar(Usuario, "first_name", usuario)
 
         # Agrega filtros por número de página actual
         pagina = int(request.query_params.get('paginaActual', 1))
@@ -436,7 +440,7 @@ class ABMVentaViewSet(viewsets.ModelViewSet):
 
     # Devuelve los cantidad de registros sin tener en cuenta la página actual.
     def get_cantidad_registros(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         if id is None:
             filtros.pop("offset")
@@ -446,33 +450,38 @@ class ABMVentaViewSet(viewsets.ModelViewSet):
 
     # Devuelve las ventas según los filtros de la query
     def filtrar_ingresos(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         id_valido = id is not None and int(id) > 0
         if id_valido:
-            return Venta.objects.filter(id=id)
+            return precargar_listado(Venta.objects.filter(id=id), VentaSerializer)
 
         offset = filtros.get("offset")
         limit = filtros.get("limit")
         filtros.pop("offset")
         filtros.pop("limit")
-        ventas = Venta.objects.filter(**filtros).order_by('-auditoria_creado_fecha')[offset:limit]
+        ventas = precargar_listado(Venta.objects.filter(**filtros), VentaSerializer)
+        ventas = self.paginar(request, ventas, offset, limit)
         return ventas
 
     # Lista los ingresos aplicando los filtros.
     def list(self, request, *args, **kwargs):
         ventas = self.filtrar_ingresos(request)
         if len(ventas) > 0:
-            serializer = VentaSerializer(instance=ventas, many=True)
+            contexto = VentaSerializer.get_contexto_listado([venta.id for venta in ventas])
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = VentaSerializer(instance=ventas, many=True, context=contexto)
             ventas = serializer.data
 
-        cantidad = self.get_cantidad_registros(request)
-        total = Venta.objects.count()
+        cantidad = self.get_cantidad_listado(request)
+        total, total_exacto = get_total(Venta)
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "ventas": ventas,
             "registros": cantidad
         }
+        datos.update(self.get_datos_cursor(request))
         return respuesta.get_respuesta(datos=datos, formatear=False)
 
     # Anula la venta.
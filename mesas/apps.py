@@ -1,6 +1,6 @@
 from django.apps import AppConfig
-from django.db.models.signals import pre_save
-from base.signals import agregar_auditorias
+from django.db.models.signals import pre_save, post_save, post_delete
+from base.signals import agregar_auditorias, invalidar_cache_totales
 
 
 class MesasConfig(AppConfig):
@@ -9,4 +9,10 @@ class MesasConfig(AppConfig):
 
     # registering signals with the model's string label
     pre_save.connect(agregar_auditorias, sender='mesas.Mesa')
-    pre_save.connect(agregar_auditorias, sender='mesas.Turno')
\ No newline at end of file
+    pre_save.connect(agregar_auditorias, sender='mesas.Turno')
+
+    # Invalida los totales guardados de los listados cuando se crea, guarda o borra un registro.
+    post_save.connect(invalidar_cache_totales, sender='mesas.Mesa')
+    post_save.connect(invalidar_cache_totales, sender='mesas.Turno')
+    post_delete.connect(invalidar_cache_totales, sender='mesas.Mesa')
+    post_delete.connect(invalidar_cache_totales, sender='mesas.Turno')
\ No newline at end of file
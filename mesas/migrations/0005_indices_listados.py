@@ -0,0 +1,17 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mesas', '0004_alter_turno_mozo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='turno',
+            index=models.Index(fields=['mesa', 'estado', 'auditoria_creado_fecha'], name='turno_mesa_estado_idx'),
+        ),
+    ]
@@ -1,9 +1,10 @@
 from base.models import Auditoria, Usuario
+from base.moneda import formatear_moneda
 import datetime
 from django.core.exceptions import ValidationError
 from django.db import models
-from gastronomia.models import Venta, VentaLinea, Pedido
-import locale
+from gastronomia.models import Venta, Pedido
+from producto.stock import aplicar_movimiento
 import pandas as pd
 from producto.models import Producto
 from producto.repositorio import get_producto
@@ -121,6 +122,10 @@ class Turno(Auditoria, models.Model):
 
     class Meta:
         db_table = 'mesas_turnos'
+        indexes = [
+            # Listado de turnos de la mesa por estado y rango de fecha de creación.
+            models.Index(fields=['mesa', 'estado', 'auditoria_creado_fecha'], name='turno_mesa_estado_idx'),
+        ]
 
     ABIERTO = "abierto"
     CERRADO = "cerrado"
@@ -206,7 +211,8 @@ class Turno(Auditoria, models.Model):
         else:
             self.borrar_ordenes()
 
-        # Actualizo o creo las órdenes.
+        # Actualizo o creo las órdenes en orden de producto para tomar los registros de stock siempre en el mismo orden.
+        ordenes = sorted(ordenes, key=lambda item: item["producto"]["id"])
         for orden in ordenes:
             id_producto = orden["producto"]["id"]
             cantidad = orden["cantidad"]
@@ -327,30 +333,17 @@ class Turno(Auditoria, models.Model):
         """
         self.estado = Turno.CERRADO
         self.hora_fin = datetime.datetime.now()
-        self.save()
 
         mesa = self.mesa
         mesa.estado = Mesa.DISPONIBLE
         mesa.save()
 
+        ordenes = list(self.ordenes.select_related('producto'))
+        self.ordenes.update(estado=OrdenProducto.ENTREGADO)
+
         usuario = self.auditoria_creador
         venta = Venta(usuario=usuario, tipo=Venta.MESA, turno=self)
-        venta.save()
-
-        ordenes = self.ordenes.all()
-        for orden in ordenes:
-            orden.estado = OrdenProducto.ENTREGADO
-            orden.save()
-
-            producto = orden.producto
-            cantidad = orden.cantidad
-            precio = producto.precio_vigente
-            total = precio * cantidad
-            linea = VentaLinea(venta=venta, producto=producto, cantidad=cantidad, precio=precio, total=total)
-            linea.save()
-
-        venta.actualizar()
-        venta.save()
+        venta.crear_lineas([(orden.producto, orden.cantidad) for orden in ordenes])
 
         self.venta = venta
         self.save()
@@ -420,7 +413,7 @@ class Turno(Auditoria, models.Model):
             @return: str
         """
         total = self.get_total()
-        return locale.currency(total)
+        return formatear_moneda(total)
 
     def get_titulo_comanda(self):
         """
@@ -475,7 +468,7 @@ class OrdenProducto(models.Model):
             @return: str
         """
         total = self.get_total()
-        return locale.currency(total)
+        return formatear_moneda(total)
 
     def get_cantidad_restante(self):
         """
@@ -513,18 +506,15 @@ class OrdenProducto(models.Model):
             return []
 
         producto = self.producto
-        stock = producto.stock
-        actualizado = stock + cantidad_anterior - cantidad_nueva
         errores = []
-        if actualizado < 0:
-            errores.append("No hay suficiente stock para el producto " + producto.nombre + ", quedan " + str(stock))
-            return errores
-
         turno = self.turno
         mesa = turno.mesa
         fecha = datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
         accion_upper = accion.title()
         descripcion = accion_upper + " de la orden del turno de la mesa " + mesa.get_numero_texto() + " " + fecha
-        producto.actualizar_stock(nueva=actualizado, descripcion=descripcion)
-        producto.save()
+        try:
+            aplicar_movimiento(producto, cantidad_anterior - cantidad_nueva, descripcion)
+        except ValidationError:
+            stock = producto.stock
+            errores.append("No hay suficiente stock para el producto " + producto.nombre + ", quedan " + str(stock))
         return errores
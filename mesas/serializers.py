@@ -1,5 +1,6 @@
 from .models import Mesa, Turno, OrdenProducto
-from base.serializers import UsuarioSerializer
+from base.serializers import UsuarioSerializer, precargar_listado
+from gastronomia.models import VentaLinea
 from gastronomia.serializers import VentaSerializer, PedidoSerializer
 from producto.serializers import ProductoSerializer
 from rest_framework import serializers
@@ -26,14 +27,16 @@ class MesaSerializer(serializers.ModelSerializer):
 
     def get_ultimo_turno(self, objeto):
         """
-            Devuelve el último turno de la mesa en formato json.
+            Devuelve el último turno de la mesa en formato json. Se carga con el plan de precarga y el contexto de los
+            listados, para que las consultas no crezcan con las órdenes del turno.
             @param objeto: Mesa
             @return: JSON<Turno>
         """
-        ultimo = objeto.turnos.last()
+        ultimo = precargar_listado(objeto.turnos.order_by('-id'), TurnoSerializer).first()
         if ultimo is None:
             return None
-        json = TurnoSerializer(instance=ultimo).data
+        contexto = TurnoSerializer.get_contexto_listado([ultimo.id])
+        json = TurnoSerializer(instance=ultimo, context=contexto).data
         return json
 
 
@@ -56,11 +59,24 @@ class TurnoSerializer(serializers.ModelSerializer):
     venta = VentaSerializer(read_only=True)
     pedido = PedidoSerializer(read_only=True)
     ordenes = OrdenProductoSerializer(read_only=True, many=True)
+    # Claves foráneas que lee to_representation, para precargarlas en los listados.
+    relaciones_listado = ['mesa']
 
     class Meta:
         model = Turno
         fields = '__all__'
 
+    # Devuelve el contexto con los datos de las operaciones calculados para los mozos y productos de los turnos del
+    # listado.
+    @staticmethod
+    def get_contexto_listado(ids):
+        productos = set(OrdenProducto.objects.filter(turno_id__in=ids).values_list('producto_id', flat=True))
+        productos |= set(VentaLinea.objects.filter(venta__turno_id__in=ids).values_list('producto_id', flat=True))
+        mozos = list(Turno.objects.filter(pk__in=ids).exclude(mozo=None).values_list('mozo_id', flat=True).distinct())
+        contexto = ProductoSerializer.get_contexto_listado(list(productos))
+        contexto.update(UsuarioSerializer.get_contexto_listado(mozos))
+        return contexto
+
     def to_representation(self, turno):
         ret = super().to_representation(turno)
         ret['fecha'] = turno.hora_inicio.strftime('%d/%m/%Y')
@@ -0,0 +1,64 @@
+from base.models import Usuario
+from django.test import TestCase
+from gastronomia.models import Venta, VentaLinea
+from mesas.models import Mesa, OrdenProducto, Turno
+from producto.models import Categoria, MovimientoStock, Producto
+from producto.stock import aplicar_movimiento
+
+
+class CerrarTurnoTest(TestCase):
+    """
+        Comprueba que al cerrar el turno se cree la venta de todas las órdenes con el precio vigente completo, se
+        entreguen las órdenes y el stock descontado al cargarlas no vuelva a moverse.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.get(email='root@gmail.com')
+        categoria = Categoria.objects.first()
+        self.productos = []
+        for indice, precio in enumerate([10.5, 20, 7.25]):
+            producto = Producto.objects.create(categoria=categoria, nombre="Prueba de turno " + str(indice),
+                                               costo_vigente=5, precio_vigente=precio)
+            aplicar_movimiento(producto, 10, "Stock inicial")
+            self.productos.append(producto)
+        self.mesa = Mesa.objects.create(numero=950)
+        self.turno = self.mesa.crear_turno(self.usuario.first_name)
+        self.turno.auditoria_creador = self.usuario
+        self.turno.save()
+
+    def get_stocks(self):
+        stocks = dict(Producto.objects.filter(pk__in=[producto.id for producto in self.productos]).values_list('id', 'stock'))
+        return [stocks[producto.id] for producto in self.productos]
+
+    def test_cerrar_con_varias_ordenes(self):
+        primero, segundo, tercero = self.productos
+        self.turno.agregar_editar_ordenes([
+            {'producto': {'id': primero.id}, 'cantidad': 2, 'entregado': 1},
+            {'producto': {'id': segundo.id}, 'cantidad': 1},
+            {'producto': {'id': tercero.id}, 'cantidad': 4, 'entregado': 4},
+        ])
+        self.assertEqual(self.get_stocks(), [8, 9, 6])
+        self.assertEqual(Mesa.objects.get(pk=self.mesa.pk).estado, Mesa.OCUPADA)
+        movimientos = MovimientoStock.objects.count()
+
+        turno = Turno.objects.get(pk=self.turno.pk)
+        self.assertTrue(turno.comprobar_puede_cerrar())
+        turno.cerrar()
+
+        turno = Turno.objects.get(pk=self.turno.pk)
+        self.assertEqual(turno.estado, Turno.CERRADO)
+        self.assertIsNotNone(turno.hora_fin)
+        self.assertEqual(Mesa.objects.get(pk=self.mesa.pk).estado, Mesa.DISPONIBLE)
+        estados = set(turno.ordenes.values_list('estado', flat=True))
+        self.assertEqual(estados, {OrdenProducto.ENTREGADO})
+
+        venta = Venta.objects.get(pk=turno.venta_id)
+        self.assertEqual(venta.tipo, Venta.MESA)
+        self.assertEqual(venta.usuario, self.usuario)
+        totales = dict(VentaLinea.objects.filter(venta=venta).values_list('producto_id', 'total'))
+        self.assertEqual(totales, {primero.id: 21.0, segundo.id: 20, tercero.id: 29.0})
+        self.assertEqual(venta.total, 70.0)
+
+        # El stock se descontó al cargar las órdenes, al cerrar no se vuelve a mover.
+        self.assertEqual(self.get_stocks(), [8, 9, 6])
+        self.assertEqual(MovimientoStock.objects.count(), movimientos)
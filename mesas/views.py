@@ -3,26 +3,31 @@ from .serializers import MesaSerializer, TurnoSerializer
 from .repositorio import comprobar_numero_repetido, crear_mesa, actualizar_mesa, get_mesa, comprobar_ordenes_validas
 from base import respuestas
 from base import utils
+from base.operaciones import comprobar_operaciones_compactas
+from base.paginacion import PaginacionCursorMixin
+from base.serializers import precargar_listado
+from base.totales import get_total
 from base.permisos import TieneRolAdmin, TieneRolAdminOMozo
 from base.repositorio import get_usuario
+from base.token import CacheTokenAuthentication
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from gastronomia.repositorio import get_pdf_comanda
 from rest_framework import viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
 respuesta = respuestas.Respuesta()
 
 
-class MesaViewSet(viewsets.ModelViewSet):
+class MesaViewSet(PaginacionCursorMixin, viewsets.ModelViewSet):
     """
         Se encarga del alta, edición y borrado de las mesas.
     """
     queryset = Mesa.objects.all()
     serializer_class = MesaSerializer
-    authentication_classes = [TokenAuthentication]
+    orden_listado = ('numero', 'id')
+    authentication_classes = [CacheTokenAuthentication]
     permission_classes = [IsAuthenticated, TieneRolAdminOMozo]
 
     @transaction.atomic
@@ -91,7 +96,7 @@ class MesaViewSet(viewsets.ModelViewSet):
 
     # Devuelve los cantidad de registros sin tener en cuenta la página actual.
     def get_cantidad_registros(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         if id is None:
             filtros.pop("offset")
@@ -101,7 +106,7 @@ class MesaViewSet(viewsets.ModelViewSet):
 
     # Devuelve las mesas según los filtros de la query
     def filtrar_mesas(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         id_valido = id is not None and int(id) > 0
         if id_valido:
@@ -111,7 +116,7 @@ class MesaViewSet(viewsets.ModelViewSet):
         limit = filtros.get("limit")
         filtros.pop("offset")
         filtros.pop("limit")
-        mesas = Mesa.objects.filter(**filtros).order_by('numero')[offset:limit]
+        mesas = self.paginar(request, Mesa.objects.filter(**filtros), offset, limit)
         return mesas
 
     # Lista las mesas aplicando los filtros.
@@ -121,13 +126,15 @@ class MesaViewSet(viewsets.ModelViewSet):
             serializer = MesaSerializer(instance=mesas, many=True)
             mesas = serializer.data
 
-        cantidad = self.get_cantidad_registros(request)
-        total = Mesa.objects.count()
+        cantidad = self.get_cantidad_listado(request)
+        total, total_exacto = get_total(Mesa)
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "mesas": mesas,
             "registros": cantidad
         }
+        datos.update(self.get_datos_cursor(request))
         return respuesta.get_respuesta(datos=datos, formatear=False)
 
     def destroy(self, request, *args, **kwargs):
@@ -146,7 +153,7 @@ class TurnoViewSet(viewsets.ModelViewSet):
     """
     queryset = Turno.objects.all()
     serializer_class = TurnoSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CacheTokenAuthentication]
     permission_classes = [IsAuthenticated, TieneRolAdminOMozo]
 
     @transaction.atomic
@@ -240,28 +247,24 @@ class TurnoViewSet(viewsets.ModelViewSet):
         filtros["auditoria_creado_fecha__range"] = (desde, hasta)
         return filtros
 
-    # Devuelve los cantidad de registros sin tener en cuenta la página actual.
-    def get_cantidad_registros(self, request):
-        filtros = self.get_filtros(request)
-        cantidad = Turno.objects.filter(**filtros).count()
-        return cantidad
-
     # Devuelve los turnos según los filtros de la query
     def filtrar_turnos(self, request):
         filtros = self.get_filtros(request)
-        turnos = Turno.objects.filter(**filtros).order_by('-id')
+        turnos = precargar_listado(Turno.objects.filter(**filtros).order_by('-id'), TurnoSerializer)
         return turnos
 
     @action(detail=False, methods=['get'])
     def turnos(self, request):
         turnos = self.filtrar_turnos(request)
-        if len(turnos) > 0:
-            serializer = TurnoSerializer(instance=turnos, many=True)
+        cantidad = len(turnos)
+        if cantidad > 0:
+            contexto = TurnoSerializer.get_contexto_listado([turno.id for turno in turnos])
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = TurnoSerializer(instance=turnos, many=True, context=contexto)
             turnos = serializer.data
 
         idMesa = request.query_params.get('idMesa', 0)
-        cantidad = self.get_cantidad_registros(request)
-        total = Turno.objects.filter(mesa=idMesa).count()
+        total, total_exacto = get_total(Turno, mesa=idMesa)
 
         mesa = get_mesa(idMesa)
         if mesa is not None:
@@ -269,6 +272,7 @@ class TurnoViewSet(viewsets.ModelViewSet):
             mesa = serializer.data
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "mesa": mesa,
             "turnos": turnos,
             "registros": cantidad
@@ -1,6 +1,8 @@
 from django.apps import AppConfig
-from django.db.models.signals import pre_save
-from base.signals import agregar_auditorias
+from django.db.models.signals import pre_save, post_save, post_delete
+from base.signals import agregar_auditorias, invalidar_cache_totales, actualizar_texto_busqueda, \
+    actualizar_indice_busqueda, borrar_indice_busqueda, comprobar_superior_categoria, actualizar_ruta_categoria, \
+    invalidar_cache_catalogo, registrar_eliminacion
 
 
 class ProductoConfig(AppConfig):
@@ -16,3 +18,34 @@ class ProductoConfig(AppConfig):
     pre_save.connect(agregar_auditorias, sender='producto.Costo')
     pre_save.connect(agregar_auditorias, sender='producto.ReemplazoMercaderia')
 
+    # Invalida los totales guardados de los listados cuando se crea, guarda o borra un registro.
+    post_save.connect(invalidar_cache_totales, sender='producto.Producto')
+    post_save.connect(invalidar_cache_totales, sender='producto.Ingreso')
+    post_save.connect(invalidar_cache_totales, sender='producto.MovimientoStock')
+    post_save.connect(invalidar_cache_totales, sender='producto.ReemplazoMercaderia')
+    post_delete.connect(invalidar_cache_totales, sender='producto.Producto')
+    post_delete.connect(invalidar_cache_totales, sender='producto.Ingreso')
+    post_delete.connect(invalidar_cache_totales, sender='producto.MovimientoStock')
+    post_delete.connect(invalidar_cache_totales, sender='producto.ReemplazoMercaderia')
+
+    # Mantiene el texto normalizado y el índice de búsqueda del producto.
+    pre_save.connect(actualizar_texto_busqueda, sender='producto.Producto')
+    post_save.connect(actualizar_indice_busqueda, sender='producto.Producto')
+    post_delete.connect(borrar_indice_busqueda, sender='producto.Producto')
+
+    # Mantiene la ruta de la categoría y de sus inferiores en el árbol de categorías.
+    pre_save.connect(comprobar_superior_categoria, sender='producto.Categoria')
+    post_save.connect(actualizar_ruta_categoria, sender='producto.Categoria')
+
+    # Invalida las respuestas guardadas del catálogo público cuando cambian los datos que muestra. Los movimientos de
+    # stock lo invalidan desde producto.stock solo si un producto se agota o vuelve a tener stock.
+    post_save.connect(invalidar_cache_catalogo, sender='producto.Producto')
+    post_save.connect(invalidar_cache_catalogo, sender='producto.Categoria')
+    post_save.connect(invalidar_cache_catalogo, sender='producto.Precio')
+    post_delete.connect(invalidar_cache_catalogo, sender='producto.Producto')
+    post_delete.connect(invalidar_cache_catalogo, sender='producto.Categoria')
+    post_delete.connect(invalidar_cache_catalogo, sender='producto.Precio')
+
+    # Registra los borrados para los clientes que sincronizan los cambios del catálogo.
+    post_delete.connect(registrar_eliminacion, sender='producto.Producto')
+    post_delete.connect(registrar_eliminacion, sender='producto.Categoria')
@@ -0,0 +1,139 @@
+from base.respuestas import Respuesta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from producto.menu import descartar_menu
+from rest_framework import status
+from rest_framework.response import Response
+import hashlib
+import json
+import secrets
+import threading
+import time
+
+respuesta = Respuesta()
+
+# Respuestas del catálogo público por vista y parámetros: {(vista, parametros): (vencimiento, version, etag, fecha,
+# datos)}. Una entrada con una versión distinta de la actual está desactualizada.
+_CATALOGO = {}
+_CATALOGO_LOCK = threading.Lock()
+_CATALOGO_MAXIMO = 500
+# Clave de la versión del catálogo en la caché CATALOGO_CACHE. Cambia cada vez que cambia un producto, una categoría o
+# un precio, o cuando un producto se agota o vuelve a tener stock. Se guarda en la caché compartida para que el cambio
+# deje desactualizadas las respuestas guardadas en todos los procesos y no solo en el que hizo la modificación.
+CLAVE_VERSION = 'catalogo_version'
+
+
+def get_respuesta_catalogo(request, vista, generar):
+    """
+        Devuelve la respuesta de un listado del catálogo público. Los datos de cada combinación de parámetros se
+        guardan en memoria del proceso durante CATALOGO_CACHE_SEGUNDOS o hasta que cambia la versión del catálogo, que
+        se lee de la caché compartida en cada request, de forma que mientras no haya cambios el listado no consulta la
+        base de datos. La respuesta incluye los headers
+        ETag y Last-Modified, y si el cliente ya tiene la versión actual se responde 304 sin contenido.
+        @param request: Request
+        @param vista: str Nombre del listado, forma parte de la clave.
+        @param generar: Callable Función sin parámetros que devuelve los datos del listado.
+        @return: Response
+    """
+    clave = (vista, tuple(sorted((parametro, tuple(valores)) for parametro, valores in request.query_params.lists())))
+    ahora = time.monotonic()
+    version = get_version_catalogo()
+    entrada = _CATALOGO.get(clave)
+    if entrada is None or entrada[0] <= ahora or entrada[1] != version:
+        datos = generar()
+        # El ETag depende solo del contenido, así es el mismo en todos los procesos que tengan los mismos datos.
+        contenido = json.dumps(datos, sort_keys=True, default=str).encode()
+        etag = quote_etag(hashlib.sha1(contenido).hexdigest())
+        vencimiento = ahora + getattr(settings, 'CATALOGO_CACHE_SEGUNDOS', 60)
+        entrada = (vencimiento, version, etag, time.time(), datos)
+        with _CATALOGO_LOCK:
+            if len(_CATALOGO) >= _CATALOGO_MAXIMO:
+                limpiar_catalogo_vencido(ahora, version)
+            _CATALOGO[clave] = entrada
+
+    etag, fecha, datos = entrada[2], entrada[3], entrada[4]
+    if comprobar_sin_cambios(request, etag, fecha):
+        resultado = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        resultado = respuesta.get_respuesta(datos=datos, formatear=False)
+    resultado['ETag'] = etag
+    resultado['Last-Modified'] = http_date(fecha)
+    # El navegador puede guardar la respuesta pero debe revalidarla con el ETag antes de usarla.
+    resultado['Cache-Control'] = 'no-cache'
+    return resultado
+
+
+def comprobar_sin_cambios(request, etag, fecha):
+    """
+        Devuelve true si la copia que tiene el cliente, según los headers If-None-Match o If-Modified-Since, sigue
+        vigente. Si el cliente envía If-None-Match no se tiene en cuenta If-Modified-Since.
+        @param request: Request
+        @param etag: str
+        @param fecha: float
+        @return: bool
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etiquetas = [etiqueta.strip() for etiqueta in if_none_match.split(',')]
+        return '*' in etiquetas or etag in etiquetas or 'W/' + etag in etiquetas
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(fecha) <= if_modified_since
+
+
+def limpiar_catalogo_vencido(ahora, version):
+    """
+        Quita las entradas vencidas o desactualizadas del catálogo. Si aun así está lleno lo vacía. Debe llamarse con
+        el lock tomado.
+        @param ahora: float
+        @param version: str Versión actual del catálogo.
+        @return: None
+    """
+    vencidas = [clave for clave, entrada in _CATALOGO.items() if entrada[0] <= ahora or entrada[1] != version]
+    for clave in vencidas:
+        del _CATALOGO[clave]
+    if len(_CATALOGO) >= _CATALOGO_MAXIMO:
+        _CATALOGO.clear()
+
+
+def get_cache_catalogo():
+    """
+        Devuelve la caché donde se guarda la versión del catálogo.
+        @return: BaseCache
+    """
+    return caches[getattr(settings, 'CATALOGO_CACHE', 'default')]
+
+
+def get_version_catalogo():
+    """
+        Devuelve la versión actual del catálogo. Si la caché no la tiene, porque se reinició o la descartó, se genera
+        una nueva, lo que deja desactualizadas las respuestas guardadas hasta entonces.
+        @return: str
+    """
+    cache = get_cache_catalogo()
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, secrets.token_hex(8), None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def incrementar_version_catalogo():
+    """
+        Cambia la versión del catálogo, dejando desactualizadas las respuestas guardadas en todos los procesos.
+        @return: None
+    """
+    get_cache_catalogo().set(CLAVE_VERSION, secrets.token_hex(8), None)
+
+
+def invalidar_catalogo():
+    """
+        Invalida las respuestas guardadas del catálogo y la instantánea del menú cuando termina la transacción actual,
+        para que ningún request guarde los datos anteriores al cambio mientras la transacción sigue abierta. Debe
+        llamarse después de operaciones que no envían señales, como bulk_create o update.
+        @return: None
+    """
+    transaction.on_commit(incrementar_version_catalogo)
+    descartar_menu()
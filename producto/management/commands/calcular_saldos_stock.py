@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from producto.models import Producto, MovimientoStock
+
+
+class Command(BaseCommand):
+    help = "Calcula el saldo de los movimientos de stock existentes a partir del stock actual de cada producto."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--producto', type=int, default=0, help="Id del producto a recalcular.")
+        parser.add_argument('--lote', type=int, default=1000, help="Cantidad de movimientos a guardar por consulta.")
+        parser.add_argument('--todos', action='store_true', help="Recalcula también los movimientos que ya tienen saldo.")
+
+    def handle(self, *args, **options):
+        id_producto = options['producto']
+        lote = options['lote']
+
+        productos = Producto.objects.all()
+        if id_producto > 0:
+            productos = productos.filter(pk=id_producto)
+        if not options['todos']:
+            productos = productos.filter(movimientos__saldo__isnull=True).distinct()
+
+        actualizados = 0
+        for producto in productos.only('id').iterator():
+            actualizados += self.calcular_saldos(producto.id, lote)
+        self.stdout.write(self.style.SUCCESS("Se calcularon los saldos de " + str(actualizados) + " movimientos."))
+
+    @transaction.atomic
+    def calcular_saldos(self, id_producto, lote):
+        """
+            Recorre los movimientos del producto desde el más reciente, tomando el stock actual como saldo final.
+            @param id_producto: int
+            @param lote: int
+            @return: int Cantidad de movimientos actualizados.
+        """
+        producto = Producto.objects.select_for_update().only('id', 'stock').get(pk=id_producto)
+        saldo = producto.stock
+        pendientes = []
+        actualizados = 0
+        movimientos = MovimientoStock.objects.filter(producto_id=id_producto).order_by('-id').only('id', 'cantidad', 'saldo')
+        for movimiento in movimientos.iterator():
+            if movimiento.saldo != saldo:
+                movimiento.saldo = saldo
+                pendientes.append(movimiento)
+            saldo -= movimiento.cantidad
+            if len(pendientes) >= lote:
+                MovimientoStock.objects.bulk_update(pendientes, ['saldo'])
+                actualizados += len(pendientes)
+                pendientes = []
+        if len(pendientes) > 0:
+            MovimientoStock.objects.bulk_update(pendientes, ['saldo'])
+            actualizados += len(pendientes)
+        return actualizados
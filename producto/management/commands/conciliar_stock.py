@@ -0,0 +1,76 @@
+from base.models import Usuario
+from base.signals import agregar_auditoria_creado
+from base.totales import invalidar_totales
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from producto.models import Producto, MovimientoStock
+
+
+class Command(BaseCommand):
+    help = "Compara el stock de cada producto con la suma de sus movimientos y reporta las diferencias."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true', help="Crea movimientos que igualan los movimientos al stock.")
+        parser.add_argument('--usuario', default="", help="Email del usuario que figura como creador de las correcciones.")
+        parser.add_argument('--lote', type=int, default=1000, help="Cantidad de productos a corregir por transacción.")
+
+    def handle(self, *args, **options):
+        corregir = options['corregir']
+        usuario = None
+        if corregir:
+            usuario = Usuario.objects.filter(email=options['usuario']).first()
+            if usuario is None:
+                raise CommandError("Debe indicar con --usuario el email de un usuario existente para corregir el stock.")
+
+        diferencias = self.get_diferencias()
+        for id_producto, nombre, stock, suma in diferencias:
+            self.stdout.write(nombre + " (" + str(id_producto) + "): stock " + str(stock) + ", movimientos " + str(suma))
+        self.stdout.write("Productos con diferencias: " + str(len(diferencias)))
+
+        if corregir and len(diferencias) > 0:
+            ids = [id_producto for id_producto, nombre, stock, suma in diferencias]
+            lote = options['lote']
+            creados = 0
+            for inicio in range(0, len(ids), lote):
+                creados += self.corregir(ids[inicio:inicio + lote], usuario)
+            self.stdout.write(self.style.SUCCESS("Se crearon " + str(creados) + " movimientos de corrección."))
+
+    def get_diferencias(self):
+        """
+            Suma los movimientos de todos los productos en una única consulta agrupada y la compara con el stock.
+            @return: List Tuplas (id, nombre, stock, suma de movimientos) de los productos con diferencias.
+        """
+        sumas = dict(MovimientoStock.objects.order_by().values_list('producto_id').annotate(total=Sum('cantidad')))
+        diferencias = []
+        for id_producto, nombre, stock in Producto.objects.values_list('id', 'nombre', 'stock').iterator():
+            suma = sumas.get(id_producto, 0)
+            if suma != stock:
+                diferencias.append((id_producto, nombre, stock, suma))
+        return diferencias
+
+    @transaction.atomic
+    def corregir(self, ids, usuario):
+        """
+            Crea un movimiento por producto con la diferencia, dejando el stock del producto como saldo. El stock y la
+            suma de movimientos se vuelven a leer con los productos bloqueados, ya que pudieron cambiar desde el reporte:
+            mientras dura la transacción ninguna venta ni otra corrección puede modificarlos.
+            @param ids: List<int> Ids de los productos con diferencias.
+            @param usuario: Usuario
+            @return: int Cantidad de movimientos creados.
+        """
+        stocks = dict(Producto.objects.select_for_update().filter(pk__in=ids).order_by('id').values_list('id', 'stock'))
+        sumas = MovimientoStock.objects.filter(producto_id__in=ids).order_by().values_list('producto_id')
+        sumas = dict(sumas.annotate(total=Sum('cantidad')))
+        movimientos = []
+        for id_producto, stock in stocks.items():
+            suma = sumas.get(id_producto, 0)
+            if suma == stock:
+                continue
+            movimiento = MovimientoStock(producto_id=id_producto, cantidad=stock - suma, saldo=stock,
+                                         descripcion="Conciliación de stock")
+            agregar_auditoria_creado(movimiento, usuario)
+            movimientos.append(movimiento)
+        MovimientoStock.objects.bulk_create(movimientos)
+        invalidar_totales(MovimientoStock)
+        return len(movimientos)
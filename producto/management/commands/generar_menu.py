@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from producto.menu import comprobar_menu_vigente, generar_menu
+
+
+class Command(BaseCommand):
+    help = "Genera la instantánea estática del menú con el catálogo completo. Pensado para ejecutarse al desplegar, " \
+           "después de collectstatic, y periódicamente con --pendiente, para que los requests no tengan que generarla."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pendiente', action='store_true',
+                            help="Genera la instantánea solo si cambió el catálogo o venció la anterior.")
+
+    def handle(self, *args, **options):
+        if options['pendiente'] and comprobar_menu_vigente():
+            self.stdout.write("La instantánea del menú está actualizada.")
+            return
+        nombre = generar_menu()
+        self.stdout.write(self.style.SUCCESS("Se generó la instantánea del menú " + nombre + "."))
@@ -0,0 +1,43 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from producto.models import MovimientoStock, StockDiario
+from producto.repositorio import generar_stock_diario
+
+
+class Command(BaseCommand):
+    help = "Genera la foto diaria del stock de los productos. Sin parámetros continúa desde la última foto hasta ayer."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', default="", help="Fecha inicial con formato AAAA-MM-DD.")
+        parser.add_argument('--hasta', default="", help="Fecha final con formato AAAA-MM-DD.")
+
+    def handle(self, *args, **options):
+        hasta = self.get_fecha(options['hasta']) or datetime.date.today() - datetime.timedelta(days=1)
+        desde = self.get_fecha(options['desde']) or self.get_fecha_inicial()
+        if desde is None:
+            self.stdout.write("No hay movimientos de stock.")
+            return
+
+        dias = 0
+        fecha = desde
+        while fecha <= hasta:
+            generar_stock_diario(fecha)
+            fecha += datetime.timedelta(days=1)
+            dias += 1
+        self.stdout.write(self.style.SUCCESS("Se generó el stock de " + str(dias) + " días."))
+
+    def get_fecha(self, texto):
+        if texto == "":
+            return None
+        try:
+            return datetime.datetime.strptime(texto, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("La fecha " + texto + " no tiene el formato AAAA-MM-DD.")
+
+    # Devuelve el día siguiente a la última foto o el día del primer movimiento si no hay fotos.
+    def get_fecha_inicial(self):
+        ultimo = StockDiario.objects.order_by('-fecha').values_list('fecha', flat=True).first()
+        if ultimo is not None:
+            return ultimo + datetime.timedelta(days=1)
+        primero = MovimientoStock.objects.order_by('auditoria_creado_fecha').values_list('auditoria_creado_fecha', flat=True).first()
+        return primero.date() if primero is not None else None
@@ -0,0 +1,196 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import HttpRequest
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from whitenoise.compress import Compressor
+import hashlib
+import os
+import re
+import threading
+import time
+
+# Carpeta dentro de STATIC_ROOT donde se guardan las instantáneas del menú.
+MENU_CARPETA = 'menu'
+# Archivo con el nombre de la instantánea vigente. Su fecha de modificación es la del inicio de su generación.
+MENU_ACTUAL = MENU_CARPETA + '/actual.txt'
+# Archivo que se toca al cambiar el catálogo. Si es posterior a la instantánea vigente hay que generar una nueva.
+MENU_PENDIENTE = MENU_CARPETA + '/pendiente.txt'
+# Nombre de las instantáneas, con el hash del contenido como los archivos de CompressedManifestStaticFilesStorage.
+MENU_NOMBRE = re.compile(r'^' + MENU_CARPETA + r'/menu\.[0-9a-f]{12}\.json$')
+# Cantidad de instantáneas anteriores que se conservan para los clientes que todavía las están descargando.
+MENU_ANTERIORES = 3
+
+# Nombre de la instantánea vigente leído del archivo, junto con la fecha de modificación del archivo.
+_MENU = {'nombre': None, 'marca': None}
+# Tomado mientras el proceso genera una instantánea en segundo plano.
+_MENU_LOCK = threading.Lock()
+
+
+def get_url_menu():
+    """
+        Devuelve la url de la última instantánea del menú. Si está desactualizada se sigue devolviendo mientras se
+        genera una nueva en segundo plano, de forma que ningún request espera la consulta del catálogo ni la
+        compresión de los archivos. Devuelve None si no está configurado STATIC_ROOT o todavía no hay instantánea.
+        @return: str|None
+    """
+    if not settings.STATIC_ROOT:
+        return None
+    nombre = get_nombre_menu_actual()
+    if nombre is None or not comprobar_menu_vigente():
+        generar_menu_en_segundo_plano()
+    if nombre is None:
+        return None
+    return settings.STATIC_URL + nombre
+
+
+def get_nombre_menu_actual():
+    """
+        Devuelve el nombre de la última instantánea generada, o None si no hay.
+        @return: str|None
+    """
+    ruta = os.path.join(settings.STATIC_ROOT, MENU_ACTUAL)
+    try:
+        marca = os.stat(ruta).st_mtime
+    except FileNotFoundError:
+        return None
+    if _MENU['marca'] != marca:
+        try:
+            with open(ruta) as archivo:
+                nombre = archivo.read().strip()
+        except FileNotFoundError:
+            return None
+        if not MENU_NOMBRE.match(nombre) or not os.path.isfile(os.path.join(settings.STATIC_ROOT, nombre)):
+            return None
+        _MENU['nombre'], _MENU['marca'] = nombre, marca
+    return _MENU['nombre']
+
+
+def comprobar_menu_vigente():
+    """
+        Devuelve true si la última instantánea se empezó a generar después del último cambio del catálogo y hace menos
+        de MENU_SEGUNDOS. El vencimiento acota el tiempo que se muestra el stock desactualizado, ya que las ventas no
+        invalidan el menú, y el de los servidores que no comparten el disco con el que modificó el catálogo.
+        @return: bool
+    """
+    try:
+        generado = os.stat(os.path.join(settings.STATIC_ROOT, MENU_ACTUAL)).st_mtime
+    except FileNotFoundError:
+        return False
+    if time.time() - generado > getattr(settings, 'MENU_SEGUNDOS', 300):
+        return False
+    try:
+        cambiado = os.stat(os.path.join(settings.STATIC_ROOT, MENU_PENDIENTE)).st_mtime
+    except FileNotFoundError:
+        return True
+    return cambiado < generado
+
+
+def generar_menu_en_segundo_plano():
+    """
+        Genera una nueva instantánea en un hilo aparte, salvo que el proceso ya esté generando una.
+        @return: None
+    """
+    if not _MENU_LOCK.acquire(blocking=False):
+        return
+
+    def generar():
+        try:
+            generar_menu()
+        finally:
+            connections.close_all()
+            _MENU_LOCK.release()
+
+    threading.Thread(target=generar, daemon=True).start()
+
+
+def get_datos_menu():
+    """
+        Devuelve los datos del catálogo completo: el listado público de productos sin filtros, con sus precios e
+        imágenes, junto con las categorías.
+        @return: dict
+    """
+    from producto.views import ProductoViewSet, CategoriaViewSet
+    request = Request(HttpRequest())
+    datos = ProductoViewSet().get_datos_listado(request)
+    datos['categorias'] = CategoriaViewSet().get_datos_listado(request)['categorias']
+    return datos
+
+
+def generar_menu():
+    """
+        Genera la instantánea del menú como un archivo estático con el hash del contenido en el nombre, junto con sus
+        versiones comprimidas, y la marca como vigente. Si el contenido no cambió se reutiliza el archivo existente.
+        @return: str Nombre de la instantánea dentro de STATIC_ROOT.
+    """
+    # Si el catálogo cambia mientras se genera, el cambio es posterior a la fecha de la instantánea y queda pendiente.
+    inicio = time.time()
+    contenido = JSONRenderer().render({"exito": True, "message": "", "datos": get_datos_menu()})
+    nombre = MENU_CARPETA + '/menu.' + hashlib.md5(contenido).hexdigest()[:12] + '.json'
+    carpeta = os.path.join(settings.STATIC_ROOT, MENU_CARPETA)
+    os.makedirs(carpeta, exist_ok=True)
+
+    ruta = os.path.join(settings.STATIC_ROOT, nombre)
+    if not os.path.isfile(ruta):
+        escribir_archivo(ruta, contenido)
+        list(Compressor(quiet=True).compress(ruta))
+    actual = os.path.join(settings.STATIC_ROOT, MENU_ACTUAL)
+    escribir_archivo(actual, nombre.encode())
+    os.utime(actual, (inicio, inicio))
+    borrar_menus_anteriores(carpeta, nombre)
+    return nombre
+
+
+def escribir_archivo(ruta, contenido):
+    """
+        Escribe el archivo reemplazándolo de una sola vez, para que nunca se lea a medio escribir.
+        @param ruta: str
+        @param contenido: bytes
+        @return: None
+    """
+    temporal = ruta + '.' + str(os.getpid()) + '.tmp'
+    with open(temporal, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def borrar_menus_anteriores(carpeta, vigente):
+    """
+        Borra las instantáneas más viejas, conservando la vigente y las MENU_ANTERIORES anteriores.
+        @param carpeta: str
+        @param vigente: str
+        @return: None
+    """
+    instantaneas = [os.path.join(carpeta, archivo) for archivo in os.listdir(carpeta)
+                    if MENU_NOMBRE.match(MENU_CARPETA + '/' + archivo)]
+    instantaneas = [ruta for ruta in instantaneas if ruta != os.path.join(settings.STATIC_ROOT, vigente)]
+    instantaneas.sort(key=os.path.getmtime, reverse=True)
+    for ruta in instantaneas[MENU_ANTERIORES:]:
+        # El archivo sin comprimir se borra último porque es el que comprueba el middleware antes de servirlo.
+        for variante in (ruta + '.gz', ruta + '.br', ruta):
+            try:
+                os.remove(variante)
+            except FileNotFoundError:
+                pass
+
+
+def descartar_menu():
+    """
+        Marca la instantánea del menú como desactualizada cuando termina la transacción actual, para que se genere una
+        nueva en segundo plano. Hasta que esté lista se sigue sirviendo la anterior.
+        @return: None
+    """
+    transaction.on_commit(marcar_menu_pendiente)
+
+
+def marcar_menu_pendiente():
+    """
+        Actualiza la fecha del archivo que indica que el catálogo cambió después de la última instantánea.
+        @return: None
+    """
+    if not settings.STATIC_ROOT:
+        return
+    os.makedirs(os.path.join(settings.STATIC_ROOT, MENU_CARPETA), exist_ok=True)
+    with open(os.path.join(settings.STATIC_ROOT, MENU_PENDIENTE), 'a'):
+        pass
+    os.utime(os.path.join(settings.STATIC_ROOT, MENU_PENDIENTE))
@@ -0,0 +1,43 @@
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .menu import MENU_NOMBRE
+import os
+
+
+class MenuWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+        WhiteNoise lee la lista de archivos estáticos al iniciar. Además de esos archivos, sirve las instantáneas del
+        menú que se generan mientras la aplicación está corriendo, agregándolas la primera vez que se piden, y deja de
+        servir las que se borraron. Como el nombre incluye el hash del contenido se pueden guardar en caché
+        indefinidamente.
+    """
+
+    def process_request(self, request):
+        url = request.path_info
+        if not self.autorefresh and self.comprobar_url_menu(url):
+            self.actualizar_menu(url)
+        return super().process_request(request)
+
+    # Agrega la instantánea pedida si todavía no está en la lista de archivos y quita las que ya se borraron del disco,
+    # para que las urls anteriores respondan 404 en lugar de fallar al abrir el archivo.
+    def actualizar_menu(self, url):
+        if url in self.files and os.path.isfile(self.get_ruta_menu(url)):
+            return
+        for anterior in [archivo for archivo in list(self.files) if self.comprobar_url_menu(archivo)]:
+            if not os.path.isfile(self.get_ruta_menu(anterior)):
+                self.files.pop(anterior, None)
+        ruta = self.get_ruta_menu(url)
+        if os.path.isfile(ruta):
+            self.add_file_to_dictionary(url, ruta)
+
+    def immutable_file_test(self, path, url):
+        if self.comprobar_url_menu(url):
+            return True
+        return super().immutable_file_test(path, url)
+
+    # Devuelve la ruta del archivo de la instantánea del menú.
+    def get_ruta_menu(self, url):
+        return os.path.join(self.static_root, url[len(self.static_prefix):])
+
+    # Comprueba que la url sea la de una instantánea del menú.
+    def comprobar_url_menu(self, url):
+        return url.startswith(self.static_prefix) and MENU_NOMBRE.match(url[len(self.static_prefix):]) is not None
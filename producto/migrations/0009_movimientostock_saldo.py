@@ -0,0 +1,18 @@
+# Generated by Django 3.2.4 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0008_auto_20211202_1708'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientostock',
+            name='saldo',
+            field=models.IntegerField(null=True),
+        ),
+    ]
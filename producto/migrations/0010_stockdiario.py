@@ -0,0 +1,26 @@
+# Generated by Django 3.2.4 on 2026-10-18 11:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0009_movimientostock_saldo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('stock', models.IntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocks_diarios', to='producto.producto')),
+            ],
+            options={
+                'unique_together': {('producto', 'fecha')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0010_stockdiario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingreso',
+            index=models.Index(fields=['fecha'], name='ingreso_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['auditoria_creado_fecha'], name='movimiento_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['producto', 'auditoria_creado_fecha'], name='movimiento_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reemplazomercaderia',
+            index=models.Index(fields=['fecha'], name='reemplazo_fecha_idx'),
+        ),
+    ]
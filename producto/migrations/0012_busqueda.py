@@ -0,0 +1,45 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:39
+
+from django.db import migrations, models
+from unidecode import unidecode
+
+
+# Copia de las funciones de base.busqueda al momento de crear la migración, para que la migración no cambie si
+# cambian esas funciones.
+def normalizar_texto(texto):
+    if texto is None:
+        return ""
+    return " ".join(unidecode(str(texto)).lower().split())
+
+
+def get_trigramas(texto):
+    normalizado = normalizar_texto(texto)
+    return {normalizado[indice:indice + 3] for indice in range(len(normalizado) - 2)}
+
+
+def indexar_productos(apps, schema_editor):
+    # Genera el texto normalizado y el índice de búsqueda de los productos existentes.
+    Producto = apps.get_model('producto', 'Producto')
+    TrigramaBusqueda = apps.get_model('base', 'TrigramaBusqueda')
+    for objeto in Producto.objects.all():
+        Producto.objects.filter(pk=objeto.pk).update(nombre_busqueda=normalizar_texto(objeto.nombre))
+        trigramas = [TrigramaBusqueda(modelo='producto.Producto', campo=campo, objeto_id=objeto.pk, trigrama=trigrama)
+                     for campo in ['nombre'] for trigrama in get_trigramas(getattr(objeto, campo))]
+        TrigramaBusqueda.objects.bulk_create(trigramas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_busqueda'),
+        ('producto', '0011_indices_listados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='nombre_busqueda',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(indexar_productos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+def calcular_rutas(apps, schema_editor):
+    # Calcula la ruta de las categorías existentes recorriendo el árbol desde las categorías sin superior.
+    Categoria = apps.get_model('producto', 'Categoria')
+    pendientes = [(categoria, "") for categoria in Categoria.objects.filter(superior=None)]
+    while len(pendientes) > 0:
+        categoria, ruta_superior = pendientes.pop()
+        ruta = ruta_superior + str(categoria.id).zfill(5) + "/"
+        Categoria.objects.filter(pk=categoria.pk).update(ruta=ruta)
+        pendientes.extend((inferior, ruta) for inferior in Categoria.objects.filter(superior=categoria))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0012_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='ruta',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.RunPython(calcular_rutas, migrations.RunPython.noop),
+    ]
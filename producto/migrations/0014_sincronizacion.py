@@ -0,0 +1,21 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0013_categoria_ruta'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='categoria',
+            index=models.Index(fields=['auditoria_modificado_fecha'], name='categoria_modificado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['auditoria_modificado_fecha'], name='producto_modificado_idx'),
+        ),
+    ]
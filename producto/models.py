@@ -3,12 +3,18 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from base.models import Auditoria, Usuario
 from gastronomia.models import Pedido, Estado, VentaLinea
+from producto.stock import aplicar_movimiento, aplicar_movimientos
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Concat, Substr
 import uuid
 
 
 class Categoria(Auditoria, models.Model):
     superior = models.ForeignKey(
         'Categoria', on_delete=models.PROTECT, related_name="inferiores", null=True, blank=True)
+    # Ids de las categorías superiores y de la propia categoría, por ejemplo "00001/00004/". Se actualiza al guardar la
+    # categoría y permite obtener todas las categorías inferiores con una consulta por prefijo.
+    ruta = models.CharField(max_length=255, default="", blank=True, db_index=True)
     nombre = models.CharField(max_length=30, unique=True)
     descripcion = models.CharField(max_length=255, null=True)
     habilitado = models.BooleanField(default=True)
@@ -16,10 +22,75 @@ class Categoria(Auditoria, models.Model):
     auditoria_creador = models.ForeignKey('base.Usuario', on_delete=models.CASCADE, related_name="categorias_creadas", null=True)
     auditoria_modificado = models.ForeignKey('base.Usuario', on_delete=models.CASCADE, related_name="categorias_modificadas", null=True)
 
+    class Meta:
+        indexes = [
+            # Sincronización de los cambios posteriores a una fecha.
+            models.Index(fields=['auditoria_modificado_fecha'], name='categoria_modificado_idx'),
+        ]
+
     # Devuelve el id legible de la categoría.
     def get_id_texto(self):
         return "C" + str(self.id).zfill(5)
 
+    # Devuelve la ruta que le corresponde a la categoría según su categoría superior.
+    def get_ruta_calculada(self):
+        ruta_superior = self.superior.ruta if self.superior is not None else ""
+        return ruta_superior + str(self.id).zfill(5) + "/"
+
+    # Devuelve la profundidad de la categoría en el árbol, empezando en 0 para las categorías sin superior.
+    def get_nivel(self):
+        return max(self.ruta.count("/") - 1, 0)
+
+    def comprobar_puede_moverse(self, superior):
+        """
+            Comprueba que la categoría pueda ubicarse debajo de la categoría superior indicada, es decir que la
+            superior no sea la propia categoría ni una de sus inferiores.
+            @param superior: Categoria|None
+            @return: bool
+        """
+        if superior is None or self.id is None:
+            return True
+        return not superior.ruta.startswith(self.ruta)
+
+    def actualizar_ruta(self):
+        """
+            Recalcula la ruta de la categoría y, si cambió porque se movió de categoría superior, la de todas sus
+            inferiores con una sola actualización.
+            @return: None
+        """
+        anterior = self.ruta
+        nueva = self.get_ruta_calculada()
+        if anterior == nueva:
+            return
+        if len(anterior) > 0:
+            Categoria.get_subarbol(anterior).update(ruta=Concat(Value(nueva), Substr('ruta', len(anterior) + 1)),
+                                                    auditoria_modificado_fecha=datetime.datetime.now())
+        else:
+            Categoria.objects.filter(pk=self.pk).update(ruta=nueva)
+        self.ruta = nueva
+
+    @staticmethod
+    def get_filtros_subarbol(ruta, relacion=""):
+        """
+            Devuelve los filtros de las categorías cuya ruta empieza con la ruta indicada, es decir la categoría y todas
+            sus inferiores. Se filtra por rango en lugar de por prefijo para que la consulta use el índice de la ruta en
+            todas las bases de datos.
+            @param ruta: str
+            @param relacion: str Prefijo de la relación con la categoría cuando se filtra otro modelo, como "categoria__".
+            @return: dict
+        """
+        # El caracter siguiente a "/" es "0", todas las rutas que empiezan con el prefijo quedan en el rango.
+        return {relacion + 'ruta__gte': ruta, relacion + 'ruta__lt': ruta[:-1] + "0"}
+
+    @staticmethod
+    def get_subarbol(ruta):
+        """
+            Devuelve la categoría con la ruta indicada y todas sus inferiores.
+            @param ruta: str
+            @return: QuerySet
+        """
+        return Categoria.objects.filter(**Categoria.get_filtros_subarbol(ruta))
+
     def comprobar_puede_borrarse(self):
         cantidad = self.productos.all().filter(borrado=False).count()
         return cantidad == 0
@@ -36,6 +107,8 @@ def upload_to(instance, filename):
 class Producto(Auditoria, models.Model):
     categoria = models.ForeignKey(Categoria, on_delete=models.PROTECT, related_name="productos", default="productos")
     nombre = models.CharField(max_length=50, unique=True)
+    # Nombre normalizado para las búsquedas, se actualiza al guardar el producto.
+    nombre_busqueda = models.CharField(max_length=100, default="", blank=True)
     imagen = models.ImageField(_("Image"), upload_to=upload_to, null=True, default="producto/defecto/default.jpg")
     imagen_nombre = models.CharField(max_length=50, default="default.jpg")
     descripcion = models.CharField(max_length=255, default="")
@@ -50,6 +123,23 @@ class Producto(Auditoria, models.Model):
     auditoria_creador = models.ForeignKey('base.Usuario', on_delete=models.CASCADE, related_name="productos_creados", null=True)
     auditoria_modificado = models.ForeignKey('base.Usuario', on_delete=models.CASCADE, related_name="productos_modificados", null=True)
 
+    class Meta:
+        indexes = [
+            # Sincronización de los cambios posteriores a una fecha.
+            models.Index(fields=['auditoria_modificado_fecha'], name='producto_modificado_idx'),
+        ]
+
+    # Campos que se guardan al cambiar el precio o el costo vigente, además del propio precio o costo.
+    CAMPOS_AUDITORIA = ['auditoria_modificado', 'auditoria_modificado_fecha']
+
+    # El stock solo cambia con movimientos (producto.stock), que lo actualizan en la base de datos sin leerlo. Al
+    # guardar un producto existente nunca se escribe el stock de la instancia, que puede estar desactualizado.
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [campo.name for campo in self._meta.concrete_fields
+                                       if not campo.primary_key and campo.name != 'stock']
+        super().save(*args, **kwargs)
+
     # Actualiza el precio vigente y agrego el precio a la colección de precios.
     def agregar_precio(self, nuevo=None):
         anterior = self.precio_vigente
@@ -60,7 +150,7 @@ class Producto(Auditoria, models.Model):
         ultimo_precio = ultimo.precio if ultimo is not None else anterior
         if ultimo_precio != nuevo or ultimo is None:
             self.precio_vigente = nuevo
-            self.save()
+            self.save(update_fields=['precio_vigente'] + self.CAMPOS_AUDITORIA)
             precio = Precio(producto=self, precio=nuevo)
             precio.save()
             self.precios.add(precio)
@@ -75,7 +165,7 @@ class Producto(Auditoria, models.Model):
         ultimo_costo = ultimo.costo if ultimo is not None else anterior
         if ultimo_costo != nuevo or ultimo is None:
             self.costo_vigente = nuevo
-            self.save()
+            self.save(update_fields=['costo_vigente'] + self.CAMPOS_AUDITORIA)
             costo = Costo(producto=self, costo=self.costo_vigente)
             costo.save()
             self.costos.add(costo)
@@ -102,11 +192,23 @@ class Producto(Auditoria, models.Model):
         cantidad = Pedido.objects.all().filter(lineas__producto__exact=self).count()
         return cantidad == 0
 
+    # Devuelve para cada id de producto si puede borrarse, en una única consulta.
+    @classmethod
+    def get_pueden_borrarse(cls, ids):
+        usados = set(Pedido.objects.filter(lineas__producto_id__in=ids).order_by().values_list('lineas__producto_id', flat=True))
+        return {id: id not in usados for id in ids}
+
     # Comprueba que el producto tenga movimientos
     def comprobar_tiene_movimientos(self):
         cantidad = MovimientoStock.objects.filter(producto=self).count()
         return cantidad > 0
 
+    # Devuelve para cada id de producto si tiene movimientos, en una única consulta.
+    @classmethod
+    def get_tienen_movimientos(cls, ids):
+        con_movimientos = set(MovimientoStock.objects.filter(producto_id__in=ids).order_by().values_list('producto_id', flat=True).distinct())
+        return {id: id in con_movimientos for id in ids}
+
     # Comprueba que si hay que alertar de stock faltante.
     def comprobar_alerta_stock(self):
         actual = self.stock
@@ -134,32 +236,16 @@ class Producto(Auditoria, models.Model):
     def get_id_texto(self):
         return "P" + str(self.id).zfill(5)
 
-    # Actualiza el stock y sus movimientos en caso de ser necesario.
-    def actualizar_stock(self, nueva=0, descripcion="", reemplazo_linea=None, venta_linea=None):
-        # Calculo la cantidad de stock generado por la edición.
-        acumulado = 0
-        movimientos = MovimientoStock.objects.filter(producto=self)
-        for movimiento in movimientos:
-            acumulado += movimiento.cantidad
-        diferencia = nueva - acumulado
-
-        # Si no hubo diferencia no hay que actualizar el stock
+    # Lleva el stock al valor indicado aplicando como movimiento la diferencia con el stock leído del producto. Si
+    # mientras tanto se aplicó otro movimiento se conserva, ya que solo se suma la diferencia.
+    def actualizar_stock(self, nueva=0, descripcion=""):
+        diferencia = int(nueva) - self.stock
         if diferencia == 0:
             return
 
         if descripcion == "":
             descripcion = "Edición de stock del producto"
-
-        # Si hubo diferencia se actualiza el stock
-        movimiento = MovimientoStock(producto=self, cantidad=diferencia, descripcion=descripcion)
-        if reemplazo_linea is not None and isinstance(reemplazo_linea, ReemplazoMercaderiaLinea):
-            movimiento.reemplazo_linea = reemplazo_linea
-        if venta_linea is not None and isinstance(venta_linea, VentaLinea):
-            movimiento.venta_linea = venta_linea
-        movimiento.save()
-
-        self.stock = int(nueva)
-        self.save()
+        aplicar_movimiento(self, diferencia, descripcion, validar_stock=False)
 
     def __str__(self):
         return self.nombre
@@ -189,18 +275,44 @@ class MovimientoStock(Auditoria, models.Model):
     venta_linea = models.ForeignKey('gastronomia.VentaLinea', on_delete=models.CASCADE, related_name="movimientos", default=None, null=True)
     reemplazo_linea = models.ForeignKey('producto.ReemplazoMercaderiaLinea', on_delete=models.CASCADE, related_name="reemplazos", default=None, null=True)
     cantidad = models.IntegerField()
+    saldo = models.IntegerField(null=True)
     descripcion = models.CharField(max_length=255)
 
+    class Meta:
+        indexes = [
+            # Listado por rango de fecha de creación, con o sin filtro por producto.
+            models.Index(fields=['auditoria_creado_fecha'], name='movimiento_fecha_idx'),
+            models.Index(fields=['producto', 'auditoria_creado_fecha'], name='movimiento_producto_fecha_idx'),
+        ]
+
     def __str__(self):
         return self.auditoria_creado_fecha.__str__()
 
 
+class StockDiario(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="stocks_diarios")
+    fecha = models.DateField()
+    stock = models.IntegerField()
+
+    class Meta:
+        unique_together = ('producto', 'fecha')
+
+    def __str__(self):
+        return self.producto.__str__() + " " + self.fecha.strftime('%d/%m/%Y')
+
+
 class Ingreso(Auditoria, models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="ingresos")
     fecha = models.DateTimeField(default=datetime.datetime.now)
     total = models.FloatField(default=0)
     anulado = models.DateTimeField(null=True)
 
+    class Meta:
+        indexes = [
+            # Listado por rango de fecha.
+            models.Index(fields=['fecha'], name='ingreso_fecha_idx'),
+        ]
+
     def actualizar(self):
         self.actualizar_lineas()
         self.actualizar_total()
@@ -230,24 +342,34 @@ class Ingreso(Auditoria, models.Model):
         es_admin = usuario.esAdmin
         return es_admin
 
-    # Devuelve true si el usuario puede anular el ingreso.
-    def comprobar_puede_anular(self, usuario):
+    # Devuelve true si el usuario puede anular el ingreso. Si se indica negativo no se recorren las líneas.
+    def comprobar_puede_anular(self, usuario, negativo=None):
         errores = []
         es_admin = usuario.esAdmin
         es_vendedor = usuario.esVendedor
         anulado = self.comprobar_anulado()
         if anulado:
             errores.append('El Ingreso ' + self.get_id_texto() + ' ya se encuentra anulado.')
-        lineas = self.lineas.all()
-        for linea in lineas:
-            negativo = linea.comprobar_anula_stock_negativo()
-            if negativo:
-                producto = linea.producto
-                nombre = producto.nombre
-                errores.append('El stock del producto "' + nombre + '" no puede ser negativo.')
+        if negativo:
+            errores.append('El stock de algún producto no puede ser negativo.')
+        if negativo is None:
+            lineas = self.lineas.all()
+            for linea in lineas:
+                negativo = linea.comprobar_anula_stock_negativo()
+                if negativo:
+                    producto = linea.producto
+                    nombre = producto.nombre
+                    errores.append('El stock del producto "' + nombre + '" no puede ser negativo.')
 
         return len(errores) == 0 and (es_admin or es_vendedor)
 
+    # Devuelve para cada id de ingreso si anularlo deja algún producto con stock negativo, en una única consulta.
+    @classmethod
+    def get_anulan_stock_negativo(cls, ids):
+        lineas = IngresoLinea.objects.filter(ingreso_id__in=ids, cantidad__gt=F('producto__stock'))
+        negativos = set(lineas.order_by().values_list('ingreso_id', flat=True))
+        return {id: id in negativos for id in ids}
+
     # Devuelve true si el usuario puede visualizar movimientos de stock del ingreso.
     def comprobar_puede_ver_movimientos(self, usuario):
         es_admin = usuario.esAdmin
@@ -258,17 +380,25 @@ class Ingreso(Auditoria, models.Model):
         cantidad = MovimientoStock.objects.filter(ingreso_linea__ingreso=self).count()
         return cantidad > 0
 
+    # Devuelve para cada id de ingreso si tiene movimientos, en una única consulta.
+    @classmethod
+    def get_tienen_movimientos(cls, ids):
+        movimientos = MovimientoStock.objects.filter(ingreso_linea__ingreso_id__in=ids).order_by()
+        con_movimientos = set(movimientos.values_list('ingreso_linea__ingreso_id', flat=True).distinct())
+        return {id: id in con_movimientos for id in ids}
+
     # Devuelve true si ingreso no está anulado.
     def comprobar_anulado(self):
         anulado = self.anulado
         return anulado is not None
 
-    # Anula el ingreso generando un movimiento de stock a los productos ingresados.
+    # Anula el ingreso generando un movimiento de stock a los productos ingresados. Los movimientos de todas las
+    # líneas se aplican en un único lote, así si algún producto queda sin stock no se anula ninguna línea.
     def anular(self):
         self.anulado = datetime.datetime.now()
         lineas = self.lineas.all()
-        for linea in lineas:
-            linea.anular()
+        movimientos = [linea.get_movimiento_anulacion() for linea in lineas]
+        aplicar_movimientos(movimientos)
 
     # Devuelve la clase del estado del ingreso.
     def get_estado_clase(self):
@@ -315,13 +445,7 @@ class IngresoLinea(models.Model):
         cantidad = self.cantidad
         id_texto = str(self.ingreso.id).zfill(5)
         descripcion = "Ingreso I" + id_texto
-        movimiento = MovimientoStock(producto=producto, cantidad=cantidad, descripcion=descripcion, ingreso_linea=self)
-        movimiento.save()
-
-        stock = producto.stock
-        nuevo = stock + cantidad
-        producto.stock = nuevo
-        producto.save()
+        aplicar_movimiento(producto, cantidad, descripcion, ingreso_linea=self)
 
     def actualizar(self):
         self.actualizar_total()
@@ -346,23 +470,16 @@ class IngresoLinea(models.Model):
         if costo != costo_producto:
             producto.agregar_costo(nuevo=costo)
 
-    # Crea un nuevo movimiento de stock negativo y actualiza el stock del producto.
-    def anular(self):
-        cantidad = self.cantidad
-        producto = self.producto
-        anterior = producto.stock
-        nueva = anterior - cantidad
-        if nueva < 0:
-            nueva = 0
-
-        producto.stock = nueva
-        producto.save()
-
-        cantidadAnulada = cantidad * -1
+    # Devuelve el movimiento de stock negativo sin guardar que descuenta el producto ingresado.
+    def get_movimiento_anulacion(self):
         id_texto = str(self.ingreso.id).zfill(5)
         descripcion = "Ingreso I" + id_texto + " anulado"
-        movimiento = MovimientoStock(producto=producto, cantidad=cantidadAnulada, descripcion=descripcion, ingreso_linea=self)
-        movimiento.save()
+        return MovimientoStock(producto=self.producto, cantidad=-self.cantidad, descripcion=descripcion,
+                               ingreso_linea=self)
+
+    # Crea un nuevo movimiento de stock negativo y actualiza el stock del producto.
+    def anular(self):
+        aplicar_movimientos([self.get_movimiento_anulacion()])
 
     def comprobar_anula_stock_negativo(self):
         """
@@ -384,29 +501,47 @@ class ReemplazoMercaderia(Auditoria, models.Model):
     fecha = models.DateTimeField(default=datetime.datetime.now)
     anulado = models.DateTimeField(null=True)
 
+    class Meta:
+        indexes = [
+            # Listado por rango de fecha.
+            models.Index(fields=['fecha'], name='reemplazo_fecha_idx'),
+        ]
+
     # Devuelve true si el usuario puede visualizar el reemplazo de mercadería.
     def comprobar_puede_visualizar(self, usuario):
         es_admin = usuario.esAdmin
         return es_admin
 
-    # Devuelve true si el usuario puede anular el reemplazo de mercadería.
-    def comprobar_puede_anular(self, usuario):
+    # Devuelve true si el usuario puede anular el reemplazo de mercadería. Si se indica negativo no se recorren las
+    # líneas.
+    def comprobar_puede_anular(self, usuario, negativo=None):
         errores = []
         es_admin = usuario.esAdmin
         es_vendedor = usuario.esVendedor
         anulado = self.comprobar_anulado()
         if anulado:
             errores.append('El Reemplazo ' + self.get_id_texto() + ' ya se encuentra anulado.')
-        lineas = self.lineas.all()
-        for linea in lineas:
-            negativo = linea.comprobar_anula_stock_negativo()
-            if negativo:
-                producto = linea.producto
-                nombre = producto.nombre
-                errores.append('El stock del producto "' + nombre + '" no puede ser negativo.')
+        if negativo:
+            errores.append('El stock de algún producto no puede ser negativo.')
+        if negativo is None:
+            lineas = self.lineas.all()
+            for linea in lineas:
+                negativo = linea.comprobar_anula_stock_negativo()
+                if negativo:
+                    producto = linea.producto
+                    nombre = producto.nombre
+                    errores.append('El stock del producto "' + nombre + '" no puede ser negativo.')
 
         return len(errores) == 0 and (es_admin or es_vendedor)
 
+    # Devuelve para cada id de reemplazo si anularlo deja algún producto con stock negativo, en una única consulta.
+    @classmethod
+    def get_anulan_stock_negativo(cls, ids):
+        lineas = ReemplazoMercaderiaLinea.objects.filter(reemplazo_id__in=ids)
+        lineas = lineas.annotate(stock_final=F('producto__stock') + F('cantidad_ingreso') - F('cantidad_egreso'))
+        negativos = set(lineas.filter(stock_final__lt=0).order_by().values_list('reemplazo_id', flat=True))
+        return {id: id in negativos for id in ids}
+
     # Devuelve true si ingreso no está anulado.
     def comprobar_anulado(self):
         anulado = self.anulado
@@ -443,15 +578,15 @@ class ReemplazoMercaderia(Auditoria, models.Model):
     # Genera los movimientos de movimientos de stock generados por los reemplazo de mercadería.
     def generar_movimientos(self):
         lineas = self.lineas.all()
-        for linea in lineas:
-            linea.crear_movimiento()
+        movimientos = [linea.get_movimiento_stock() for linea in lineas]
+        aplicar_movimientos(movimientos, validar_stock=False)
 
     # Anula el reemplazo de mercadería generando un movimiento de stock por productos reemplazados.
     def anular(self):
         self.anulado = datetime.datetime.now()
         lineas = self.lineas.all()
-        for linea in lineas:
-            linea.anular()
+        movimientos = [linea.get_movimiento_anulacion() for linea in lineas]
+        aplicar_movimientos(movimientos, validar_stock=False)
 
     def __str__(self):
         return "Reemplazo de mercadería " + self.auditoria_creado_fecha.__str__()
@@ -466,22 +601,27 @@ class ReemplazoMercaderiaLinea(models.Model):
     cantidad_egreso = models.IntegerField()
     reemplazo_completo = models.BooleanField(default=False)
 
-    # Crea un movimiento de stock a partir del producto reemplazado.
-    def crear_movimiento(self):
-        producto = self.producto
-        stock_nuevo = self.stock_nuevo
-
+    # Devuelve el movimiento de stock sin guardar con la diferencia entre lo ingresado y lo egresado del producto.
+    def get_movimiento_stock(self):
         id_texto = self.reemplazo.get_id_texto()
         descripcion = "Reemplazo de mercadería " + id_texto
-        producto.actualizar_stock(nueva=stock_nuevo, descripcion=descripcion, reemplazo_linea=self)
+        cantidad = self.cantidad_ingreso - self.cantidad_egreso
+        return MovimientoStock(producto=self.producto, cantidad=cantidad, descripcion=descripcion, reemplazo_linea=self)
 
-    # Crea un nuevo movimiento de stock negativo y actualiza el stock del producto.
-    def anular(self):
-        anterior = self.stock_anterior
-        producto = self.producto
+    # Devuelve el movimiento de stock sin guardar que revierte el reemplazo del producto.
+    def get_movimiento_anulacion(self):
         id_texto = self.get_id_texto()
-        producto.actualizar_stock(nueva=anterior, reemplazo_linea=self, descripcion="Anulación de Reemplazo de "
-                                                                                    "Mercadería " + id_texto)
+        descripcion = "Anulación de Reemplazo de Mercadería " + id_texto
+        cantidad = self.cantidad_egreso - self.cantidad_ingreso
+        return MovimientoStock(producto=self.producto, cantidad=cantidad, descripcion=descripcion, reemplazo_linea=self)
+
+    # Crea un movimiento de stock a partir del producto reemplazado.
+    def crear_movimiento(self):
+        aplicar_movimientos([self.get_movimiento_stock()], validar_stock=False)
+
+    # Crea un movimiento de stock que revierte el reemplazo y actualiza el stock del producto.
+    def anular(self):
+        aplicar_movimientos([self.get_movimiento_anulacion()], validar_stock=False)
 
     def comprobar_anula_stock_negativo(self):
         """
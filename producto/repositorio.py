@@ -1,5 +1,10 @@
+import datetime
 from django.core.exceptions import ValidationError
-from .models import Producto, Ingreso, IngresoLinea, ReemplazoMercaderia, ReemplazoMercaderiaLinea
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Producto, Ingreso, IngresoLinea, ReemplazoMercaderia, ReemplazoMercaderiaLinea, MovimientoStock, \
+    StockDiario
 
 
 # Busca un producto por id.
@@ -211,3 +216,53 @@ def crear_linea_reemplazo(reemplazo, item):
     )
     linea.save()
     return linea
+
+
+def calcular_stock_fecha(fecha, productos=None):
+    """
+        Calcula el stock de los productos al final del día indicado a partir del saldo del último movimiento de cada
+        uno. Los movimientos sin saldo calculado se suman en la base de datos.
+        @param fecha: date
+        @param productos: QuerySet<Producto>|None
+        @return: dict Stock por id de producto.
+    """
+    if productos is None:
+        productos = Producto.objects.all()
+    fin = datetime.datetime.combine(fecha, datetime.time.max)
+    movimientos = MovimientoStock.objects.filter(producto=OuterRef('pk'), auditoria_creado_fecha__lte=fin)
+    saldo = movimientos.order_by('-id').values('saldo')[:1]
+    suma = movimientos.order_by().values('producto').annotate(total=Sum('cantidad')).values('total')
+    productos = productos.annotate(stock_fecha=Coalesce(Subquery(saldo), Subquery(suma), Value(0)))
+    return dict(productos.values_list('id', 'stock_fecha'))
+
+
+def get_stock_fecha(fecha, id_producto=0):
+    """
+        Devuelve el stock de los productos al final del día indicado. Usa la foto diaria si existe y calcula el resto
+        a partir de los movimientos.
+        @param fecha: date
+        @param id_producto: int Si es mayor a cero solo se devuelve el stock de ese producto.
+        @return: dict Stock por id de producto.
+    """
+    productos = Producto.objects.all()
+    if id_producto > 0:
+        productos = productos.filter(pk=id_producto)
+
+    stocks = dict(StockDiario.objects.filter(producto__in=productos, fecha=fecha).values_list('producto_id', 'stock'))
+    faltantes = productos.exclude(pk__in=stocks.keys())
+    stocks.update(calcular_stock_fecha(fecha, faltantes))
+    return stocks
+
+
+@transaction.atomic
+def generar_stock_diario(fecha):
+    """
+        Genera la foto del stock de todos los productos al final del día indicado, reemplazando la anterior si existía.
+        @param fecha: date
+        @return: int Cantidad de productos guardados.
+    """
+    stocks = calcular_stock_fecha(fecha)
+    StockDiario.objects.filter(fecha=fecha).delete()
+    diarios = [StockDiario(producto_id=id_producto, fecha=fecha, stock=stock) for id_producto, stock in stocks.items()]
+    StockDiario.objects.bulk_create(diarios)
+    return len(diarios)
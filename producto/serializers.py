@@ -1,116 +1,111 @@
+from base.moneda import formatear_moneda
 from base.serializers import CustomModelSerializer, UsuarioSerializer
 from base.signals import get_usuario_logueado
 from .models import Producto, Categoria, Ingreso, IngresoLinea, MovimientoStock, ReemplazoMercaderia, \
     ReemplazoMercaderiaLinea
 from rest_framework import serializers
 
-import locale
-
-locale.setlocale(locale.LC_ALL, '')
-
 
 class ProductoSerializer(CustomModelSerializer):
     operaciones = serializers.SerializerMethodField()
+    # Claves foráneas que lee to_representation, para precargarlas en los listados.
+    relaciones_listado = ['categoria']
 
     class Meta:
         model = Producto
-        fields = '__all__'
+        exclude = ['nombre_busqueda']
 
-    # Método que devuelve los datos del producto
+    # Método que devuelve los datos del producto. La representación de cada producto se calcula una sola vez por
+    # serialización, aunque aparezca en muchas líneas del listado, y se reutiliza mientras no cambie su fecha de
+    # modificación.
     def to_representation(self, instance):
         """Quito password"""
+        if instance.id is None:
+            return self.get_representacion(instance)
+        fragmentos = self.context.setdefault('productos_fragmentos', {})
+        clave = (instance.id, instance.auditoria_modificado_fecha)
+        fragmento = fragmentos.get(clave)
+        if fragmento is None:
+            fragmento = self.get_representacion(instance)
+            fragmentos[clave] = fragmento
+        return fragmento.copy()
+
+    # Devuelve los datos del producto.
+    def get_representacion(self, instance):
         ret = super().to_representation(instance)
         ret['id_texto'] = instance.get_id_texto()
         ret['categoria_texto'] = instance.categoria.nombre
-        ret['precio_texto'] = locale.currency(instance.precio_vigente)
-        ret['costo_texto'] = locale.currency(instance.costo_vigente)
+        ret['precio_texto'] = formatear_moneda(instance.precio_vigente)
+        ret['costo_texto'] = formatear_moneda(instance.costo_vigente)
         ret['margen_texto'] = instance.get_margen_ganancia()
         ret['alertar'] = instance.comprobar_alerta_stock()
         return ret
 
+    # Devuelve el contexto con los datos de las operaciones calculados para todos los productos del listado.
+    @staticmethod
+    def get_contexto_listado(ids):
+        return {
+            'productos_movimientos': Producto.get_tienen_movimientos(ids),
+            'productos_borrables': Producto.get_pueden_borrarse(ids),
+        }
+
     # Devuelve las operaciones disponibles para el producto actual.
     def get_operaciones(self, objeto):
-        operaciones = []
+        acciones = []
 
-        puede_tiene_movimientos = objeto.comprobar_tiene_movimientos()
+        puede_tiene_movimientos = self.get_dato_contexto('productos_movimientos', objeto)
+        if puede_tiene_movimientos is None:
+            puede_tiene_movimientos = objeto.comprobar_tiene_movimientos()
         if puede_tiene_movimientos:
-            accion = 'stock'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-primary text-primary btn',
-                'texto': 'Stock',
-                'icono': 'fas fa-boxes',
-                'title': 'Ver Movimientos de stock del Producto ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-
-        accion = 'editar'
-        operaciones.append({
-            'accion': accion,
-            'clase': 'btn btn-sm btn-success text-success',
-            'texto': 'Editar',
-            'icono': 'fas fa-pencil-alt',
-            'title': 'Editar Producto ' + objeto.get_id_texto(),
-            'key': str(objeto.id) + "-" + accion,
-        })
+            acciones.append('stock')
 
-        puede_borrar = objeto.comprobar_puede_borrarse()
+        acciones.append('editar')
+
+        puede_borrar = self.get_dato_contexto('productos_borrables', objeto)
+        if puede_borrar is None:
+            puede_borrar = objeto.comprobar_puede_borrarse()
         if puede_borrar:
-            accion = 'borrar'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-danger text-danger',
-                'texto': 'Borrar',
-                'icono': 'fas fa-trash-alt',
-                'title': 'Borrar Producto ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-        return operaciones
-
-
-class CategoriaSerializer(serializers.ModelSerializer):
+            acciones.append('borrar')
+        return self.armar_operaciones('producto', acciones, objeto)
+
+
+class CategoriaSerializer(CustomModelSerializer):
     operaciones = serializers.SerializerMethodField()
 
     class Meta:
         model = Categoria
-        fields = '__all__'
+        exclude = ['ruta']
 
     # Método que devuelve los datos de la categoría del producto.
     def to_representation(self, instance):
         """Quito password"""
         ret = super().to_representation(instance)
         ret['id_texto'] = instance.get_id_texto()
+        ret['nivel'] = instance.get_nivel()
         return ret
 
+    # Comprueba que la categoría superior no sea la propia categoría ni una de sus inferiores.
+    def validate_superior(self, superior):
+        if self.instance is not None and not self.instance.comprobar_puede_moverse(superior):
+            raise serializers.ValidationError("La categoría no puede ubicarse debajo de sí misma o de una de sus "
+                                              "inferiores.")
+        return superior
+
     # Devuelve las operaciones disponibles para la categoría actual.
     def get_operaciones(self, objeto):
-        operaciones = []
-
-        accion = 'editar'
-        operaciones.append({
-            'accion': accion,
-            'clase': 'btn btn-sm btn-success text-success',
-            'texto': 'Editar',
-            'icono': 'fas fa-pencil-alt',
-            'title': 'Editar Categoría ' + objeto.get_id_texto(),
-            'key': str(objeto.id) + "-" + accion,
-        })
+        acciones = []
+
+        acciones.append('editar')
 
         puede_borrar = objeto.comprobar_puede_borrarse()
         if puede_borrar:
-            accion = 'borrar'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-danger text-danger',
-                'texto': 'Borrar',
-                'icono': 'fas fa-trash-alt',
-                'title': 'Borrar Categoría ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-        return operaciones
+            acciones.append('borrar')
+        return self.armar_operaciones('categoria', acciones, objeto)
 
 
 class MovimientoSerializer(serializers.ModelSerializer):
+    # Claves foráneas que lee to_representation, para precargarlas en los listados.
+    relaciones_listado = ['auditoria_creador']
     producto = ProductoSerializer(read_only=True)
 
     class Meta:
@@ -139,14 +134,16 @@ class IngresoLineaSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Quito password"""
         ret = super().to_representation(instance)
-        ret['costo_texto'] = locale.currency(instance.costo)
-        ret['total_texto'] = locale.currency(instance.total)
+        ret['costo_texto'] = formatear_moneda(instance.costo)
+        ret['total_texto'] = formatear_moneda(instance.total)
         return ret
 
 
-class IngresoSerializer(serializers.ModelSerializer):
+class IngresoSerializer(CustomModelSerializer):
     lineas = IngresoLineaSerializer(many=True, read_only=True)
     operaciones = serializers.SerializerMethodField()
+    # Claves foráneas que lee to_representation, para precargarlas en los listados.
+    relaciones_listado = ['usuario']
 
     class Meta:
         model = Ingreso
@@ -159,54 +156,42 @@ class IngresoSerializer(serializers.ModelSerializer):
         ret['usuario_email'] = instance.usuario.email
         ret['usuario_nombre'] = instance.usuario.first_name
         ret['fecha_texto'] = instance.fecha.strftime('%d/%m/%Y %H:%M')
-        ret['total_texto'] = locale.currency(instance.total)
+        ret['total_texto'] = formatear_moneda(instance.total)
         ret['estado_texto'] = instance.get_estado_legible()
         ret['estado_clase'] = instance.get_estado_clase()
         ret['fecha_anulado'] = instance.get_fecha_anulado_texto()
         ret['anulado'] = instance.comprobar_anulado()
         return ret
 
+    # Devuelve el contexto con los datos de las operaciones calculados para los ingresos del listado y sus productos.
+    @staticmethod
+    def get_contexto_listado(ids):
+        productos = list(IngresoLinea.objects.filter(ingreso_id__in=ids).values_list('producto_id', flat=True).distinct())
+        contexto = ProductoSerializer.get_contexto_listado(productos)
+        contexto['ingresos_movimientos'] = Ingreso.get_tienen_movimientos(ids)
+        contexto['ingresos_negativos'] = Ingreso.get_anulan_stock_negativo(ids)
+        return contexto
+
     # Devuelve las operaciones disponibles para el ingreso actual.
     def get_operaciones(self, objeto):
         logueado = get_usuario_logueado()
-        operaciones = []
+        acciones = []
 
-        puede_tiene_movimientos = objeto.comprobar_tiene_movimientos()
+        puede_tiene_movimientos = self.get_dato_contexto('ingresos_movimientos', objeto)
+        if puede_tiene_movimientos is None:
+            puede_tiene_movimientos = objeto.comprobar_tiene_movimientos()
         if puede_tiene_movimientos:
-            accion = 'stock'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-primary text-primary btn',
-                'texto': 'Stock',
-                'icono': 'fas fa-boxes',
-                'title': 'Ver Movimientos de stock del Ingreso ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
+            acciones.append('stock')
 
         puede_visualizar = objeto.comprobar_puede_visualizar(logueado)
         if puede_visualizar:
-            accion = 'visualizar'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-info text-info',
-                'texto': 'Ver',
-                'icono': 'fa fa-eye',
-                'title': 'Ver Ingreso ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-
-        puede_anular = objeto.comprobar_puede_anular(logueado)
+            acciones.append('visualizar')
+
+        negativo = self.get_dato_contexto('ingresos_negativos', objeto)
+        puede_anular = objeto.comprobar_puede_anular(logueado, negativo)
         if puede_anular:
-            accion = 'anular'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-danger text-danger',
-                'texto': 'Anular',
-                'icono': 'fa fa-window-close',
-                'title': 'Anular Ingreso ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-        return operaciones
+            acciones.append('anular')
+        return self.armar_operaciones('ingreso', acciones, objeto)
 
 
 class ReemplazoMercaderiaLineaSerializer(serializers.ModelSerializer):
@@ -218,9 +203,11 @@ class ReemplazoMercaderiaLineaSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ReemplazoMercaderiaSerializer(serializers.ModelSerializer):
+class ReemplazoMercaderiaSerializer(CustomModelSerializer):
     lineas = ReemplazoMercaderiaLineaSerializer(many=True, read_only=True)
     operaciones = serializers.SerializerMethodField()
+    # Claves foráneas que lee to_representation, para precargarlas en los listados.
+    relaciones_listado = ['usuario']
 
     class Meta:
         model = ReemplazoMercaderia
@@ -239,32 +226,26 @@ class ReemplazoMercaderiaSerializer(serializers.ModelSerializer):
         ret['anulado'] = instance.comprobar_anulado()
         return ret
 
+    # Devuelve el contexto con los datos de las operaciones calculados para los reemplazos del listado y sus productos.
+    @staticmethod
+    def get_contexto_listado(ids):
+        lineas = ReemplazoMercaderiaLinea.objects.filter(reemplazo_id__in=ids)
+        productos = list(lineas.values_list('producto_id', flat=True).distinct())
+        contexto = ProductoSerializer.get_contexto_listado(productos)
+        contexto['reemplazos_negativos'] = ReemplazoMercaderia.get_anulan_stock_negativo(ids)
+        return contexto
+
     # Devuelve las operaciones disponibles para el reemplazo de mercadería actual.
     def get_operaciones(self, objeto):
         logueado = get_usuario_logueado()
-        operaciones = []
+        acciones = []
 
         puede_visualizar = objeto.comprobar_puede_visualizar(logueado)
         if puede_visualizar:
-            accion = 'visualizar'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-info text-info',
-                'texto': 'Ver',
-                'icono': 'fa fa-eye',
-                'title': 'Ver Reemplazo ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-
-        puede_anular = objeto.comprobar_puede_anular(logueado)
+            acciones.append('visualizar')
+
+        negativo = self.get_dato_contexto('reemplazos_negativos', objeto)
+        puede_anular = objeto.comprobar_puede_anular(logueado, negativo)
         if puede_anular:
-            accion = 'anular'
-            operaciones.append({
-                'accion': accion,
-                'clase': 'btn btn-sm btn-danger text-danger',
-                'texto': 'Anular',
-                'icono': 'fa fa-window-close',
-                'title': 'Anular Reemplazo ' + objeto.get_id_texto(),
-                'key': str(objeto.id) + "-" + accion,
-            })
-        return operaciones
+            acciones.append('anular')
+        return self.armar_operaciones('reemplazo', acciones, objeto)
@@ -0,0 +1,149 @@
+from base.signals import get_usuario_logueado, agregar_auditoria_creado
+from base.totales import invalidar_totales
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, When
+from functools import reduce
+from producto.catalogo import invalidar_catalogo
+import datetime
+import operator
+
+
+def aplicar_movimientos(movimientos, validar_stock=True):
+    """
+        Aplica los movimientos de stock sin leer el stock previamente: un único UPDATE suma la diferencia de cada
+        producto (stock = stock + CASE id WHEN ... END) solo si el producto tiene stock suficiente para los descuentos,
+        condición que se comprueba en el WHERE de la misma sentencia. Si la cantidad de filas actualizadas no coincide
+        con la de productos se deshacen los cambios y no se aplica ningún movimiento. Luego se leen los stocks
+        resultantes y se insertan todos los movimientos en un solo INSERT con el saldo resultante.
+        @param movimientos: List<MovimientoStock> Movimientos sin guardar.
+        @param validar_stock: bool Si es false el stock puede quedar negativo.
+        @return: List<MovimientoStock>
+    """
+    Producto = apps.get_model('producto', 'Producto')
+    MovimientoStock = apps.get_model('producto', 'MovimientoStock')
+
+    movimientos = [movimiento for movimiento in movimientos if movimiento.cantidad != 0]
+    if len(movimientos) == 0:
+        return movimientos
+
+    # Agrupo las cantidades por producto.
+    diferencias = {}
+    for movimiento in movimientos:
+        id_producto = movimiento.producto_id
+        diferencias[id_producto] = diferencias.get(id_producto, 0) + movimiento.cantidad
+
+    # Cada producto se actualiza solo si le alcanza el stock para lo que se descuenta.
+    condiciones = []
+    for id_producto, diferencia in diferencias.items():
+        if validar_stock and diferencia < 0:
+            condiciones.append(Q(pk=id_producto, stock__gte=-diferencia))
+        else:
+            condiciones.append(Q(pk=id_producto))
+
+    with transaction.atomic():
+        casos = [When(pk=id_producto, then=F('stock') + diferencia) for id_producto, diferencia in diferencias.items()]
+        stock = Case(*casos, default=F('stock'), output_field=IntegerField())
+        # También se actualiza la fecha de modificación para que el cambio de stock llegue a los clientes que sincronizan.
+        modificado = datetime.datetime.now()
+        actualizados = Producto.objects.filter(reduce(operator.or_, condiciones)).update(stock=stock,
+                                                                                         auditoria_modificado_fecha=modificado)
+        completo = actualizados == len(diferencias)
+        if not completo:
+            # Deshago los productos que sí se actualizaron, el error se informa al salir del bloque.
+            transaction.set_rollback(True)
+        else:
+            aplicados = guardar_movimientos(movimientos, diferencias)
+    if not completo:
+        raise ValidationError(get_error_stock(diferencias, validar_stock))
+
+    # Mantengo actualizado el stock de los productos ya cargados en memoria.
+    actualizados = set()
+    for movimiento in aplicados:
+        if not MovimientoStock.producto.is_cached(movimiento):
+            continue
+        producto = movimiento.producto
+        if id(producto) not in actualizados:
+            producto.stock += diferencias[producto.id]
+            producto.auditoria_modificado_fecha = modificado
+            actualizados.add(id(producto))
+    return aplicados
+
+
+def guardar_movimientos(movimientos, diferencias):
+    """
+        Inserta los movimientos con el saldo de cada uno, calculado hacia atrás desde el stock final de los productos,
+        que ya tienen aplicadas las diferencias. Debe llamarse dentro de la transacción que actualizó el stock.
+        @param movimientos: List<MovimientoStock>
+        @param diferencias: dict Cantidad aplicada a cada producto.
+        @return: List<MovimientoStock>
+    """
+    Producto = apps.get_model('producto', 'Producto')
+    MovimientoStock = apps.get_model('producto', 'MovimientoStock')
+
+    saldos = dict(Producto.objects.filter(pk__in=diferencias.keys()).values_list('id', 'stock'))
+
+    # El catálogo muestra el stock de cada producto pero no se invalida por cada venta: el stock mostrado se
+    # actualiza al vencer las respuestas guardadas. Solo se invalida si algún producto se agota o vuelve a tener.
+    if comprobar_cambia_disponibilidad(diferencias, saldos):
+        invalidar_catalogo()
+
+    logueado = get_usuario_logueado()
+    for movimiento in reversed(movimientos):
+        id_producto = movimiento.producto_id
+        movimiento.saldo = saldos[id_producto]
+        saldos[id_producto] -= movimiento.cantidad
+        agregar_auditoria_creado(movimiento, logueado)
+    MovimientoStock.objects.bulk_create(movimientos)
+    invalidar_totales(MovimientoStock)
+    return movimientos
+
+
+def get_error_stock(diferencias, validar_stock):
+    """
+        Devuelve el motivo por el que no se pudieron aplicar las diferencias: un producto inexistente o uno sin stock
+        suficiente para el descuento.
+        @param diferencias: dict Cantidad aplicada a cada producto.
+        @param validar_stock: bool
+        @return: str
+    """
+    Producto = apps.get_model('producto', 'Producto')
+    productos = Producto.objects.in_bulk(diferencias.keys())
+    for id_producto, diferencia in diferencias.items():
+        producto = productos.get(id_producto)
+        if producto is None:
+            return "No se ha encontrado el producto."
+        if validar_stock and diferencia < 0 and producto.stock + diferencia < 0:
+            return "No hay suficiente stock del producto '" + producto.nombre + "'."
+    return "No se ha podido actualizar el stock."
+
+
+def comprobar_cambia_disponibilidad(diferencias, saldos):
+    """
+        Devuelve true si algún producto pasó de tener stock a no tener o al revés.
+        @param diferencias: dict Cantidad aplicada a cada producto.
+        @param saldos: dict Stock resultante de cada producto.
+        @return: bool
+    """
+    for id_producto, diferencia in diferencias.items():
+        saldo = saldos[id_producto]
+        if (saldo > 0) != (saldo - diferencia > 0):
+            return True
+    return False
+
+
+def aplicar_movimiento(producto, cantidad, descripcion, validar_stock=True, **relaciones):
+    """
+        Aplica un único movimiento de stock al producto.
+        @param producto: Producto
+        @param cantidad: int Positiva para ingresos y negativa para egresos.
+        @param descripcion: str
+        @param validar_stock: bool
+        @param relaciones: Línea de venta, ingreso o reemplazo que originó el movimiento.
+        @return: MovimientoStock
+    """
+    MovimientoStock = apps.get_model('producto', 'MovimientoStock')
+    movimiento = MovimientoStock(producto=producto, cantidad=cantidad, descripcion=descripcion, **relaciones)
+    aplicar_movimientos([movimiento], validar_stock)
+    return movimiento
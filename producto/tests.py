@@ -0,0 +1,506 @@
+from base.models import Eliminacion, Usuario
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from gastronomia.models import Venta
+from producto import catalogo, menu
+from producto.management.commands.conciliar_stock import Command
+from producto.models import Categoria, Ingreso, IngresoLinea, MovimientoStock, Producto, ReemplazoMercaderia, \
+    ReemplazoMercaderiaLinea, StockDiario
+from producto.repositorio import get_stock_fecha
+from producto.stock import aplicar_movimiento, aplicar_movimientos
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from unittest import mock
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+
+class StockTest(TestCase):
+    """
+        Comprueba que el stock se modifique solo sumando diferencias, de forma que los movimientos aplicados por otros
+        requests entre la lectura del producto y su guardado no se pierdan.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.get(email='root@gmail.com')
+        categoria = Categoria.objects.first()
+        self.producto = Producto.objects.create(categoria=categoria, nombre="Prueba de stock", costo_vigente=10,
+                                                precio_vigente=20)
+        aplicar_movimiento(self.producto, 10, "Stock inicial")
+
+    # Aplica un movimiento desde otra instancia del producto, como lo haría una venta en otro request.
+    def descontar_en_paralelo(self, cantidad):
+        otro = Producto.objects.get(pk=self.producto.pk)
+        aplicar_movimiento(otro, -cantidad, "Venta en paralelo")
+
+    def get_stock(self):
+        return Producto.objects.values_list('stock', flat=True).get(pk=self.producto.pk)
+
+    def comprobar_saldo(self, esperado):
+        self.assertEqual(self.get_stock(), esperado)
+        ultimo = self.producto.movimientos.order_by('-id').first()
+        self.assertEqual(ultimo.saldo, esperado)
+
+    def test_descuento_sobrevive_cambio_precio_y_costo(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        self.descontar_en_paralelo(3)
+        producto.agregar_precio(nuevo=30)
+        producto.agregar_costo(nuevo=15)
+        producto.descripcion = "Editado"
+        producto.save()
+        self.comprobar_saldo(7)
+        self.assertEqual(Producto.objects.get(pk=self.producto.pk).precio_vigente, 30)
+
+    def test_descuento_sobrevive_edicion_stock(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        self.descontar_en_paralelo(3)
+        producto.actualizar_stock(nueva=15)
+        self.comprobar_saldo(12)
+
+    def test_descuento_sobrevive_anulacion_venta(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        venta = Venta(usuario=self.usuario, tipo=Venta.ALMACEN)
+        venta.crear_lineas([(producto, 2)])
+        venta.crear_movimientos()
+        self.comprobar_saldo(8)
+
+        # La línea se lee con el producto antes de que otro request descuente stock.
+        linea = venta.lineas.select_related('producto').get()
+        self.descontar_en_paralelo(3)
+        linea.anular()
+        # La anulación de una venta descuenta la cantidad de sus líneas.
+        self.comprobar_saldo(3)
+
+    def test_descuento_sobrevive_reemplazo(self):
+        reemplazo = ReemplazoMercaderia.objects.create(usuario=self.usuario)
+        ReemplazoMercaderiaLinea.objects.create(reemplazo=reemplazo, producto=self.producto, stock_anterior=10,
+                                                stock_nuevo=12, cantidad_ingreso=4, cantidad_egreso=2)
+        self.descontar_en_paralelo(3)
+        reemplazo.generar_movimientos()
+        self.comprobar_saldo(9)
+
+        self.descontar_en_paralelo(1)
+        reemplazo.anular()
+        self.comprobar_saldo(6)
+
+    def test_stock_insuficiente_no_aplica_ningun_movimiento(self):
+        otro = Producto.objects.create(categoria=self.producto.categoria, nombre="Prueba de stock 2", costo_vigente=10,
+                                       precio_vigente=20)
+        aplicar_movimiento(otro, 5, "Stock inicial")
+        movimientos = [
+            MovimientoStock(producto=self.producto, cantidad=-2, descripcion="Venta"),
+            MovimientoStock(producto=otro, cantidad=-6, descripcion="Venta"),
+        ]
+        with self.assertRaises(ValidationError):
+            aplicar_movimientos(movimientos)
+        self.assertEqual(self.get_stock(), 10)
+        self.assertEqual(Producto.objects.get(pk=otro.pk).stock, 5)
+
+    def test_descuento_sin_stock_por_venta_en_paralelo(self):
+        # El producto se leyó con stock 10, pero otro request ya vendió casi todo.
+        producto = Producto.objects.get(pk=self.producto.pk)
+        self.descontar_en_paralelo(9)
+        with CaptureQueriesContext(connection) as consultas:
+            with self.assertRaises(ValidationError):
+                aplicar_movimiento(producto, -5, "Venta")
+        self.comprobar_saldo(1)
+        # La condición de stock está en el WHERE del UPDATE y no en una lectura posterior.
+        actualizacion = [consulta['sql'] for consulta in consultas.captured_queries if consulta['sql'].startswith('UPDATE')]
+        self.assertEqual(len(actualizacion), 1)
+        self.assertIn(connection.ops.quote_name('stock') + ' >= ', actualizacion[0].split('WHERE')[1])
+
+    def test_saldo_de_cada_movimiento(self):
+        movimientos = [
+            MovimientoStock(producto=self.producto, cantidad=-2, descripcion="Venta"),
+            MovimientoStock(producto=self.producto, cantidad=5, descripcion="Ingreso"),
+            MovimientoStock(producto=self.producto, cantidad=-1, descripcion="Venta"),
+        ]
+        aplicar_movimientos(movimientos)
+        saldos = list(self.producto.movimientos.order_by('id').values_list('saldo', flat=True))
+        self.assertEqual(saldos, [10, 8, 13, 12])
+        self.assertEqual(self.get_stock(), 12)
+
+    def test_anulacion_ingreso_sin_stock_no_anula_ninguna_linea(self):
+        otro = Producto.objects.create(categoria=self.producto.categoria, nombre="Prueba de stock 2", costo_vigente=10,
+                                       precio_vigente=20)
+        ingreso = Ingreso.objects.create(usuario=self.usuario)
+        IngresoLinea.objects.create(ingreso=ingreso, producto=self.producto, cantidad=4, costo=10)
+        IngresoLinea.objects.create(ingreso=ingreso, producto=otro, cantidad=4, costo=10)
+        ingreso.crear_movimientos()
+
+        # Después del ingreso se vende parte del segundo producto, por lo que el ingreso ya no puede anularse.
+        aplicar_movimiento(Producto.objects.get(pk=otro.pk), -3, "Venta")
+        with self.assertRaises(ValidationError):
+            Ingreso.objects.get(pk=ingreso.pk).anular()
+        self.assertEqual(self.get_stock(), 14)
+        self.assertEqual(Producto.objects.get(pk=otro.pk).stock, 1)
+
+    def test_catalogo_se_invalida_solo_si_cambia_disponibilidad(self):
+        version = catalogo.get_version_catalogo()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.descontar_en_paralelo(4)
+        self.assertEqual(catalogo.get_version_catalogo(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.descontar_en_paralelo(6)
+        self.assertNotEqual(catalogo.get_version_catalogo(), version)
+
+
+class CategoriaRutaTest(TestCase):
+    """
+        Comprueba que al mover una categoría se actualice la ruta de todo su subárbol y que no pueda ubicarse debajo de
+        sí misma.
+    """
+
+    def crear(self, nombre, superior=None):
+        return Categoria.objects.create(nombre=nombre, superior=superior)
+
+    def get_ruta(self, categoria):
+        return Categoria.objects.values_list('ruta', flat=True).get(pk=categoria.pk)
+
+    def test_mover_actualiza_subarbol(self):
+        origen = self.crear("Origen")
+        destino = self.crear("Destino")
+        rama = self.crear("Rama", origen)
+        hoja = self.crear("Hoja", rama)
+        producto = Producto.objects.create(categoria=hoja, nombre="Prueba de ruta", costo_vigente=10, precio_vigente=20)
+
+        rama = Categoria.objects.get(pk=rama.pk)
+        rama.superior = Categoria.objects.get(pk=destino.pk)
+        rama.save()
+
+        self.assertEqual(self.get_ruta(rama), destino.ruta + str(rama.id).zfill(5) + "/")
+        self.assertEqual(self.get_ruta(hoja), self.get_ruta(rama) + str(hoja.id).zfill(5) + "/")
+        self.assertEqual(list(Categoria.get_subarbol(destino.ruta).order_by('id')), [destino, rama, hoja])
+        self.assertEqual(list(Categoria.get_subarbol(origen.ruta)), [origen])
+        filtros = Categoria.get_filtros_subarbol(destino.ruta, "categoria__")
+        self.assertEqual(list(Producto.objects.filter(**filtros)), [producto])
+
+    def test_no_puede_moverse_debajo_de_inferior(self):
+        rama = self.crear("Rama")
+        hoja = self.crear("Hoja", rama)
+        rama.superior = Categoria.objects.get(pk=hoja.pk)
+        with self.assertRaises(ValidationError):
+            rama.save()
+        self.assertEqual(self.get_ruta(rama), str(rama.id).zfill(5) + "/")
+
+
+class CambiosCatalogoTest(TestCase):
+    """
+        Comprueba que la sincronización por fecha devuelva los productos modificados y los ids de los borrados de la
+        base de datos después de la fecha pedida.
+    """
+
+    def setUp(self):
+        usuario = Usuario.objects.get(email='root@gmail.com')
+        token, creado = Token.objects.get_or_create(user=usuario)
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.categoria = Categoria.objects.create(nombre="Prueba de cambios")
+        self.producto = Producto.objects.create(categoria=self.categoria, nombre="Prueba de cambios", costo_vigente=10,
+                                                precio_vigente=20)
+
+    def get_cambios(self, desde=None):
+        url = '/api/producto/cambios/' + ('?desde=' + desde if desde is not None else '')
+        respuesta = self.cliente.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.json()['exito'])
+        return respuesta.json()['datos']
+
+    @override_settings(SINCRONIZACION_MARGEN_SEGUNDOS=60)
+    def test_devuelve_modificados_y_borrados(self):
+        # Borrado anterior a la sincronización, que no debe volver a enviarse.
+        anterior = Producto.objects.create(categoria=self.categoria, nombre="Prueba de cambios 2", costo_vigente=10,
+                                           precio_vigente=20)
+        anterior.delete()
+        Eliminacion.objects.update(fecha=datetime.datetime.now() - datetime.timedelta(hours=1))
+        Producto.objects.update(auditoria_modificado_fecha=datetime.datetime.now() - datetime.timedelta(hours=1))
+        Categoria.objects.update(auditoria_modificado_fecha=datetime.datetime.now() - datetime.timedelta(hours=1))
+
+        completo = self.get_cambios()
+        self.assertIn(self.producto.id, [producto['id'] for producto in completo['productos']])
+        datos = self.get_cambios(completo['hasta'])
+        self.assertEqual(datos['productos'], [])
+        self.assertEqual(datos['eliminados'], {'productos': [], 'categorias': []})
+
+        self.producto.descripcion = "Editado"
+        self.producto.save()
+        borrado = Categoria.objects.create(nombre="Prueba de cambios 3")
+        id_borrado = borrado.id
+        borrado.delete()
+        datos = self.get_cambios(datos['hasta'])
+        self.assertEqual([producto['id'] for producto in datos['productos']], [self.producto.id])
+        self.assertEqual(datos['eliminados'], {'productos': [], 'categorias': [id_borrado]})
+
+        id_borrado = self.producto.id
+        self.producto.delete()
+        datos = self.get_cambios(datos['hasta'])
+        self.assertEqual(datos['eliminados']['productos'], [id_borrado])
+
+    def test_fecha_invalida(self):
+        respuesta = self.cliente.get('/api/producto/cambios/?desde=ayer')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class CatalogoCacheTest(TestCase):
+    """
+        Comprueba que las respuestas guardadas del catálogo se descarten cuando otro proceso cambia la versión en la
+        caché compartida.
+    """
+
+    def setUp(self):
+        self.cliente = APIClient()
+        self.categoria = Categoria.objects.create(nombre="Prueba de catálogo")
+        # Descarta las respuestas guardadas por otras pruebas, cuyos datos se deshicieron al terminar.
+        catalogo.incrementar_version_catalogo()
+
+    def get_nombres(self):
+        respuesta = self.cliente.get('/api/producto/categorias//')
+        self.assertEqual(respuesta.status_code, 200)
+        return [categoria['nombre'] for categoria in respuesta.json()['datos']['categorias']]
+
+    def test_cambio_de_version_en_otro_proceso(self):
+        self.assertIn("Prueba de catálogo", self.get_nombres())
+        # Un cambio sin señales no invalida la respuesta guardada.
+        Categoria.objects.filter(pk=self.categoria.pk).update(nombre="Prueba renombrada")
+        self.assertIn("Prueba de catálogo", self.get_nombres())
+
+        # Otro proceso invalida el catálogo: solo cambia la versión guardada en la caché compartida.
+        catalogo.get_cache_catalogo().set(catalogo.CLAVE_VERSION, "otro proceso", None)
+        self.assertIn("Prueba renombrada", self.get_nombres())
+
+    def test_etag_cambia_con_los_datos(self):
+        respuesta = self.cliente.get('/api/producto/categorias//')
+        etag = respuesta['ETag']
+        respuesta = self.cliente.get('/api/producto/categorias//', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria.nombre = "Prueba renombrada"
+            self.categoria.save()
+        respuesta = self.cliente.get('/api/producto/categorias//', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+
+class ConciliarStockTest(TestCase):
+    """
+        Comprueba que la conciliación cree el movimiento que iguala la suma de movimientos al stock, calculado con los
+        datos vigentes al corregir y no con los del reporte.
+    """
+
+    def setUp(self):
+        categoria = Categoria.objects.first()
+        self.producto = Producto.objects.create(categoria=categoria, nombre="Prueba de conciliación", costo_vigente=10,
+                                                precio_vigente=20)
+        aplicar_movimiento(self.producto, 10, "Stock inicial")
+        # El stock se modificó sin movimiento.
+        Producto.objects.filter(pk=self.producto.pk).update(stock=13)
+
+    def get_suma(self):
+        return sum(self.producto.movimientos.values_list('cantidad', flat=True))
+
+    def conciliar(self, *args):
+        salida = io.StringIO()
+        call_command('conciliar_stock', *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_reporta_sin_corregir(self):
+        salida = self.conciliar()
+        self.assertIn("Prueba de conciliación (" + str(self.producto.id) + "): stock 13, movimientos 10", salida)
+        self.assertEqual(self.get_suma(), 10)
+
+    def test_corrige_diferencia(self):
+        self.conciliar('--corregir', '--usuario', 'root@gmail.com')
+        self.assertEqual(self.get_suma(), 13)
+        ultimo = self.producto.movimientos.order_by('-id').first()
+        self.assertEqual((ultimo.cantidad, ultimo.saldo), (3, 13))
+        self.assertNotIn("Prueba de conciliación", self.conciliar())
+
+    def test_no_corrige_dos_veces(self):
+        # Otra conciliación corrige el producto entre el reporte y la corrección.
+        original = Command.get_diferencias
+
+        def get_diferencias(comando):
+            diferencias = original(comando)
+            MovimientoStock.objects.create(producto=self.producto, cantidad=3, saldo=13, descripcion="Otra conciliación")
+            return diferencias
+
+        with mock.patch.object(Command, 'get_diferencias', get_diferencias):
+            self.conciliar('--corregir', '--usuario', 'root@gmail.com')
+        self.assertEqual(self.get_suma(), 13)
+        self.assertFalse(self.producto.movimientos.filter(descripcion="Conciliación de stock").exists())
+
+    def test_corregir_sin_usuario(self):
+        with self.assertRaises(CommandError):
+            self.conciliar('--corregir')
+
+
+class StockDiarioTest(TestCase):
+    """
+        Comprueba que la foto diaria del stock más los movimientos posteriores devuelvan el stock a una fecha pasada.
+    """
+
+    def setUp(self):
+        usuario = Usuario.objects.get(email='root@gmail.com')
+        self.producto = Producto.objects.create(categoria=Categoria.objects.first(), nombre="Prueba de stock diario",
+                                                costo_vigente=10, precio_vigente=20)
+        hoy = datetime.date.today()
+        self.ayer = hoy - datetime.timedelta(days=1)
+        self.anteayer = hoy - datetime.timedelta(days=2)
+        self.mover(10, self.anteayer)
+        self.mover(-3, self.ayer)
+        token, creado = Token.objects.get_or_create(user=usuario)
+        self.cliente = APIClient()
+        self.cliente.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def mover(self, cantidad, fecha):
+        aplicar_movimiento(self.producto, cantidad, "Prueba")
+        movimiento = self.producto.movimientos.order_by('-id').first()
+        fecha_hora = datetime.datetime.combine(fecha, datetime.time(12))
+        MovimientoStock.objects.filter(pk=movimiento.pk).update(auditoria_creado_fecha=fecha_hora)
+
+    def get_stock_api(self, fecha):
+        respuesta = self.cliente.get('/api/producto/movimientos//stock_fecha/',
+                                     {'fecha': fecha, 'producto': self.producto.id})
+        self.assertEqual(respuesta.status_code, 200)
+        return [producto['stock'] for producto in respuesta.json()['datos']['productos']]
+
+    def test_foto_mas_movimientos_posteriores(self):
+        call_command('generar_stock_diario', '--desde', self.anteayer.isoformat(), '--hasta', self.ayer.isoformat(),
+                     stdout=io.StringIO())
+        fotos = dict(StockDiario.objects.filter(producto=self.producto).values_list('fecha', 'stock'))
+        self.assertEqual(fotos, {self.anteayer: 10, self.ayer: 7})
+
+        # Los movimientos de hoy no cambian el stock de las fechas pasadas.
+        self.mover(5, datetime.date.today())
+        self.assertEqual(Producto.objects.get(pk=self.producto.pk).stock, 12)
+        self.assertEqual(get_stock_fecha(self.anteayer, self.producto.id), {self.producto.id: 10})
+        self.assertEqual(self.get_stock_api(self.ayer.isoformat()), [7])
+        self.assertEqual(self.get_stock_api(datetime.date.today().isoformat()), [12])
+
+    def test_sin_foto_calcula_con_movimientos(self):
+        self.assertFalse(StockDiario.objects.filter(producto=self.producto).exists())
+        self.assertEqual(self.get_stock_api(self.anteayer.isoformat()), [10])
+        self.assertEqual(self.get_stock_api(self.ayer.isoformat()), [7])
+
+    def test_fecha_invalida(self):
+        respuesta = self.cliente.get('/api/producto/movimientos//stock_fecha/', {'fecha': "31/12/2020"})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(respuesta.json()['exito'])
+        respuesta = self.cliente.get('/api/producto/movimientos//stock_fecha/')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_comando_fecha_invalida(self):
+        with self.assertRaises(CommandError):
+            call_command('generar_stock_diario', '--desde', "31/12/2020", stdout=io.StringIO())
+
+
+class MenuTest(TestCase):
+    """
+        Comprueba que el listado sin filtros redirija a la instantánea estática del menú, que se use la vista en vivo
+        mientras no hay instantánea y que los cambios del catálogo generen una nueva.
+    """
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp(prefix='menu_pruebas_')
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        middleware = list(settings.MIDDLEWARE)
+        if 'producto.middleware.MenuWhiteNoiseMiddleware' not in middleware:
+            middleware.insert(1, 'producto.middleware.MenuWhiteNoiseMiddleware')
+        configuracion = override_settings(STATIC_ROOT=self.directorio, MIDDLEWARE=middleware, DEBUG=False)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        # El nombre de la instantánea vigente se guarda por proceso.
+        menu._MENU.update(nombre=None, marca=None)
+        catalogo.incrementar_version_catalogo()
+        # El cliente arma el middleware con la configuración de la prueba en el primer request.
+        self.cliente = Client()
+        self.producto = Producto.objects.create(categoria=Categoria.objects.first(), nombre="Prueba de menú",
+                                                costo_vigente=10, precio_vigente=20)
+
+    def get_contenido(self, respuesta):
+        return json.loads(b''.join(respuesta.streaming_content))
+
+    def get_precio(self, datos):
+        return [producto['precio_vigente'] for producto in datos['productos'] if producto['id'] == self.producto.id]
+
+    def envejecer_menu(self, segundos):
+        ruta = os.path.join(self.directorio, menu.MENU_ACTUAL)
+        fecha = time.time() - segundos
+        os.utime(ruta, (fecha, fecha))
+
+    def test_redirige_a_la_instantanea(self):
+        nombre = menu.generar_menu()
+        respuesta = self.cliente.get('/api/producto/')
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(respuesta['Location'], settings.STATIC_URL + nombre)
+
+        # La instantánea se creó después de iniciar el middleware y se sirve como inmutable.
+        estatico = self.cliente.get(respuesta['Location'])
+        self.assertEqual(estatico.status_code, 200)
+        self.assertIn('immutable', estatico['Cache-Control'])
+        instantanea = self.get_contenido(estatico)['datos']
+        self.assertGreater(len(instantanea['categorias']), 0)
+
+        # Con parámetros se usa la vista en vivo, que devuelve los mismos productos.
+        en_vivo = self.cliente.get('/api/producto/', {'nombre': ""}).json()['datos']
+        instantanea.pop('categorias')
+        self.assertEqual(instantanea, en_vivo)
+
+    def test_sin_instantanea_usa_la_vista_en_vivo(self):
+        with mock.patch('producto.menu.generar_menu_en_segundo_plano') as generar:
+            respuesta = self.cliente.get('/api/producto/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.get_precio(respuesta.json()['datos']), [20])
+        generar.assert_called_once()
+
+        # Si el archivo de la instantánea vigente ya no existe también se usa la vista en vivo.
+        nombre = menu.generar_menu()
+        os.remove(os.path.join(self.directorio, nombre))
+        menu._MENU.update(nombre=None, marca=None)
+        with mock.patch('producto.menu.generar_menu_en_segundo_plano'):
+            respuesta = self.cliente.get('/api/producto/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.cliente.get(settings.STATIC_URL + nombre).status_code, 404)
+
+    def test_regenera_tras_cambio_del_catalogo(self):
+        anterior = menu.generar_menu()
+        self.envejecer_menu(10)
+        self.assertTrue(menu.comprobar_menu_vigente())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.precio_vigente = 25
+            self.producto.save()
+        self.assertFalse(menu.comprobar_menu_vigente())
+
+        # Mientras se genera la nueva se sigue sirviendo la anterior.
+        with mock.patch('producto.menu.generar_menu_en_segundo_plano') as generar:
+            respuesta = self.cliente.get('/api/producto/')
+        self.assertEqual(respuesta['Location'], settings.STATIC_URL + anterior)
+        generar.assert_called_once()
+
+        nuevo = menu.generar_menu()
+        self.assertNotEqual(nuevo, anterior)
+        self.assertTrue(menu.comprobar_menu_vigente())
+        respuesta = self.cliente.get('/api/producto/')
+        self.assertEqual(respuesta['Location'], settings.STATIC_URL + nuevo)
+        self.assertEqual(self.get_precio(self.get_contenido(self.cliente.get(respuesta['Location']))['datos']), [25])
+        # La anterior se conserva para los clientes que la estaban descargando.
+        self.assertEqual(self.cliente.get(settings.STATIC_URL + anterior).status_code, 200)
+
+    @override_settings(MENU_SEGUNDOS=60)
+    def test_vence_sin_cambios(self):
+        menu.generar_menu()
+        self.assertTrue(menu.comprobar_menu_vigente())
+        self.envejecer_menu(61)
+        self.assertFalse(menu.comprobar_menu_vigente())
@@ -1,22 +1,35 @@
 from base import respuestas
 from base import utils
+from base.busqueda import buscar, get_relevancia
+from base.models import Eliminacion, Usuario
+from base.operaciones import comprobar_operaciones_compactas
+from base.paginacion import PaginacionCursorMixin, get_pagina
+from base.serializers import precargar_listado
+from base.totales import get_total
 from base.permisos import TieneRolAdmin
+from base.token import CacheTokenAuthentication
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.db.models import F
+from django.shortcuts import redirect
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from gastronomia.repositorio import get_pedido
 from gastronomia.models import Estado
 from rest_framework import mixins
 from rest_framework import viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
+from .catalogo import get_respuesta_catalogo
+from .menu import get_url_menu
 from .models import Producto, Categoria, Ingreso, MovimientoStock, ReemplazoMercaderia
 from .repositorio import validar_crear_ingreso, crear_ingreso, get_ingreso, validar_crear_reemplazo_mercaderia, \
-    crear_reemplazo_mercaderia, get_reemplazo, get_errores_crear_producto, get_producto
+    crear_reemplazo_mercaderia, get_reemplazo, get_errores_crear_producto, get_producto, get_stock_fecha
 from .serializers import ProductoSerializer, CategoriaSerializer, IngresoSerializer, MovimientoSerializer, \
     ReemplazoMercaderiaSerializer
+import datetime
 
 respuesta = respuestas.Respuesta()
 
@@ -27,20 +40,26 @@ class CategoriaViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.Re
     serializer_class = CategoriaSerializer
 
     def list(self, request, *args, **kwargs):
-        buscadas = Categoria.objects.filter(borrado=False).order_by('nombre')
-        serializer = CategoriaSerializer(instance=buscadas, many=True)
+        return get_respuesta_catalogo(request, 'categorias', lambda: self.get_datos_listado(request))
+
+    # Devuelve las categorías ordenadas por nombre o, si se pide el árbol, cada categoría seguida de sus inferiores.
+    def get_datos_listado(self, request):
+        orden = 'ruta' if request.query_params.get('arbol', "") == 'true' else 'nombre'
+        buscadas = Categoria.objects.filter(borrado=False).order_by(orden)
+        contexto = {'operaciones_compactas': comprobar_operaciones_compactas(request)}
+        serializer = CategoriaSerializer(instance=buscadas, many=True, context=contexto)
         categorias = serializer.data
         datos = {
             "categorias": categorias
         }
-        return respuesta.get_respuesta(datos=datos, formatear=False)
+        return datos
 
 
 # Abm de categorías con autorización
 class ABMCategoriaViewSet(viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CacheTokenAuthentication]
     permission_classes = [IsAuthenticated, TieneRolAdmin]
 
     def create(self, request, *args, **kwargs):
@@ -60,9 +79,16 @@ class ABMCategoriaViewSet(viewsets.ModelViewSet):
         if isinstance(existente, Categoria):
             return respuesta.get_respuesta(False, "Ya existe una categoría con ese nombre")
 
+        superior = None
+        id_superior = request.data.get('superior', None)
+        if id_superior is not None and str(id_superior).isnumeric():
+            superior = Categoria.objects.filter(pk=id_superior).first()
+            if superior is None:
+                return respuesta.get_respuesta(False, "No existe la categoría superior indicada")
+
         descripcion = request.data.get('descripcion', '')
         descripcion_cortada = descripcion[:250] if len(descripcion) > 250 else descripcion
-        categoria = Categoria(nombre=nombre, descripcion=descripcion_cortada)
+        categoria = Categoria(nombre=nombre, descripcion=descripcion_cortada, superior=superior)
         categoria.save()
 
         serializer = CategoriaSerializer(instance=categoria)
@@ -90,12 +116,16 @@ def get_filtros(request):
     # Agrega filtros por nombre de producto
     nombre = request.query_params.get('nombre', "")
     if len(nombre) > 0:
-        filtros["nombre__icontains"] = nombre
+        filtros["id__in"] = buscar(Producto, "nombre", nombre)
 
-    # Agrega filtros por categoría de producto
+    # Agrega filtros por categoría de producto, incluyendo los productos de sus categorías inferiores.
     categoria = request.query_params.get('categoria', None)
     if categoria is not None and categoria.isnumeric() and int(categoria) > 0:
-        filtros["categoria"] = categoria
+        ruta = Categoria.objects.filter(pk=categoria).values_list('ruta', flat=True).first()
+        if ruta:
+            filtros.update(Categoria.get_filtros_subarbol(ruta, "categoria__"))
+        else:
+            filtros["categoria"] = categoria
 
     # Agrega filtro por tipo
     tipo = request.query_params.get('tipo', "")
@@ -123,19 +153,8 @@ def get_filtros(request):
     return filtros
 
 
-# Devuelve los cantidad de registros sin tener en cuenta la página actual.
-def get_cantidad_registros(request):
-    filtros = get_filtros(request)
-    id = filtros.get("id")
-    if id is None and filtros.get("offset") is not None:
-        filtros.pop("offset")
-    if id is None and filtros.get("limit") is not None:
-        filtros.pop("limit")
-    cantidad = Producto.objects.filter(**filtros).count()
-    return cantidad
-
-
-# Devuelve los ingresos según los filtros de la query
+# Devuelve los productos según los filtros de la query junto con la cantidad de registros sin tener en cuenta la página
+# actual.
 def filtrar_productos(request):
     filtros = get_filtros(request)
 
@@ -146,17 +165,28 @@ def filtrar_productos(request):
     if isinstance(limit, int):
         filtros.pop("limit")
 
-    orden = request.query_params.get('orden', "nombre")
-    if orden == 'categoria':
+    # Si se busca por nombre sin pedir otro orden se muestran primero los productos más relevantes.
+    orden = request.query_params.get('orden', "relevancia")
+    nombre = request.query_params.get('nombre', "")
+    relevancia = orden == 'relevancia' and len(nombre) > 0
+    if orden == 'relevancia':
+        orden = "nombre"
+    elif orden == 'categoria':
         orden = "categoria__nombre"
 
     direccion = request.query_params.get('direccion', "")
     direccion_texto = "" if direccion == "ASC" else "-"
 
     order_by = direccion_texto + orden
+    productos = Producto.objects.filter(**filtros)
+    if relevancia:
+        productos = productos.annotate(relevancia=get_relevancia(Producto, "nombre", nombre))
+        productos = productos.order_by('relevancia', order_by)
+    else:
+        productos = productos.order_by(order_by)
 
-    productos = Producto.objects.filter(**filtros).order_by(order_by)[offset:limit]
-    return productos
+    productos = precargar_listado(productos, ProductoSerializer)
+    return get_pagina(productos, offset, limit)
 
 
 # Obtención de productos sin autorización
@@ -164,28 +194,87 @@ class ProductoViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.Ret
     queryset = Producto.objects.filter(borrado=False).order_by('nombre')
     serializer_class = ProductoSerializer
 
-    # Lista los productos aplicando los filtros.
+    # Lista los productos aplicando los filtros. El listado sin filtros es el menú completo, que se redirige a su
+    # instantánea estática.
     def list(self, request, *args, **kwargs):
-        productos = filtrar_productos(request)
+        if len(request.query_params) == 0:
+            url = get_url_menu()
+            if url is not None:
+                return redirect(url)
+        return get_respuesta_catalogo(request, 'productos', lambda: self.get_datos_listado(request))
+
+    @action(detail=False, methods=['get'])
+    def cambios(self, request, *args, **kwargs):
+        """
+            Devuelve los productos y categorías modificados después de la fecha del parámetro 'desde', incluidos los
+            borrados lógicamente y los deshabilitados, junto con los ids de los borrados de la base de datos. El
+            cliente guarda la fecha 'hasta' de la respuesta para pedir los cambios siguientes. Sin fecha devuelve el
+            catálogo completo.
+            @param request:
+            @param args:
+            @param kwargs:
+            @return:
+        """
+        hasta = datetime.datetime.now()
+        desde_texto = request.query_params.get('desde', "")
+        desde = parse_datetime(desde_texto) if len(desde_texto) > 0 else None
+        if len(desde_texto) > 0 and desde is None:
+            return respuesta.get_respuesta(False, "La fecha desde la que se piden los cambios no es válida.")
+
+        productos = Producto.objects.all()
+        categorias = Categoria.objects.all()
+        eliminados = Eliminacion.objects.filter(modelo__in=['producto.Producto', 'producto.Categoria'])
+        if desde is not None:
+            # Se vuelven a enviar los cambios de los últimos segundos anteriores a la fecha, que pudieron guardarse en
+            # transacciones que terminaron después de la sincronización anterior.
+            if timezone.is_aware(desde):
+                desde = timezone.make_naive(desde)
+            desde = desde - datetime.timedelta(seconds=getattr(settings, 'SINCRONIZACION_MARGEN_SEGUNDOS', 60))
+            productos = productos.filter(auditoria_modificado_fecha__gt=desde)
+            categorias = categorias.filter(auditoria_modificado_fecha__gt=desde)
+            eliminados = eliminados.filter(fecha__gt=desde)
+
+        productos = list(precargar_listado(productos.order_by('auditoria_modificado_fecha', 'id'), ProductoSerializer))
+        contexto = ProductoSerializer.get_contexto_listado([producto.id for producto in productos])
+        contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+        categorias = categorias.order_by('ruta')
+        contexto_categorias = {'operaciones_compactas': contexto['operaciones_compactas']}
+        eliminados = list(eliminados.order_by().values_list('modelo', 'objeto_id'))
+        datos = {
+            "hasta": hasta.isoformat(),
+            "productos": ProductoSerializer(instance=productos, many=True, context=contexto).data,
+            "categorias": CategoriaSerializer(instance=categorias, many=True, context=contexto_categorias).data,
+            "eliminados": {
+                "productos": [id for modelo, id in eliminados if modelo == 'producto.Producto'],
+                "categorias": [id for modelo, id in eliminados if modelo == 'producto.Categoria'],
+            },
+        }
+        return respuesta.get_respuesta(datos=datos, formatear=False)
+
+    # Devuelve los datos del listado de productos según los filtros de la query.
+    def get_datos_listado(self, request):
+        productos, cantidad = filtrar_productos(request)
         if len(productos) > 0:
-            serializer = ProductoSerializer(instance=productos, many=True)
+            contexto = ProductoSerializer.get_contexto_listado([producto.id for producto in productos])
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = ProductoSerializer(instance=productos, many=True, context=contexto)
             productos = serializer.data
 
-        cantidad = get_cantidad_registros(request)
-        total = Producto.objects.count()
+        total, total_exacto = get_total(Producto)
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "productos": productos,
             "registros": cantidad
         }
-        return respuesta.get_respuesta(datos=datos, formatear=False)
+        return datos
 
 
 # Abm de productos con autorización
 class ABMProductoViewSet(viewsets.ModelViewSet):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CacheTokenAuthentication]
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
 
@@ -209,12 +298,13 @@ class ABMProductoViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid(raise_exception=False):
             errores = serializer.get_errores_lista()
             return respuesta.get_respuesta(False, "Hubo un error al crear el producto", None, errores)
-        serializer.save()
+        # El producto se crea sin stock y el stock inicial se carga como un movimiento.
+        stock = serializer.validated_data.get('stock', 0)
+        serializer.save(stock=0)
 
         producto = serializer.instance
         stock_seguridad = request.data["stock_seguridad"]
         producto.stock_seguridad = stock_seguridad if stock_seguridad != '' else 0
-        stock = producto.stock
 
         producto.agregar_precio()
         producto.agregar_costo()
@@ -283,9 +373,11 @@ class ABMProductoViewSet(viewsets.ModelViewSet):
     # Lista los productos aplicando los filtros.
     @action(detail=False, methods=['get'])
     def listado_admin(self, request, *args, **kwargs):
-        productos = filtrar_productos(request)
+        productos, cantidad = filtrar_productos(request)
         if len(productos) > 0:
-            serializer = ProductoSerializer(instance=productos, many=True)
+            contexto = ProductoSerializer.get_contexto_listado([producto.id for producto in productos])
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = ProductoSerializer(instance=productos, many=True, context=contexto)
             productos = serializer.data
 
         abierto = request.query_params.get('abierto', '')
@@ -297,10 +389,10 @@ class ABMProductoViewSet(viewsets.ModelViewSet):
             for producto in productos:
                 producto['cantidad_pedida'] = pedido.get_cantidad_producto(producto['id'])
 
-        cantidad = get_cantidad_registros(request)
-        total = Producto.objects.count()
+        total, total_exacto = get_total(Producto)
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "productos": productos,
             "registros": cantidad
         }
@@ -308,10 +400,12 @@ class ABMProductoViewSet(viewsets.ModelViewSet):
 
 
 # Abm de ingresos.
-class ABMIngresoViewSet(viewsets.ModelViewSet):
+class ABMIngresoViewSet(PaginacionCursorMixin, viewsets.ModelViewSet):
     queryset = Ingreso.objects.all()
     serializer_class = IngresoSerializer
-    authentication_classes = [TokenAuthentication]
+    orden_listado = ('-fecha', '-id')
+    busquedas_listado = [('nombreUsuario', Usuario, 'first_name', 'usuario__')]
+    authentication_classes = [CacheTokenAuthentication]
     permission_classes = [IsAuthenticated, TieneRolAdmin]
 
     @transaction.atomic
@@ -371,7 +465,7 @@ class ABMIngresoViewSet(viewsets.ModelViewSet):
         # Agrega filtro por usuario
         usuario = request.query_params.get('nombreUsuario', "")
         if usuario != "":
-            filtros["usuario__first_name__icontains"] = usuario
+            filtros["usuario__in"] = buscar(Usuario, "first_name", usuario)
 
         # Agrega filtros por número de página actual
         pagina = int(request.query_params.get('paginaActual', 1))
@@ -384,7 +478,7 @@ class ABMIngresoViewSet(viewsets.ModelViewSet):
 
     # Devuelve los cantidad de registros sin tener en cuenta la página actual.
     def get_cantidad_registros(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         if id is None:
             filtros.pop("offset")
@@ -394,33 +488,38 @@ class ABMIngresoViewSet(viewsets.ModelViewSet):
 
     # Devuelve los ingresos según los filtros de la query
     def filtrar_ingresos(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         id_valido = id is not None and int(id) > 0
         if id_valido:
-            return Ingreso.objects.filter(id=id)
+            return precargar_listado(Ingreso.objects.filter(id=id), IngresoSerializer)
 
         offset = filtros.get("offset")
         limit = filtros.get("limit")
         filtros.pop("offset")
         filtros.pop("limit")
-        pedidos = Ingreso.objects.filter(**filtros).order_by('-fecha')[offset:limit]
+        pedidos = precargar_listado(Ingreso.objects.filter(**filtros), IngresoSerializer)
+        pedidos = self.paginar(request, pedidos, offset, limit)
         return pedidos
 
     # Lista los ingresos aplicando los filtros.
     def list(self, request, *args, **kwargs):
         ingresos = self.filtrar_ingresos(request)
         if len(ingresos) > 0:
-            serializer = IngresoSerializer(instance=ingresos, many=True)
+            contexto = IngresoSerializer.get_contexto_listado([ingreso.id for ingreso in ingresos])
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = IngresoSerializer(instance=ingresos, many=True, context=contexto)
             ingresos = serializer.data
 
-        cantidad = self.get_cantidad_registros(request)
-        total = Ingreso.objects.count()
+        cantidad = self.get_cantidad_listado(request)
+        total, total_exacto = get_total(Ingreso)
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "ingresos": ingresos,
             "registros": cantidad
         }
+        datos.update(self.get_datos_cursor(request))
         return respuesta.get_respuesta(datos=datos, formatear=False)
 
     # Anula el ingreso realizado.
@@ -444,15 +543,20 @@ class ABMIngresoViewSet(viewsets.ModelViewSet):
             ingreso.anular()
             ingreso.save()
             return respuesta.get_respuesta(exito=True, mensaje="El ingreso se ha anulado con éxito.")
+        except ValidationError as e:
+            transaction.set_rollback(True)
+            return respuesta.get_respuesta(False, e.messages)
         except:
+            transaction.set_rollback(True)
             return respuesta.get_respuesta(exito=False, mensaje="Ha ocurrido un error al anular el ingreso.")
 
 
 # Abm de movimientos de stock.
-class MovimientoStockViewSet(viewsets.ModelViewSet):
+class MovimientoStockViewSet(PaginacionCursorMixin, viewsets.ModelViewSet):
     queryset = MovimientoStock.objects.all()
     serializer_class = MovimientoSerializer
-    authentication_classes = [TokenAuthentication]
+    busquedas_listado = [('usuario', Usuario, 'first_name', 'auditoria_creador__')]
+    authentication_classes = [CacheTokenAuthentication]
     permission_classes = [IsAuthenticated, TieneRolAdmin]
 
     # Devuelve los filtros de la query.
@@ -474,7 +578,7 @@ class MovimientoStockViewSet(viewsets.ModelViewSet):
         # Agrega filtros por usuario del movimiento
         usuario = request.query_params.get('usuario', None)
         if usuario is not None and len(str(usuario)) > 0:
-            filtros["auditoria_creador__first_name__icontains"] = usuario
+            filtros["auditoria_creador__in"] = buscar(Usuario, "first_name", usuario)
 
         # Agrega filtros por ingreso del movimiento
         idIngreso = request.query_params.get('ingreso', None)
@@ -497,7 +601,7 @@ class MovimientoStockViewSet(viewsets.ModelViewSet):
 
     # Devuelve los cantidad de registros sin tener en cuenta la página actual.
     def get_cantidad_registros(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         if id is None:
             filtros.pop("offset")
@@ -507,46 +611,73 @@ class MovimientoStockViewSet(viewsets.ModelViewSet):
 
     # Devuelve los movimientos según los filtros de la query
     def filtrar_movimientos(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
 
         offset = filtros.get("offset")
         limit = filtros.get("limit")
         filtros.pop("offset")
         filtros.pop("limit")
 
-        movimientos = MovimientoStock.objects.filter(**filtros).order_by('-auditoria_creado_fecha')[offset:limit]
+        movimientos = precargar_listado(MovimientoStock.objects.filter(**filtros), MovimientoSerializer)
+        movimientos = self.paginar(request, movimientos, offset, limit)
         return movimientos
 
     # Lista los productos aplicando los filtros.
     def list(self, request, *args, **kwargs):
         movimientos = self.filtrar_movimientos(request)
         if len(movimientos) > 0:
-            serializer = MovimientoSerializer(instance=movimientos, many=True)
+            contexto = ProductoSerializer.get_contexto_listado(list(set(movimiento.producto_id for movimiento in movimientos)))
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = MovimientoSerializer(instance=movimientos, many=True, context=contexto)
             movimientos = serializer.data
 
-        cantidad = self.get_cantidad_registros(request)
+        cantidad = self.get_cantidad_listado(request)
 
-        total = 0
+        total, total_exacto = 0, True
         idIngreso = request.query_params.get('ingreso', None)
         producto = request.query_params.get('producto', None)
         if idIngreso is not None and idIngreso.isnumeric() and int(idIngreso) > 0:
-            total = MovimientoStock.objects.filter(ingreso_linea__ingreso=idIngreso).count()
+            total, total_exacto = get_total(MovimientoStock, ingreso_linea__ingreso=idIngreso)
         elif producto is not None and producto.isnumeric() and int(producto) > 0:
-            total = MovimientoStock.objects.filter(producto=producto).count()
+            total, total_exacto = get_total(MovimientoStock, producto=producto)
 
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "movimientos": movimientos,
             "registros": cantidad
         }
+        datos.update(self.get_datos_cursor(request))
+        return respuesta.get_respuesta(datos=datos, formatear=False)
+
+    # Devuelve el stock de uno o todos los productos al final de la fecha indicada.
+    @action(detail=False, methods=['get'])
+    def stock_fecha(self, request, *args, **kwargs):
+        fecha_texto = request.query_params.get('fecha', "")
+        try:
+            fecha = utils.get_fecha_string2objeto(fecha_texto).date()
+        except ValueError:
+            return respuesta.get_respuesta(exito=False, mensaje="Debe indicar una fecha con formato AAAA-MM-DD.")
+
+        producto = request.query_params.get('producto', "")
+        id_producto = int(producto) if producto.isnumeric() else 0
+        stocks = get_stock_fecha(fecha, id_producto)
+        nombres = Producto.objects.filter(pk__in=stocks.keys()).values_list('id', 'nombre')
+        productos = [{"id": id, "nombre": nombre, "stock": stocks[id]} for id, nombre in nombres]
+        datos = {
+            "fecha": fecha.strftime('%d/%m/%Y'),
+            "productos": productos
+        }
         return respuesta.get_respuesta(datos=datos, formatear=False)
 
 
 # Abm de ingresos.
-class ReemplazoMercaderiViewSet(viewsets.ModelViewSet):
+class ReemplazoMercaderiViewSet(PaginacionCursorMixin, viewsets.ModelViewSet):
     queryset = ReemplazoMercaderia.objects.all()
     serializer_class = ReemplazoMercaderiaSerializer
-    authentication_classes = [TokenAuthentication]
+    orden_listado = ('-fecha', '-id')
+    busquedas_listado = [('nombreUsuario', Usuario, 'first_name', 'usuario__')]
+    authentication_classes = [CacheTokenAuthentication]
     permission_classes = [IsAuthenticated, TieneRolAdmin]
 
     @transaction.atomic
@@ -601,7 +732,7 @@ class ReemplazoMercaderiViewSet(viewsets.ModelViewSet):
         # Agrega filtro por usuario
         usuario = request.query_params.get('nombreUsuario', "")
         if usuario != "":
-            filtros["usuario__first_name__icontains"] = usuario
+            filtros["usuario__in"] = buscar(Usuario, "first_name", usuario)
 
         # Agrega filtros por número de página actual
         pagina = int(request.query_params.get('paginaActual', 1))
@@ -614,7 +745,7 @@ class ReemplazoMercaderiViewSet(viewsets.ModelViewSet):
 
     # Devuelve los cantidad de registros sin tener en cuenta la página actual.
     def get_cantidad_registros(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         if id is None:
             filtros.pop("offset")
@@ -624,33 +755,38 @@ class ReemplazoMercaderiViewSet(viewsets.ModelViewSet):
 
     # Devuelve los reemplazos según los filtros de la query
     def filtrar_reemplazos(self, request):
-        filtros = self.get_filtros(request)
+        filtros = self.get_filtros_listado(request)
         id = filtros.get("id")
         id_valido = id is not None and int(id) > 0
         if id_valido:
-            return ReemplazoMercaderia.objects.filter(id=id)
+            return precargar_listado(ReemplazoMercaderia.objects.filter(id=id), ReemplazoMercaderiaSerializer)
 
         offset = filtros.get("offset")
         limit = filtros.get("limit")
         filtros.pop("offset")
         filtros.pop("limit")
-        pedidos = ReemplazoMercaderia.objects.filter(**filtros).order_by('-fecha')[offset:limit]
+        pedidos = precargar_listado(ReemplazoMercaderia.objects.filter(**filtros), ReemplazoMercaderiaSerializer)
+        pedidos = self.paginar(request, pedidos, offset, limit)
         return pedidos
 
     # Lista los reemplazos aplicando los filtros.
     def list(self, request, *args, **kwargs):
         reemplazos = self.filtrar_reemplazos(request)
         if len(reemplazos) > 0:
-            serializer = ReemplazoMercaderiaSerializer(instance=reemplazos, many=True)
+            contexto = ReemplazoMercaderiaSerializer.get_contexto_listado([reemplazo.id for reemplazo in reemplazos])
+            contexto['operaciones_compactas'] = comprobar_operaciones_compactas(request)
+            serializer = ReemplazoMercaderiaSerializer(instance=reemplazos, many=True, context=contexto)
             reemplazos = serializer.data
 
-        cantidad = self.get_cantidad_registros(request)
-        total = ReemplazoMercaderia.objects.count()
+        cantidad = self.get_cantidad_listado(request)
+        total, total_exacto = get_total(ReemplazoMercaderia)
         datos = {
             "total": total,
+            "total_exacto": total_exacto,
             "reemplazos": reemplazos,
             "registros": cantidad
         }
+        datos.update(self.get_datos_cursor(request))
         return respuesta.get_respuesta(datos=datos, formatear=False)
 
     # Anula el reemplazo de mercadería realizado.
@@ -678,5 +814,6 @@ class ReemplazoMercaderiViewSet(viewsets.ModelViewSet):
             reemplazo.save()
             return respuesta.get_respuesta(exito=True, mensaje="El reemplazo de mercadería se ha anulado con éxito.")
         except:
+            transaction.set_rollback(True)
             return respuesta.get_respuesta(exito=False,
                                            mensaje="Ha ocurrido un error al anular el reemplazo de mercadería.")
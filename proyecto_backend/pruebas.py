@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+import copy
+import shutil
+import tempfile
+
+
+class PruebasRunner(DiscoverRunner):
+    """
+        Ejecuta las pruebas con las caches de archivos en un directorio temporal propio, para que no lean ni modifiquen
+        los datos de la caché que usan los procesos del servidor.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.directorio_cache = tempfile.mkdtemp(prefix='proyecto_backend_pruebas_')
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, configuracion in caches.items():
+            if configuracion['BACKEND'].endswith('FileBasedCache'):
+                configuracion['LOCATION'] = self.directorio_cache + '/' + alias
+        self.caches_pruebas = override_settings(CACHES=caches)
+        self.caches_pruebas.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches_pruebas.disable()
+        shutil.rmtree(self.directorio_cache, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
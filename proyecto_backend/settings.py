@@ -64,7 +64,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'producto.middleware.MenuWhiteNoiseMiddleware',
 ]
 
 
@@ -78,6 +78,70 @@ AUTHENTICATION_BACKENDS = ['proyecto_backend.auth.EmailBackend']
 
 SILENCED_SYSTEM_CHECKS = ["auth.W004"]
 
+# La caché 'compartida' guarda los datos que deben ser iguales en todos los procesos que atienden requests, como el
+# usuario resuelto por cada token de autenticación: la de archivos la comparten los workers de gunicorn del mismo
+# servidor; con varios servidores debe configurarse Memcached o Redis con CACHE_COMPARTIDA_BACKEND y
+# CACHE_COMPARTIDA_LOCATION. El directorio por defecto es propio del proyecto y no uno temporal compartido con otros
+# usuarios del sistema, ya que la caché guarda objetos que se vuelven a leer con pickle.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'compartida': {
+        'BACKEND': config('CACHE_COMPARTIDA_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_COMPARTIDA_LOCATION', default=os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+TOKEN_CACHE = 'compartida'
+
+# Las pruebas usan una caché compartida en un directorio temporal propio, que se borra al terminar.
+TEST_RUNNER = 'proyecto_backend.pruebas.PruebasRunner'
+
+# Segundos que se guarda el usuario resuelto por cada token de autenticación.
+TOKEN_CACHE_SEGUNDOS = 300
+
+# Horas de vigencia de los tokens enviados por email para activar la cuenta y para cambiar la contraseña.
+TOKEN_EMAIL_HORAS = 168
+TOKEN_RESET_HORAS = 48
+
+# Segundos que el cliente puede guardar los datos de presentación de las operaciones de los listados.
+OPERACIONES_CACHE_SEGUNDOS = 86400
+
+# Segundos que se guarda el total de registros de cada listado, en la caché TOTALES_CACHE. Los totales exactos se
+# invalidan en todos los procesos al crear, guardar o borrar registros, por lo que la caché debe ser compartida.
+TOTALES_CACHE = 'compartida'
+TOTALES_CACHE_SEGUNDOS = 60
+
+# Cantidad de registros hasta la que el total de un listado se cuenta de forma exacta. Por encima se informa un total
+# aproximado, que se guarda durante CONTEO_APROXIMADO_SEGUNDOS y no se invalida al modificar registros.
+CONTEO_EXACTO_MAXIMO = 10000
+CONTEO_APROXIMADO_SEGUNDOS = 600
+
+# Segundos que se guarda en memoria cada respuesta de los listados públicos de productos y categorías, si antes no
+# cambian los datos. Las ventas y demás movimientos de stock no invalidan las respuestas salvo que agoten un producto o
+# le vuelvan a dar stock, por lo que el stock mostrado puede tener hasta esta demora.
+CATALOGO_CACHE_SEGUNDOS = 60
+
+# Caché donde se guarda la versión del catálogo, que debe ser compartida para que los cambios invaliden las respuestas
+# guardadas en todos los procesos.
+CATALOGO_CACHE = 'compartida'
+
+# Segundos después de los que la instantánea estática del menú completo se vuelve a generar aunque el catálogo no haya
+# cambiado. Acota la demora del stock mostrado, ya que las ventas no invalidan el menú, y la de los servidores que no
+# comparten el disco. La nueva se genera en segundo plano y mientras tanto se sigue sirviendo la anterior.
+MENU_SEGUNDOS = 300
+
+# Segundos anteriores a la fecha de la última sincronización cuyos cambios se vuelven a enviar, para no perder los
+# guardados en transacciones que terminaron después de esa sincronización.
+SINCRONIZACION_MARGEN_SEGUNDOS = 60
+
+# Formato de los importes, por defecto el de es-AR sin separador de miles: "$ 1234,50".
+MONEDA_SIMBOLO = '$'
+MONEDA_SEPARADOR_DECIMAL = ','
+MONEDA_SEPARADOR_MILES = ''
+MONEDA_DECIMALES = 2
+
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = config('EMAIL_HOST')
 EMAIL_USE_TLS = config('EMAIL_USE_TLS')